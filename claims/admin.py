@@ -1,12 +1,71 @@
 # claims\admin.py
 
 from django.contrib import admin
+from django.db import transaction
+
+from .models import Claim, ClaimDetail, Note, Flag, UploadJob
+from .cpt import sync_cpt_codes
+from .search import reindex_claims, remove_claims
+from .summary import SummaryDelta
+from .versions import CLAIMS, bump_versions, claim_key
+
+
+class SummaryTrackingAdmin(admin.ModelAdmin):
+    # Admin edits bypass the loaders, so the summary is moved here by the old and new values of the edited rows.
+    # (Saves reach the search index, CPT code rows and page versions through post_save; deletions are handled here.)
+    def _add_to_summary(self, delta, pks, sign=1):
+        """Adds (or with `sign=-1` takes out) the stored rows `pks` of this admin's model."""
+        if self.model is Claim:
+            for status, billed_amount, paid_amount, discharge_date, denial_reason in Claim.objects.filter(
+                pk__in=pks
+            ).values_list('status', 'billed_amount', 'paid_amount', 'discharge_date', 'details__denial_reason'):
+                delta.add_claim(status, billed_amount, paid_amount, discharge_date, sign=sign)
+                delta.add_denial_reason(denial_reason, sign=sign)
+            delta.touch_claims(pks)
+        else:
+            for denial_reason in ClaimDetail.objects.filter(pk__in=pks).values_list('denial_reason', flat=True):
+                delta.add_denial_reason(denial_reason, sign=sign)
+
+    def save_model(self, request, obj, form, change):
+        delta = SummaryDelta()
+        with transaction.atomic():
+            if change:
+                self._add_to_summary(delta, [obj.pk], sign=-1)
+            super().save_model(request, obj, form, change)
+            self._add_to_summary(delta, [obj.pk])
+            delta.apply()
+
+    def delete_model(self, request, obj):
+        claim_pk = obj.claim_id if isinstance(obj, ClaimDetail) else obj.pk
+        delta = SummaryDelta()
+        with transaction.atomic():
+            self._add_to_summary(delta, [obj.pk], sign=-1)
+            super().delete_model(request, obj)
+            delta.apply()
+        self._refresh_search([claim_pk])
+
+    def delete_queryset(self, request, queryset):
+        claim_pks = list(queryset.values_list('claim_id' if queryset.model is ClaimDetail else 'pk', flat=True))
+        delta = SummaryDelta()
+        with transaction.atomic():
+            self._add_to_summary(delta, list(queryset.values_list('pk', flat=True)), sign=-1)
+            super().delete_queryset(request, queryset)
+            delta.apply()
+        self._refresh_search(claim_pks)
+
+    def _refresh_search(self, claim_pks):
+        if self.model is Claim:
+            remove_claims(claim_pks)
+            bump_versions(CLAIMS, *map(claim_key, claim_pks))
+        else:
+            reindex_claims(Claim.objects.filter(pk__in=claim_pks))
+            sync_cpt_codes(claim_pks)
 
-from .models import Claim, ClaimDetail, Note, Flag 
 
 # Register models here.
-admin.site.register(Claim)
-admin.site.register(ClaimDetail)
+admin.site.register(Claim, SummaryTrackingAdmin)
+admin.site.register(ClaimDetail, SummaryTrackingAdmin)
 admin.site.register(Note)
 
 admin.site.register(Flag)
+admin.site.register(UploadJob)
@@ -0,0 +1,67 @@
+# claims/aging.py
+
+"""
+The aging worklist: open claims by how long ago the patient was discharged.
+
+Claims of one status are listed oldest discharge first, a keyset page at a
+time from the (status, discharge_date) index. The per-bucket counts and
+underpayment totals are sums over `ClaimAgingSummary`, which keeps one row
+per status and discharge date up to date as claims are loaded and change
+status. A bucket is a range of those dates counted back from today, so the
+totals stay exact as claims age, and reading them costs the same however
+many claims there are.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Q, Sum
+
+from .models import Claim, ClaimAgingSummary
+
+# Statuses collectors work; the worklist shows one at a time.
+WORKLIST_STATUSES = (Claim.STATUS_UNDER_REVIEW, Claim.STATUS_DENIED, Claim.STATUS_APPEALED)
+
+# (key, label, fewest days since discharge, most days). Discharge dates in the future count as 0-30.
+AGING_BUCKETS = (
+    ('0-30', '0-30 days', None, 30),
+    ('31-60', '31-60 days', 31, 60),
+    ('61-90', '61-90 days', 61, 90),
+    ('91-120', '91-120 days', 91, 120),
+    ('120+', 'Over 120 days', 121, None),
+)
+BUCKET_KEYS = tuple(key for key, *_ in AGING_BUCKETS)
+
+
+def bucket_filter(key, today):
+    """Matches the discharge dates in bucket `key` as of `today`."""
+    _, _, fewest, most = AGING_BUCKETS[BUCKET_KEYS.index(key)]
+    condition = Q()
+    if fewest is not None:
+        condition &= Q(discharge_date__lte=today - timedelta(days=fewest))
+    if most is not None:
+        condition &= Q(discharge_date__gte=today - timedelta(days=most))
+    return condition
+
+
+def aging_buckets(status, today):
+    """
+    Returns each bucket of `status` claims as a dict of key, label, count and
+    underpayment, read with one aggregate over that status's summary rows.
+    """
+    totals = ClaimAgingSummary.objects.filter(status=status).aggregate(**{
+        f'{field}_{i}': Sum(field, filter=bucket_filter(key, today), default=0)
+        for i, key in enumerate(BUCKET_KEYS)
+        for field in ('claim_count', 'underpayment_total')
+    })
+    return [
+        {'key': key, 'label': label, 'count': totals[f'claim_count_{i}'], 'underpayment': totals[f'underpayment_total_{i}']}
+        for i, (key, label, _, _) in enumerate(AGING_BUCKETS)
+    ]
+
+
+def worklist_claims(status, bucket=None, today=None):
+    """The worklist's claims of `status`, limited to `bucket` (which needs `today`) if given."""
+    claims = Claim.objects.filter(status=status)
+    if bucket:
+        claims = claims.filter(bucket_filter(bucket, today))
+    return claims.only('claim_id', 'patient_name', 'insurer_name', 'status', 'discharge_date', 'underpayment')
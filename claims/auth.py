@@ -0,0 +1,95 @@
+# claims/auth.py
+
+"""
+An authentication backend that keeps recently seen users in memory.
+
+`AuthenticationMiddleware` loads the logged-in `User` row on every request,
+and the HTMX partials send many small requests per page. `CachedModelBackend`
+answers repeat lookups from a per-process cache for
+`CLAIMS_USER_CACHE_SECONDS`. Saving or deleting a user drops their entry in
+this process at once; other worker processes pick the change up when their
+entry expires, so the timeout bounds how long a deactivation or a password
+change takes to apply everywhere.
+"""
+
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.db import transaction
+
+# Entries kept before expired ones are swept out (and, if that is not enough, all of them).
+MAX_USERS = 10_000
+
+
+class UserCache:
+    """Thread-safe, process-local map of user keys to users, each with an expiry time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def get(self, pk):
+        """Returns a copy of the cached user, or None if absent or expired."""
+        with self._lock:
+            entry = self._users.get(pk)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires <= time.monotonic():
+                del self._users[pk]
+                return None
+        # A copy per request, so per-request state such as the permission cache is not shared.
+        return copy.copy(user)
+
+    def set(self, user, timeout):
+        with self._lock:
+            if len(self._users) >= MAX_USERS:
+                now = time.monotonic()
+                self._users = {pk: entry for pk, entry in self._users.items() if entry[0] > now}
+                if len(self._users) >= MAX_USERS:
+                    self._users.clear()
+            self._users[user.pk] = (time.monotonic() + timeout, copy.copy(user))
+
+    def invalidate(self, pk):
+        """
+        Drops a user, now and again once the current transaction commits (a
+        concurrent request may have cached the old row in between).
+        """
+        self._discard(pk)
+        transaction.on_commit(lambda: self._discard(pk))
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def _discard(self, pk):
+        with self._lock:
+            self._users.pop(pk, None)
+
+
+user_cache = UserCache()
+
+
+class CachedModelBackend(ModelBackend):
+    """`ModelBackend` whose per-request user lookups go through `user_cache`."""
+
+    def get_user(self, user_id):
+        timeout = settings.CLAIMS_USER_CACHE_SECONDS
+        user = user_cache.get(user_id) if timeout else None
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None and timeout:
+                user_cache.set(user, timeout)
+        return user
+
+    async def aget_user(self, user_id):
+        timeout = settings.CLAIMS_USER_CACHE_SECONDS
+        user = user_cache.get(user_id) if timeout else None
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None and timeout:
+                user_cache.set(user, timeout)
+        return user
@@ -0,0 +1,91 @@
+# claims/cpt.py
+
+"""
+Per-code rows for the CPT codes of a claim.
+
+Files carry a claim's CPT codes as one comma-separated string, which is what
+`ClaimDetail.cpt_codes` stores and the detail card shows. Each code is also
+kept as a `ClaimCptCode` row so "claims with CPT 99204" and per-code counts
+are served by the (code, claim) index instead of string matching every
+detail. The rows are rewritten for the claims whose codes changed by the
+ingestion paths and, for single-object edits, by `post_save` receivers.
+Every write drops the cached dashboard figures, whose top codes are counted
+from these rows. Codes longer than `ClaimCptCode.code` are logged and left
+out of the rows (they stay in the detail's string): cutting them to length
+could merge two different codes.
+"""
+
+import logging
+
+from django.db.models import Exists, OuterRef
+
+from .models import ClaimCptCode, ClaimDetail
+from .summary import invalidate_dashboard_summary
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+MAX_CODE_LENGTH = ClaimCptCode._meta.get_field('code').max_length
+
+
+def parse_cpt_codes(value):
+    """Splits a comma-separated CPT code string into distinct, normalised codes, in order."""
+    codes = (code.strip().upper() for code in (value or '').split(','))
+    return list(dict.fromkeys(code for code in codes if code))
+
+
+def cpt_code_rows(model, cpt_codes_by_claim, **fields):
+    """
+    Returns a `model` row (with `fields`) per code of each (claim_id,
+    cpt_codes) pair, skipping codes longer than `MAX_CODE_LENGTH` and
+    logging how many were skipped.
+    """
+    rows, skipped = [], []
+    for claim_id, cpt_codes in cpt_codes_by_claim:
+        for code in parse_cpt_codes(cpt_codes):
+            if len(code) > MAX_CODE_LENGTH:
+                skipped.append(code)
+            else:
+                rows.append(model(claim_id=claim_id, code=code, **fields))
+    if skipped:
+        logger.warning(
+            'Skipped %d CPT code(s) longer than %d characters, e.g. %r; they are not indexed.',
+            len(skipped), MAX_CODE_LENGTH, skipped[0],
+        )
+    return rows
+
+
+def store_cpt_codes(cpt_codes_by_claim, replace=()):
+    """
+    Writes the code rows for a batch of details already in memory, keyed by
+    claim pk. Only the claims in `replace` can have rows already, so only
+    those are cleared first: a batch of new details costs one insert.
+    """
+    if replace:
+        ClaimCptCode.objects.filter(claim_id__in=list(replace)).delete()
+    created = ClaimCptCode.objects.bulk_create(cpt_code_rows(ClaimCptCode, cpt_codes_by_claim.items()))
+    if replace or created:
+        invalidate_dashboard_summary()
+
+
+def sync_cpt_codes(claim_pks, batch_size=BATCH_SIZE):
+    """
+    Rewrites the code rows of the claims in `claim_pks` from their details;
+    claims without details lose their rows. Two writes per batch.
+    """
+    claim_pks = list(dict.fromkeys(claim_pks))
+    for start in range(0, len(claim_pks), batch_size):
+        batch = claim_pks[start:start + batch_size]
+        ClaimCptCode.objects.filter(claim_id__in=batch).delete()
+        ClaimCptCode.objects.bulk_create(cpt_code_rows(
+            ClaimCptCode, ClaimDetail.objects.filter(claim_id__in=batch).values_list('claim_id', 'cpt_codes')
+        ))
+    if claim_pks:
+        invalidate_dashboard_summary()
+
+
+def prune_cpt_codes():
+    """Deletes the code rows of claims that no longer have details, in one statement."""
+    deleted, _ = ClaimCptCode.objects.exclude(Exists(ClaimDetail.objects.filter(claim_id=OuterRef('claim_id')))).delete()
+    if deleted:
+        invalidate_dashboard_summary()
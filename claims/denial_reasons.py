@@ -0,0 +1,44 @@
+# claims/denial_reasons.py
+
+"""
+Interning of denial reason texts.
+
+A claim detail refers to its denial reason by the key of a `DenialReason`
+row, so the text is stored once however many details share it, and
+per-reason counts and filters work on an integer key. Loads map texts to
+keys through a `DenialReasonCache`, which only goes to the database for
+texts it has not seen yet.
+"""
+
+from .models import DenialReason
+
+
+class DenialReasonCache:
+    """
+    Maps denial reason texts to `DenialReason` keys for one load, creating the
+    reasons that do not exist yet in bulk. Blank texts map to no reason.
+    """
+    def __init__(self):
+        self._ids = {}
+
+    def ids_for(self, texts):
+        """
+        Makes sure every text in `texts` has a key and returns the text -> key
+        mapping. Texts seen earlier in the load cost nothing; the rest one
+        lookup, plus one insert and one more lookup only if some are new.
+        """
+        missing = {text for text in texts if text and text not in self._ids}
+        if missing:
+            self._ids.update(DenialReason.objects.filter(text__in=missing).values_list('text', 'pk'))
+            new = missing - self._ids.keys()
+            if new:
+                DenialReason.objects.bulk_create([DenialReason(text=text) for text in new], ignore_conflicts=True)
+                self._ids.update(DenialReason.objects.filter(text__in=new).values_list('text', 'pk'))
+        return self._ids
+
+
+def intern_denial_reason(text):
+    """Returns the `DenialReason` for `text`, creating it if needed, or None for a blank text."""
+    if not text:
+        return None
+    return DenialReason.objects.get_or_create(text=text)[0]
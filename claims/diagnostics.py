@@ -0,0 +1,217 @@
+# claims/diagnostics.py
+
+"""
+Query-level diagnostics: SQL fingerprints, N+1 detection and a slow-query log.
+
+A `QueryDiagnostics` observer is attached to each request's `RequestMetrics`
+by `PerformanceMiddleware`. It groups the request's queries by fingerprint
+(the SQL with literals, placeholders and `IN` lists collapsed) and, when the
+request ends, reports every fingerprint executed more than
+`CLAIMS_N_PLUS_ONE_THRESHOLD` times as a probable N+1, with the stack of its
+first call site. Queries slower than `CLAIMS_SLOW_QUERY_MS` are written as
+they happen. Both go to the `claims.slow_queries` logger as one JSON object
+per line; unless the project configures that logger itself, each process
+writes to its own rotating file next to `CLAIMS_SLOW_QUERY_LOG` (the pid is
+added to the name, as rotating one file from several gunicorn workers loses
+entries), and `summarize_slow_queries` reads them all.
+
+`diagnose_queries()` gives code running outside a request (shell sessions,
+management commands) the same checks.
+"""
+
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('claims.slow_queries')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+_VALUES_RE = re.compile(r'\bVALUES (?:\((?:\?, )*\?\), )*\((?:\?, )*\?\)', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Frames from these paths are left out of reported call sites.
+_IGNORED_PATHS = (os.path.dirname(__file__) + os.sep + 'diagnostics.py',
+                  os.path.dirname(__file__) + os.sep + 'middleware.py',
+                  os.sep + 'django' + os.sep, os.sep + 'site-packages' + os.sep)
+
+_handler_lock = threading.Lock()
+_handler = None
+
+
+def fingerprint(sql):
+    """
+    Returns `sql` with string and number literals and parameter placeholders
+    replaced by `?`, `IN` lists and multi-row `VALUES` collapsed and
+    whitespace normalised, so the same statement with different values (or
+    batch sizes) gives the same fingerprint.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _WHITESPACE_RE.sub(' ', sql).strip()
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _VALUES_RE.sub('VALUES (...)', sql)
+
+
+def _call_site(stack):
+    frames = [frame for frame in stack if not any(path in frame.filename for path in _IGNORED_PATHS)]
+    # Innermost frame last, as in a traceback.
+    frames = traceback.StackSummary.from_list(reversed(frames or stack))
+    for frame in frames:
+        frame.line  # Looks the source line up now that the report needs it.
+    return ''.join(frames.format())
+
+
+def process_log_path(path, pid=None):
+    """The file process `pid` (default: this one) writes the slow-query log `path` to."""
+    root, ext = os.path.splitext(path)
+    return f'{root}-{pid or os.getpid()}{ext}'
+
+
+def slow_query_log_files(path):
+    """
+    Returns the files of the slow-query log `path`, oldest rotation first for
+    each: the file itself (as written by a LOGGING-configured handler) and
+    every process's file.
+    """
+    root, ext = os.path.splitext(path)
+    name_re = re.compile(re.escape(root) + r'(-\d+)?' + re.escape(ext) + r'(?:\.(\d+))?')
+    files = []
+    for name in glob.glob(glob.escape(root) + '*'):
+        match = name_re.fullmatch(name)
+        if match:
+            files.append(((match[1] or '', -int(match[2] or 0)), name))
+    return [name for _, name in sorted(files)]
+
+
+def _slow_query_logger():
+    """
+    Returns the slow-query logger, first giving it a rotating file handler on
+    this process's `CLAIMS_SLOW_QUERY_LOG` file unless the project's LOGGING
+    configures one.
+    """
+    global _handler
+    if not settings.CLAIMS_SLOW_QUERY_LOG or (logger.handlers and _handler not in logger.handlers):
+        return logger
+    # Per process, and looked up on every call, so a forked worker opens its own file.
+    path = process_log_path(settings.CLAIMS_SLOW_QUERY_LOG)
+    with _handler_lock:
+        if _handler is None or _handler.baseFilename != os.path.abspath(path):
+            if _handler is not None:
+                logger.removeHandler(_handler)
+                _handler.close()
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            _handler = RotatingFileHandler(
+                path, maxBytes=settings.CLAIMS_SLOW_QUERY_LOG_BYTES,
+                backupCount=settings.CLAIMS_SLOW_QUERY_LOG_BACKUPS, encoding='utf-8', delay=True,
+            )
+            _handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(_handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+    return logger
+
+
+def _log(entry):
+    entry = {'time': timezone.now().isoformat(), **entry}
+    level = logging.WARNING if entry['kind'] == 'n_plus_one' else logging.INFO
+    _slow_query_logger().log(level, json.dumps(entry))
+
+
+class QueryDiagnostics:
+    """
+    A `RequestMetrics` observer that fingerprints every query of one request
+    (or `diagnose_queries` block) and logs slow queries and probable N+1s.
+    """
+    def __init__(self, view=None, request=None):
+        self._view = view
+        self.request = request
+        self.slow_seconds = settings.CLAIMS_SLOW_QUERY_MS / 1000
+        self.threshold = settings.CLAIMS_N_PLUS_ONE_THRESHOLD
+        # fingerprint -> [executions, total seconds, stack of the first call]
+        self.fingerprints = {}
+
+    @property
+    def view(self):
+        """The label given, else the URL name of the request once it has been resolved."""
+        match = getattr(self.request, 'resolver_match', None)
+        return self._view or (match.view_name if match else None)
+
+    def __call__(self, sql, params, many, duration):
+        key = fingerprint(sql)
+        entry = self.fingerprints.get(key)
+        if entry is None:
+            # Line lookup is deferred: most call sites are never reported.
+            stack = traceback.StackSummary.extract(traceback.walk_stack(sys._getframe(1)), lookup_lines=False)
+            entry = self.fingerprints[key] = [0, 0.0, stack]
+        entry[0] += 1
+        entry[1] += duration
+        if duration >= self.slow_seconds:
+            _log({
+                'kind': 'slow',
+                'view': self.view,
+                'fingerprint': key,
+                'duration_ms': round(duration * 1000, 3),
+                'sql': sql if len(sql) <= 2000 else sql[:2000] + '...',
+            })
+
+    def n_plus_one(self):
+        """Returns (fingerprint, executions, total seconds, stack) for each fingerprint over the threshold."""
+        return [
+            (key, count, total, stack)
+            for key, (count, total, stack) in self.fingerprints.items()
+            if count > self.threshold
+        ]
+
+    def finish(self, view=None):
+        """Logs the probable N+1s; call once the request (or block) is done."""
+        view = view or self.view
+        suspects = self.n_plus_one()
+        for key, count, total, stack in suspects:
+            _log({
+                'kind': 'n_plus_one',
+                'view': view,
+                'fingerprint': key,
+                'executions': count,
+                'duration_ms': round(total * 1000, 3),
+                'call_site': _call_site(stack),
+            })
+        return suspects
+
+
+@contextmanager
+def diagnose_queries(label):
+    """
+    Applies the request checks to the queries run inside the block, e.g.
+    `with diagnose_queries('nightly-import'): process_claim_data(...)`.
+    Yields the `QueryDiagnostics`.
+    """
+    diagnostics = QueryDiagnostics(label)
+
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            diagnostics(sql, params, many, time.perf_counter() - started)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield diagnostics
+    diagnostics.finish()
@@ -0,0 +1,178 @@
+# claims/export.py
+
+"""
+Streaming export of a filtered claim set as CSV, JSON Lines, Parquet or Arrow.
+
+Rows are read in keyset batches (`KEYSET_ORDERING`, the claim list's order):
+each batch is one short indexed range query, so memory stays flat however
+many claims match, and no read transaction or cursor is held open while the
+client downloads (which on SQLite would hold off writers). Parquet and Arrow
+need the optional `pyarrow` package and are written one record batch per
+query batch.
+"""
+
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Q, TextField, Value
+from django.db.models.functions import Coalesce
+
+from .pagination import KEYSET_ORDERING
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Parquet/Arrow export is optional.
+    pyarrow = None
+
+# (output column, queryset lookup or expression). The claim columns match the
+# upload file layout, so an export can be loaded back in; a blank denial reason
+# is stored as no reason and exported as '', as the files have it.
+EXPORT_COLUMNS = [
+    ('id', 'claim_id'),
+    ('patient_name', 'patient_name'),
+    ('billed_amount', 'billed_amount'),
+    ('paid_amount', 'paid_amount'),
+    ('status', 'status'),
+    ('insurer_name', 'insurer_name'),
+    ('discharge_date', 'discharge_date'),
+    ('denial_reason', Coalesce('details__denial_reason__text', Value(''), output_field=TextField())),
+    ('cpt_codes', 'details__cpt_codes'),
+]
+
+# format -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/jsonl', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if pyarrow is not None or fmt not in COLUMNAR_FORMATS]
+
+
+def iter_claim_batches(queryset, batch_size):
+    """
+    Yields lists of row tuples (in `EXPORT_COLUMNS` order) for every claim in
+    `queryset`, newest discharge first, `batch_size` rows per query.
+    """
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    # The keyset position travels with each row and is dropped before yielding.
+    queryset = queryset.order_by(*KEYSET_ORDERING).values_list('discharge_date', 'pk', *lookups)
+    batch = list(queryset[:batch_size])
+    while batch:
+        yield [row[2:] for row in batch]
+        if len(batch) < batch_size:
+            return
+        discharge_date, pk = batch[-1][:2]
+        batch = list(
+            queryset.filter(
+                Q(discharge_date__lt=discharge_date) | Q(discharge_date=discharge_date, id__lt=pk)
+            )[:batch_size]
+        )
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def stream_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column for column, _ in EXPORT_COLUMNS])
+    for batch in batches:
+        writer.writerows(('' if value is None else value for value in row) for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_jsonl(batches):
+    columns = [column for column, _ in EXPORT_COLUMNS]
+    for batch in batches:
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), default=_json_default) + '\n' for row in batch
+        )
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands back what was written since the last `drain()`."""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema():
+    return pyarrow.schema([
+        ('id', pyarrow.int64()),
+        ('patient_name', pyarrow.string()),
+        ('billed_amount', pyarrow.decimal128(10, 2)),
+        ('paid_amount', pyarrow.decimal128(10, 2)),
+        ('status', pyarrow.string()),
+        ('insurer_name', pyarrow.string()),
+        ('discharge_date', pyarrow.date32()),
+        ('denial_reason', pyarrow.string()),
+        ('cpt_codes', pyarrow.string()),
+    ])
+
+
+def stream_columnar(batches, fmt):
+    """Writes each batch as a Parquet row group or an Arrow IPC record batch."""
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+    try:
+        for batch in batches:
+            record_batch = pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(zip(*batch), schema)],
+                schema=schema,
+            )
+            writer.write_batch(record_batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(queryset, fmt, batch_size):
+    """Returns an iterator of the encoded export of `queryset` in `fmt`."""
+    batches = iter_claim_batches(queryset, batch_size)
+    if fmt == 'csv':
+        return stream_csv(batches)
+    if fmt == 'jsonl':
+        return stream_jsonl(batches)
+    return stream_columnar(batches, fmt)
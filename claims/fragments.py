@@ -0,0 +1,23 @@
+# claims/fragments.py
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+# Name of the `{% cache %}` fragment in _claim_detail_response.html holding the
+# claim-level cards (details, analyse, status history, underpayment) that
+# look the same for every user.
+CLAIM_CARDS_FRAGMENT = 'claim_cards'
+
+
+def invalidate_claim_cards(claim_pks):
+    """
+    Drops the cached claim-level cards of the given claims, now and again once
+    the current transaction commits (a concurrent request may have re-cached
+    the old version in between).
+    """
+    keys = [make_template_fragment_key(CLAIM_CARDS_FRAGMENT, [pk]) for pk in claim_pks]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
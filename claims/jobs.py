@@ -0,0 +1,131 @@
+# claims/jobs.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import UploadJob
+from .utils import iter_data_from_stream, load_claim_data
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Returns the process-wide pool that runs upload jobs, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CLAIMS_UPLOAD_WORKERS,
+                thread_name_prefix='claims-upload',
+            )
+    return _executor
+
+
+def describe_upload_error(e):
+    """
+    Turns an exception raised while loading an upload into a message for the user.
+    """
+    if isinstance(e, ValueError):
+        # Provide more specific guidance for common errors
+        return f'Upload failed due to a data format issue: {e}. Please ensure your file matches the template.'
+    if isinstance(e, KeyError):
+        return f"Upload failed. A required column is missing from your data: '{e}'. Please check your file against the template."
+    return f'An unexpected error occurred: {e}'
+
+
+def enqueue_upload_job(job):
+    """
+    Hands a queued job to the local worker pool once the current transaction commits.
+
+    With `CLAIMS_UPLOAD_EAGER` set, the job runs immediately in the calling thread.
+    """
+    if settings.CLAIMS_UPLOAD_EAGER:
+        run_upload_job(job.pk)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, job.pk))
+
+
+def requeue_stale_jobs(job_ids=None):
+    """
+    Puts running jobs whose heartbeat is older than `CLAIMS_UPLOAD_STALE_SECONDS`
+    back in the queue. Their worker went away (a restart, a killed process) while
+    the uploaded files are still on disk, so the job can simply run again.
+
+    :param job_ids: limit the check to these jobs.
+    :return: the number of jobs requeued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CLAIMS_UPLOAD_STALE_SECONDS)
+    stale = UploadJob.objects.filter(status=UploadJob.STATUS_RUNNING, heartbeat_at__lt=cutoff)
+    if job_ids is not None:
+        stale = stale.filter(pk__in=job_ids)
+    return stale.update(status=UploadJob.STATUS_QUEUED, started_at=None, heartbeat_at=None, rows_processed=0)
+
+
+def _run_in_worker(job_id):
+    try:
+        run_upload_job(job_id)
+    finally:
+        # Worker threads hold their own connection; don't leave it open between jobs.
+        connection.close()
+
+
+def run_upload_job(job_id):
+    """
+    Loads the files of a queued job through the streaming ingestion pipeline,
+    recording progress and the outcome on the job.
+
+    :return: False if the job was no longer queued (another worker claimed it).
+    """
+    now = timezone.now()
+    claimed = UploadJob.objects.filter(pk=job_id, status=UploadJob.STATUS_QUEUED).update(
+        status=UploadJob.STATUS_RUNNING, started_at=now, heartbeat_at=now
+    )
+    if not claimed:
+        return False
+
+    job = UploadJob.objects.get(pk=job_id)
+
+    def progress(rows):
+        UploadJob.objects.filter(pk=job_id).update(
+            rows_processed=F('rows_processed') + rows, heartbeat_at=timezone.now()
+        )
+
+    try:
+        with job.claims_file.open('rb') as f_claims, job.details_file.open('rb') as f_details:
+            loader = load_claim_data(
+                iter_data_from_stream(f_claims, job.claims_file.name),
+                iter_data_from_stream(f_details, job.details_file.name),
+                job.mode,
+                progress=progress,
+            )
+    except Exception as e:
+        UploadJob.objects.filter(pk=job_id).update(
+            status=UploadJob.STATUS_FAILED,
+            error=describe_upload_error(e),
+            finished_at=timezone.now(),
+        )
+    else:
+        UploadJob.objects.filter(pk=job_id).update(
+            status=UploadJob.STATUS_DONE,
+            claims_created=loader.claims_created,
+            claims_updated=loader.claims_updated,
+            claims_unchanged=loader.claims_unchanged,
+            claims_removed=loader.claims_removed,
+            details_created=loader.details_created,
+            details_updated=loader.details_updated,
+            details_unchanged=loader.details_unchanged,
+            details_removed=loader.details_removed,
+            finished_at=timezone.now(),
+        )
+    finally:
+        # The rows are in the database now; the uploaded copies are no longer needed.
+        job.claims_file.delete(save=False)
+        job.details_file.delete(save=False)
+    return True
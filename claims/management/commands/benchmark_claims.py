@@ -0,0 +1,294 @@
+# claims/management/commands/benchmark_claims.py
+
+import itertools
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import django
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from claims.models import Claim
+from claims.pagination import KEYSET_ORDERING, encode_cursor
+from claims.synthetic import claim_rows, detail_rows, seed_activity
+from claims.utils import load_claim_data, process_claim_data
+
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+# Filter values that hit the synthetic data with realistic selectivity.
+LIST_FILTERS = {
+    'q': 'smi',
+    'patient_name': 'Garcia',
+    'status': 'Denied',
+    'insurer_name': 'Aetna',
+}
+
+# Rows in each file posted to the upload view.
+UPLOAD_ROWS = 500
+
+
+def parse_size(value):
+    """Reads '10k', '1M' or '250000' as a number of claims."""
+    value = value.strip().lower()
+    multiplier = SIZE_SUFFIXES.get(value[-1:], 1)
+    digits = value[:-1] if value[-1:] in SIZE_SUFFIXES else value
+    try:
+        return int(float(digits) * multiplier)
+    except ValueError:
+        raise CommandError(f'Invalid dataset size: {value!r}')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class QueryCounter:
+    """
+    Counts queries on the default connection without keeping their SQL
+    (which would skew peak RSS on large ingests).
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _csv(rows):
+    rows = list(rows)
+    header = list(rows[0])
+    lines = [','.join(header)] + [','.join(str(row[key]) for key in header) for row in rows]
+    return '\n'.join(lines).encode('utf-8')
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates reproducible synthetic datasets (e.g. 10k/100k/1M/10M claims) and times the hot paths '
+        'against them: ingestion, the claim list with every filter combination, claim detail, dashboard and '
+        'upload. Writes a JSON report with p50/p95/p99 latency, query counts and peak RSS. Runs in a '
+        'throwaway test database unless --use-current-db is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10k', help="Comma-separated dataset sizes, e.g. '10k,100k,1M,10M'.")
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario.')
+        parser.add_argument('--users', type=int, default=20, help='Synthetic users owning notes, flags and history.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument(
+            '--use-current-db',
+            action='store_true',
+            help='Benchmark the configured database instead of a throwaway test database. Existing claims are replaced!'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [parse_size(size) for size in options['sizes'].split(',') if size.strip()]
+        if not sizes or options['iterations'] < 1:
+            raise CommandError('Need at least one dataset size and one iteration.')
+
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+            },
+            'datasets': [],
+        }
+
+        old_name = None
+        test_environment = False
+        if not options['use_current_db']:
+            try:
+                setup_test_environment()
+                test_environment = True
+            except RuntimeError:
+                pass  # Already set up (e.g. when run from the test suite).
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            # Uploaded files from the upload scenario land in a scratch MEDIA_ROOT.
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                for size in sizes:
+                    self.stderr.write(f'Benchmarking {size:,} claims...')
+                    report['datasets'].append(self._run_dataset(size, options))
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            if test_environment:
+                teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def _run_dataset(self, size, options):
+        seed = options['seed']
+        result = {'claims': size, 'ingest': self._ingest(size, seed), 'ingest_delta': self._ingest_delta(size, seed)}
+        users = seed_activity(users=options['users'], seed=seed)
+        cache.clear()
+
+        client = Client()
+        client.force_login(users[0])
+        scenarios = self._scenarios(size, seed)
+        result['scenarios'] = {
+            name: self._time_requests(client, make_request, options['iterations'], before)
+            for name, make_request, before in scenarios
+        }
+        return result
+
+    def _ingest(self, size, seed):
+        cache.clear()
+        with QueryCounter() as queries:
+            started = time.perf_counter()
+            stats = process_claim_data(claim_rows(size, seed), detail_rows(size, seed), 'overwrite')
+            elapsed = time.perf_counter() - started
+        return {
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(2 * size / elapsed) if elapsed else None,
+            'queries': queries.count,
+            'claims_created': stats[0],
+            'details_created': stats[2],
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    def _ingest_delta(self, size, seed):
+        """Re-loads the same dataset in delta mode with 1% of the claims changed."""
+        def changed_rows():
+            for row in claim_rows(size, seed):
+                if row['id'] % 100 == 0:
+                    row['paid_amount'] = '0.00'
+                yield row
+
+        cache.clear()
+        with QueryCounter() as queries:
+            started = time.perf_counter()
+            loader = load_claim_data(changed_rows(), detail_rows(size, seed), 'delta')
+            elapsed = time.perf_counter() - started
+        return {
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(2 * size / elapsed) if elapsed else None,
+            'queries': queries.count,
+            **{f'claims_{key}': value for key, value in loader.delta_stats['claims'].items()},
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    def _scenarios(self, size, seed):
+        """Returns (name, callable(client, i) -> response, callable run before each timed request or None)."""
+        list_url = reverse('claims:claim-list')
+        scenarios = []
+
+        for count in range(len(LIST_FILTERS) + 1):
+            for keys in itertools.combinations(LIST_FILTERS, count):
+                params = {key: LIST_FILTERS[key] for key in keys}
+                name = 'claim_list[' + ','.join(keys or ['unfiltered']) + ']'
+                scenarios.append((name, lambda client, i, params=params: client.get(list_url, params, HTTP_HX_REQUEST='true'), None))
+
+        # A cursor about 90% of the way through the list.
+        deep_claim = Claim.objects.order_by(*KEYSET_ORDERING)[int(size * 0.9):].first()
+        if deep_claim is not None:
+            deep_cursor = encode_cursor(deep_claim)
+            scenarios.append((
+                'claim_list[deep_cursor]',
+                lambda client, i: client.get(list_url, {'cursor': deep_cursor}, HTTP_HX_REQUEST='true'),
+                None,
+            ))
+
+        rng = random.Random(seed + 3)
+        sample_ids = rng.sample(range(1, size + 1), min(size, 200))
+        detail_pks = list(Claim.objects.filter(claim_id__in=sample_ids).values_list('pk', flat=True))
+        scenarios.append((
+            'claim_detail',
+            lambda client, i: client.get(reverse('claims:claim-detail', kwargs={'pk': detail_pks[i % len(detail_pks)]})),
+            None,
+        ))
+
+        scenarios.append(('dashboard[cold_cache]', lambda client, i: client.get(reverse('claims:dashboard')), cache.clear))
+        scenarios.append(('dashboard[warm_cache]', lambda client, i: client.get(reverse('claims:dashboard')), None))
+
+        start_id = size + 1
+        upload_claims = _csv(claim_rows(UPLOAD_ROWS, seed + 4, start_id=start_id))
+        upload_details = _csv(detail_rows(UPLOAD_ROWS, seed + 4, start_id=start_id))
+
+        def upload(client, i):
+            # Jobs run inline so the timing covers the whole load, not just the enqueue.
+            with override_settings(CLAIMS_UPLOAD_EAGER=True):
+                return client.post(reverse('claims:upload-claims'), {
+                    'claims_file': SimpleUploadedFile('claims.csv', upload_claims, content_type='text/csv'),
+                    'details_file': SimpleUploadedFile('details.csv', upload_details, content_type='text/csv'),
+                    'mode': 'append',
+                })
+        scenarios.append((f'upload_claims[{UPLOAD_ROWS}_rows]', upload, None))
+        return scenarios
+
+    def _time_requests(self, client, make_request, iterations, before=None):
+        # One untimed request warms up connections, templates and URL resolution.
+        make_request(client, 0)
+        timings, query_counts = [], []
+        for i in range(iterations):
+            if before:
+                before()
+            with QueryCounter() as queries:
+                started = time.perf_counter()
+                response = make_request(client, i)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f'Request failed with status {response.status_code}')
+            query_counts.append(queries.count)
+
+        timings.sort()
+        return {
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': max(query_counts),
+            'peak_rss_mb': peak_rss_mb(),
+        }
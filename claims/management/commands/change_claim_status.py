@@ -0,0 +1,84 @@
+# claims/management/commands/change_claim_status.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from claims.models import Claim
+from claims.search import FILTER_PARAMS, filter_claim_list
+from claims.status_changes import change_claim_statuses, parse_claim_ids
+from claims.utils import BATCH_SIZE, chunked
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves many claims to one status in a single transaction, recording a history entry for each. '
+        'Select the claims by claim ID (--claim-ids, or --ids-file with one or more IDs per line) or with '
+        "the claim list's filters (--filter status=Denied --filter insurer_name=Acme). Claims already in "
+        'the new status are left alone.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('status', choices=[value for value, _ in Claim.STATUS_CHOICES], help='The new status.')
+        parser.add_argument('--claim-ids', nargs='+', default=[], help='Claim IDs to change.')
+        parser.add_argument('--ids-file', help='File of claim IDs separated by commas, spaces or newlines.')
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='NAME=VALUE',
+            help=f"A claim list filter ({', '.join(FILTER_PARAMS)}); repeat to combine them.",
+        )
+        parser.add_argument('--comment', default='', help='Comment stored with each history entry.')
+        parser.add_argument('--username', help='User the history entries are attributed to.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Claims written per statement.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many claims would change.')
+
+    def handle(self, *args, **options):
+        new_status = options['status']
+        claims = self._selection(options)
+
+        user = None
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['username']!r}.")
+
+        if options['dry_run']:
+            if isinstance(claims, list):
+                selections = [
+                    Claim.objects.filter(claim_id__in=chunk) for chunk in chunked(sorted(set(claims)), options['batch_size'])
+                ]
+            else:
+                selections = [claims]
+            count = sum(selection.exclude(status=new_status).count() for selection in selections)
+            self.stdout.write(f'{count} claims would move to {new_status}.')
+            return
+
+        changed = change_claim_statuses(
+            claims, new_status, user=user, comment=options['comment'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{changed} claims moved to {new_status}.'))
+
+    def _selection(self, options):
+        """Returns the claim IDs to change, or a filtered queryset of claims."""
+        try:
+            ids = parse_claim_ids(' '.join(options['claim_ids']))
+            if options['ids_file']:
+                with open(options['ids_file']) as f:
+                    ids += parse_claim_ids(f.read())
+        except ValueError:
+            raise CommandError('Claim IDs must be whole numbers.')
+        except OSError as e:
+            raise CommandError(f'Could not read {options["ids_file"]}: {e}')
+
+        params = {}
+        for item in options['filter']:
+            name, sep, value = item.partition('=')
+            if not sep or name not in FILTER_PARAMS:
+                raise CommandError(f"Filters take the form NAME=VALUE with NAME one of {', '.join(FILTER_PARAMS)}.")
+            params[name] = value
+
+        if ids and params:
+            raise CommandError('Select claims either by ID or by filter, not both.')
+        if ids:
+            return ids
+        claims, filtered = filter_claim_list(Claim.objects.all(), params)
+        if not filtered:
+            raise CommandError('Give claim IDs or at least one filter; refusing to change every claim.')
+        return claims
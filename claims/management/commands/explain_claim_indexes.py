@@ -0,0 +1,93 @@
+# claims/management/commands/explain_claim_indexes.py
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from claims.models import Claim, ClaimHistory, Flag, Note
+from claims.aging import worklist_claims
+from claims.pagination import KEYSET_ORDERING, OLDEST_FIRST_ORDERING
+from claims.synthetic import claim_rows, detail_rows, seed_activity
+from claims.utils import process_claim_data
+
+# Indexes whose effect is shown: (model, index name).
+INDEXES = [
+    (Note, 'note_claim_created_idx'),
+    (Flag, 'flag_user_created_idx'),
+    (ClaimHistory, 'history_claim_timestamp_idx'),
+    (ClaimHistory, 'history_timestamp_idx'),
+    (Claim, 'claim_discharge_id_idx'),
+    (Claim, 'claim_status_discharge_idx'),
+]
+
+class Command(BaseCommand):
+    help = (
+        'Seeds synthetic claims, notes, flags and history inside a transaction that is rolled back, '
+        'then prints the query plans of the claim list, detail and dashboard lookups with and without '
+        'the per-user lookup indexes. Nothing is left in the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--claims', type=int, default=20000, help='Number of synthetic claims to seed.')
+        parser.add_argument('--users', type=int, default=20, help='Number of synthetic users.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data.')
+
+    def _queries(self, user, claim):
+        visible_notes = Q(is_public=True) | Q(user=user)
+        return [
+            ('claim list (flag Exists, keyset page)', Claim.objects.for_list(user).order_by(*KEYSET_ORDERING)[:6]),
+            ('claim detail: visible notes', Note.objects.filter(claim=claim).filter(visible_notes)),
+            ('claim detail: status history', ClaimHistory.objects.filter(claim=claim)),
+            ('dashboard: my flag count', Flag.objects.filter(user=user).order_by()),
+            ('dashboard: my flagged claims', Claim.objects.filter(flags__user=user).order_by('-flags__created_at')[:5]),
+            ('aging worklist (keyset page)', worklist_claims(Claim.STATUS_UNDER_REVIEW).order_by(*OLDEST_FIRST_ORDERING)[:26]),
+            ('dashboard: recent activity', ClaimHistory.objects.select_related('claim', 'user').order_by('-timestamp')[:5]),
+        ]
+
+    def _analyze(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            elif connection.vendor == 'postgresql':
+                for model in (Claim, Note, Flag, ClaimHistory):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+    def _explain(self, queries):
+        return {label: queryset.explain() for label, queryset in queries}
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Seeding {options['claims']} claims and {options['users']} users (rolled back afterwards)...")
+
+        with transaction.atomic():
+            process_claim_data(
+                claim_rows(options['claims'], options['seed']), detail_rows(options['claims'], options['seed']), 'append'
+            )
+            users = seed_activity(users=options['users'], seed=options['seed'])
+            user = users[0]
+            claim = Note.objects.filter(user=user).values_list('claim', flat=True).first()
+            queries = self._queries(user, Claim.objects.get(pk=claim) if claim else Claim.objects.first())
+
+            self._analyze()
+            with_indexes = self._explain(queries)
+
+            with connection.cursor() as cursor:
+                for _, name in INDEXES:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+            self._analyze()
+            without_indexes = self._explain(queries)
+
+            transaction.set_rollback(True)
+
+        index_names = [name for _, name in INDEXES]
+        for label, _ in queries:
+            used = [name for name in index_names if name in with_indexes[label]]
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+            self.stdout.write(f"  uses: {', '.join(used) or 'none of the new indexes'}")
+            self.stdout.write('  before (without indexes):')
+            self.stdout.write(self._indent(without_indexes[label]))
+            self.stdout.write('  after (with indexes):')
+            self.stdout.write(self._indent(with_indexes[label]))
+
+        self.stdout.write(self.style.SUCCESS('\nDone. The seeded data and dropped indexes were rolled back.'))
+
+    def _indent(self, plan):
+        return '\n'.join(f'    {line}' for line in plan.splitlines())
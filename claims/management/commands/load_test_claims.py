@@ -0,0 +1,256 @@
+# claims/management/commands/load_test_claims.py
+
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from claims.models import Claim
+
+from .benchmark_claims import _git_commit, percentile
+
+# What each virtual user clicks, with relative weights: mostly the HTMX partials.
+SCENARIOS = {
+    'claim_detail': 5,
+    'claim_list': 3,
+    'claim_list[filtered]': 1,
+    'flag_claim': 1,
+}
+
+# Claims the virtual users click through.
+SAMPLE_CLAIMS = 200
+
+TIMEOUT_SECONDS = 60
+
+
+class LoadTest:
+    """
+    Virtual users, one thread each, clicking through the claim pages of a
+    running server as one logged-in account for a fixed time.
+    """
+    def __init__(self, base_url, headers, claim_pks, seed=0):
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers
+        self.claim_pks = claim_pks
+        self.seed = seed
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def request(self, path, data=None, hx=True):
+        """Sends one request and returns (milliseconds, whether it succeeded), reading the whole body."""
+        headers = dict(self.headers)
+        if hx:
+            headers['HX-Request'] = 'true'
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=TIMEOUT_SECONDS) as response:
+                while response.read(64 * 1024):
+                    pass
+            ok = True
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    def click(self, scenario, rng):
+        """Runs one scenario and returns its [(milliseconds, ok)] requests."""
+        pk = rng.choice(self.claim_pks)
+        if scenario == 'claim_detail':
+            return [self.request(reverse('claims:claim-detail', kwargs={'pk': pk}))]
+        if scenario == 'claim_list':
+            return [self.request(reverse('claims:claim-list'))]
+        if scenario == 'claim_list[filtered]':
+            return [self.request(reverse('claims:claim-list') + '?status=Denied')]
+        if scenario == 'flag_claim':
+            # Flag and unflag, so the run leaves the account's flags as it found them.
+            url = reverse('claims:flag-claim', kwargs={'pk': pk})
+            return [self.request(url, data={}), self.request(url, data={})]
+        if scenario == 'export':
+            return [self.request(reverse('claims:export-claims'), hx=False)]
+        raise ValueError(scenario)
+
+    def _run(self, index, scenarios, deadline):
+        rng = random.Random(self.seed + index)
+        names, weights = zip(*scenarios.items())
+        samples = {}
+        while time.monotonic() < deadline:
+            scenario = rng.choices(names, weights)[0]
+            samples.setdefault(scenario, []).extend(self.click(scenario, rng))
+        with self._lock:
+            for scenario, results in samples.items():
+                self.samples.setdefault(scenario, []).extend(results)
+
+    def run(self, users, duration, background=0):
+        """
+        Runs `users` virtual users for `duration` seconds, alongside
+        `background` users streaming the full CSV export over and over.
+        """
+        deadline = time.monotonic() + duration
+        threads = [
+            threading.Thread(target=self._run, args=(i, SCENARIOS, deadline), daemon=True)
+            for i in range(users)
+        ] + [
+            threading.Thread(target=self._run, args=(users + i, {'export': 1}, deadline), daemon=True)
+            for i in range(background)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - started
+
+    def report(self, elapsed):
+        endpoints = {}
+        total = errors = 0
+        for scenario, results in sorted(self.samples.items()):
+            timings = sorted(ms for ms, ok in results if ok)
+            failed = sum(1 for _, ok in results if not ok)
+            endpoints[scenario] = {
+                'requests': len(results),
+                'errors': failed,
+                'requests_per_second': round(len(timings) / elapsed, 2),
+                'p50_ms': round(percentile(timings, 0.50), 3) if timings else None,
+                'p95_ms': round(percentile(timings, 0.95), 3) if timings else None,
+                'p99_ms': round(percentile(timings, 0.99), 3) if timings else None,
+            }
+            if scenario != 'export':
+                total += len(results)
+                errors += failed
+        return {
+            # Throughput of the interactive requests; the background exports are reported per endpoint only.
+            'requests': total,
+            'errors': errors,
+            'requests_per_second': round((total - errors) / elapsed, 2),
+            'endpoints': endpoints,
+        }
+
+
+def log_in(base_url, username, password):
+    """Logs in through the login form and returns the headers that carry the session and CSRF token."""
+    jar = CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    login_url = base_url.rstrip('/') + reverse('claims:login')
+    try:
+        opener.open(login_url, timeout=TIMEOUT_SECONDS).read()
+        csrf_token = _cookie(jar, settings.CSRF_COOKIE_NAME)
+        data = urllib.parse.urlencode({
+            'username': username, 'password': password, 'csrfmiddlewaretoken': csrf_token or '',
+        }).encode()
+        opener.open(urllib.request.Request(login_url, data=data, headers={'Referer': login_url}), timeout=TIMEOUT_SECONDS).read()
+    except (urllib.error.URLError, OSError) as e:
+        raise CommandError(f'Could not log in at {login_url}: {e}')
+    if _cookie(jar, settings.SESSION_COOKIE_NAME) is None:
+        raise CommandError(f'Could not log in at {login_url} as {username!r}; check the credentials.')
+    return {
+        'Cookie': '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar),
+        # Logging in rotates the token.
+        'X-CSRFToken': _cookie(jar, settings.CSRF_COOKIE_NAME) or '',
+        'Referer': login_url,
+    }
+
+
+def _cookie(jar, name):
+    return next((cookie.value for cookie in jar if cookie.name == name), None)
+
+
+def _compare(report, baseline):
+    """Ratios of this run to a baseline report: above 1 means more requests per second or a slower p95."""
+    ratios = {}
+    for scenario, result in report['endpoints'].items():
+        base = baseline['endpoints'].get(scenario)
+        if not base:
+            continue
+        ratios[scenario] = {
+            'requests_per_second': base['requests_per_second'] and round(result['requests_per_second'] / base['requests_per_second'], 2),
+            'p95_ms': base['p95_ms'] and result['p95_ms'] and round(result['p95_ms'] / base['p95_ms'], 2),
+        }
+    base_rps = baseline['requests_per_second']
+    return {
+        'label': baseline['meta'].get('label'),
+        'requests_per_second': base_rps and round(report['requests_per_second'] / base_rps, 2),
+        'endpoints': ratios,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests a running server with concurrent virtual users clicking through the HTMX partials '
+        '(claim list, claim detail, flag toggles), optionally while other users stream the CSV export. '
+        'Reports requests per second and p50/p95/p99 latency per endpoint as JSON. Run it once against the '
+        'sync deployment (SERVER_MODE=wsgi) and once against the ASGI one, passing the first report as '
+        '--baseline. Claim keys are read from the configured database, so use the server\'s settings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8080', help='Base URL of the server.')
+        parser.add_argument('--username', required=True, help='Account the virtual users log in as.')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users.')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run for.')
+        parser.add_argument(
+            '--background', type=int, default=0,
+            help='Extra users streaming the full CSV export meanwhile, standing in for slow requests.'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the virtual users.')
+        parser.add_argument('--label', help="Name for this run in the report, e.g. 'wsgi' or 'asgi'.")
+        parser.add_argument('--baseline', help='Earlier report to compare this run with.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['duration'] <= 0:
+            raise CommandError('Need at least one user and a positive duration.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        claim_pks = list(Claim.objects.order_by('pk').values_list('pk', flat=True)[:SAMPLE_CLAIMS])
+        if not claim_pks:
+            raise CommandError('There are no claims to request; load some first.')
+
+        headers = log_in(options['url'], options['username'], options['password'])
+        test = LoadTest(options['url'], headers, claim_pks, seed=options['seed'])
+        # One untimed round warms up connections, templates and caches.
+        warmup = random.Random(options['seed'])
+        for scenario in SCENARIOS:
+            test.click(scenario, warmup)
+
+        self.stderr.write(
+            f"Running {options['users']} users (+{options['background']} exporting) "
+            f"against {options['url']} for {options['duration']:g}s..."
+        )
+        started_at = datetime.now(timezone.utc).isoformat()
+        elapsed = test.run(options['users'], options['duration'], options['background'])
+
+        report = {
+            'meta': {
+                'label': options['label'],
+                'commit': _git_commit(),
+                'started_at': started_at,
+                'url': options['url'],
+                'users': options['users'],
+                'background': options['background'],
+                'duration_seconds': round(elapsed, 3),
+            },
+            **test.report(elapsed),
+        }
+        if baseline is not None:
+            report['vs_baseline'] = _compare(report, baseline)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,58 @@
+# claims/management/commands/process_upload_jobs.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from claims.jobs import requeue_stale_jobs, run_upload_job
+from claims.models import UploadJob
+
+class Command(BaseCommand):
+    help = (
+        'Runs queued upload jobs in this process. Use it to pick up jobs left behind '
+        'when a web worker restarted, or with --loop as a standalone worker. Running '
+        'jobs whose worker stopped reporting progress are requeued first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requeue-running',
+            action='store_true',
+            help='Put every running job back in the queue first, however recent its heartbeat (only when no other worker is active).'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new jobs instead of exiting when the queue is empty.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls with --loop.'
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            requeued = UploadJob.objects.filter(status=UploadJob.STATUS_RUNNING).update(
+                status=UploadJob.STATUS_QUEUED, started_at=None, heartbeat_at=None, rows_processed=0
+            )
+            self.stdout.write(f'Requeued {requeued} interrupted job(s).')
+
+        while True:
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale job(s).')
+            job_ids = list(
+                UploadJob.objects.filter(status=UploadJob.STATUS_QUEUED).order_by('created_at').values_list('pk', flat=True)
+            )
+            for job_id in job_ids:
+                if run_upload_job(job_id):
+                    job = UploadJob.objects.get(pk=job_id)
+                    style = self.style.SUCCESS if job.status == UploadJob.STATUS_DONE else self.style.ERROR
+                    self.stdout.write(style(f'Job {job.pk} {job.status}: {job.error or job.success_message}'))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('No queued upload jobs remain.'))
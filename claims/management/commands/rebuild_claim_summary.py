@@ -0,0 +1,18 @@
+# claims/management/commands/rebuild_claim_summary.py
+
+from django.core.management.base import BaseCommand
+from claims.models import ClaimStatusSummary, DenialReason
+from claims.summary import rebuild_summary
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the dashboard summary tables from the claims data. Run it after '
+        'changing claims outside the app (raw SQL, fixtures) to correct any drift.'
+    )
+
+    def handle(self, *args, **options):
+        rebuild_summary()
+        self.stdout.write(self.style.SUCCESS(
+            f'Dashboard summary rebuilt: {ClaimStatusSummary.objects.count()} statuses, '
+            f'{DenialReason.objects.filter(claim_count__gt=0).count()} denial reasons.'
+        ))
@@ -0,0 +1,16 @@
+# claims/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from claims.search import rebuild_search_index
+
+class Command(BaseCommand):
+    help = (
+        'Recreates the claim search index from the claims tables. Run it after '
+        'changing claims outside the app (raw SQL, fixtures).'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,79 @@
+# claims/management/commands/summarize_slow_queries.py
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from claims.diagnostics import slow_query_log_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarizes the slow-query log (every process's file, including rotated ones): the query fingerprints with the most "
+        'total time, and the probable N+1 patterns by view with the call site that triggered them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None, help='Log file to read (defaults to CLAIMS_SLOW_QUERY_LOG).')
+        parser.add_argument('--top', type=int, default=10, help='Number of fingerprints to list.')
+
+    def _entries(self, path):
+        for name in slow_query_log_files(path):
+            with open(name, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Not one of ours (or cut off mid-write).
+                    if isinstance(entry, dict) and 'fingerprint' in entry:
+                        yield entry
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.CLAIMS_SLOW_QUERY_LOG
+        if not path:
+            raise CommandError('No log file given and CLAIMS_SLOW_QUERY_LOG is not set.')
+
+        slow, n_plus_one = {}, {}
+        for entry in self._entries(path):
+            if entry.get('kind') == 'slow':
+                stats = slow.setdefault(entry['fingerprint'], {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': set()})
+                stats['count'] += 1
+                stats['total_ms'] += entry['duration_ms']
+                stats['max_ms'] = max(stats['max_ms'], entry['duration_ms'])
+                stats['views'].add(entry.get('view') or '-')
+            elif entry.get('kind') == 'n_plus_one':
+                key = (entry.get('view') or '-', entry['fingerprint'])
+                stats = n_plus_one.setdefault(key, {'requests': 0, 'executions': 0, 'total_ms': 0.0})
+                stats['requests'] += 1
+                stats['executions'] += entry['executions']
+                stats['total_ms'] += entry['duration_ms']
+                stats['call_site'] = entry.get('call_site', '')
+
+        if not slow and not n_plus_one:
+            self.stdout.write(f'No entries in {path}.')
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Top slow query fingerprints by total time ({path}):'))
+        ranked = sorted(slow.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:options['top']]
+        for key, stats in ranked:
+            self.stdout.write(
+                f"\n  {stats['total_ms']:.1f} ms total, {stats['count']} x, "
+                f"mean {stats['total_ms'] / stats['count']:.1f} ms, max {stats['max_ms']:.1f} ms "
+                f"[{', '.join(sorted(stats['views']))}]"
+            )
+            self.stdout.write(f'    {key}')
+        if not ranked:
+            self.stdout.write('  none')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nProbable N+1 queries by total time:'))
+        ranked = sorted(n_plus_one.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:options['top']]
+        for (view, key), stats in ranked:
+            self.stdout.write(
+                f"\n  {view}: {stats['executions']} executions in {stats['requests']} request(s), "
+                f"{stats['total_ms']:.1f} ms total"
+            )
+            self.stdout.write(f'    {key}')
+            self.stdout.write('    first call site:')
+            self.stdout.write('\n'.join(f'      {line}' for line in stats['call_site'].rstrip().splitlines()))
+        if not ranked:
+            self.stdout.write('  none')
@@ -0,0 +1,300 @@
+# claims/middleware.py
+
+"""
+Per-request performance instrumentation.
+
+`PerformanceMiddleware` times every request and, through a
+`connection.execute_wrapper` hook, its database queries; template rendering is
+timed by wrapping the Django template backend. The figures go out as a
+`Server-Timing` header (to staff users only, as query counts and timings say
+a lot about the backend) and into a process-local registry that
+`metrics_view` serves in the Prometheus text format. With
+`CLAIMS_QUERY_DIAGNOSTICS` on, the queries of a
+`CLAIMS_QUERY_DIAGNOSTICS_SAMPLE_RATE` fraction of requests are also checked
+for N+1 patterns and slow statements (see `claims.diagnostics`).
+
+Without diagnostics the per-query cost is one function call and a hash, so
+the metrics can stay on in production; diagnostics run regexes over every
+query, so sample them there. Each worker process keeps its own registry;
+scrape every worker (or aggregate) when running several.
+"""
+
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .diagnostics import QueryDiagnostics
+
+# Upper bounds of the latency histogram buckets, in seconds.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the queries-per-request histogram buckets.
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('claims_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request spent, filled in while it runs."""
+    __slots__ = ('db_time', 'query_count', 'duplicate_count', 'template_time', '_seen', 'observers')
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.query_count = 0
+        self.duplicate_count = 0
+        self.template_time = 0.0
+        self._seen = set()
+        # Extra callables given (sql, params, many, duration) for every query.
+        self.observers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_time += duration
+            self.query_count += 1
+            if not many:
+                try:
+                    key = hash((sql, tuple(params or ())))
+                except TypeError:
+                    key = hash((sql, repr(params)))
+                if key in self._seen:
+                    self.duplicate_count += 1
+                else:
+                    self._seen.add(key)
+            for observer in self.observers:
+                observer(sql, params, many, duration)
+
+
+def current_metrics():
+    """The metrics of the request being handled in this context, or None."""
+    return _current.get()
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Thread-safe, process-local store of per-view request metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, method, status, duration, metrics, response_bytes):
+        with self._lock:
+            entry = self._views.get(view)
+            if entry is None:
+                entry = self._views[view] = {
+                    'duration': _Histogram(DURATION_BUCKETS),
+                    'queries': _Histogram(QUERY_BUCKETS),
+                    'db_seconds': 0.0,
+                    'template_seconds': 0.0,
+                    'duplicate_queries': 0,
+                    'response_bytes': 0,
+                    'responses': {},
+                }
+            entry['duration'].observe(duration)
+            entry['queries'].observe(metrics.query_count)
+            entry['db_seconds'] += metrics.db_time
+            entry['template_seconds'] += metrics.template_time
+            entry['duplicate_queries'] += metrics.duplicate_count
+            entry['response_bytes'] += response_bytes or 0
+            key = (method, status // 100 * 100)
+            entry['responses'][key] = entry['responses'].get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        """Returns the registry in the Prometheus text exposition format."""
+        lines = []
+
+        def histogram(name, help_text, field):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for view, entry in views:
+                hist = entry[field]
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ('+Inf',), hist.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{view="{view}"}} {hist.sum:.6f}')
+                lines.append(f'{name}_count{{view="{view}"}} {hist.count}')
+
+        def counter(name, help_text, field):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for view, entry in views:
+                lines.append(f'{name}{{view="{view}"}} {entry[field]}')
+
+        with self._lock:
+            views = sorted(
+                ((_escape_label(view), _snapshot(entry)) for view, entry in self._views.items()),
+                key=lambda item: item[0],
+            )
+
+        histogram('claims_http_request_duration_seconds', 'Time spent handling requests.', 'duration')
+        histogram('claims_http_request_queries', 'Database queries per request.', 'queries')
+        counter('claims_http_request_db_seconds_total', 'Time spent in database queries.', 'db_seconds')
+        counter('claims_http_request_template_seconds_total', 'Time spent rendering templates (includes queries run from templates).', 'template_seconds')
+        counter('claims_http_request_duplicate_queries_total', 'Queries repeating an earlier query of the same request with the same parameters.', 'duplicate_queries')
+        counter('claims_http_response_bytes_total', 'Bytes of non-streaming response bodies.', 'response_bytes')
+
+        lines.append('# HELP claims_http_responses_total Responses by method and status class.')
+        lines.append('# TYPE claims_http_responses_total counter')
+        for view, entry in views:
+            for (method, status), count in sorted(entry['responses'].items()):
+                lines.append(f'claims_http_responses_total{{view="{view}",method="{method}",status="{status // 100}xx"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _snapshot(entry):
+    snapshot = dict(entry)
+    for field in ('duration', 'queries'):
+        hist = _Histogram(entry[field].buckets)
+        hist.counts, hist.sum, hist.count = list(entry[field].counts), entry[field].sum, entry[field].count
+        snapshot[field] = hist
+    snapshot['responses'] = dict(entry['responses'])
+    return snapshot
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+def install_template_timing():
+    """
+    Wraps the Django template backend's `render` so the time spent rendering
+    is added to the current request's metrics. Safe to call more than once.
+    """
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'claims_timed', False):
+        return
+    original_render = Template.render
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return original_render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+    render.claims_timed = True
+    Template.render = render
+
+
+class PerformanceMiddleware:
+    """
+    Records view name, total time, DB time, query count, duplicate queries,
+    template time and response size for every request. Runs natively under
+    both WSGI and ASGI, so async views are not pushed back onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.CLAIMS_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        install_template_timing()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, diagnostics = self._start(request)
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with _wrap_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+        return self._finish(request, response, metrics, diagnostics, duration, getattr(request, 'user', None))
+
+    async def __acall__(self, request):
+        metrics, diagnostics = self._start(request)
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            # Connections are thread-local and the async ORM queries from the
+            # request's worker thread, so the wrappers go on there.
+            wrappers = await sync_to_async(_wrap_connections)(metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(wrappers.close)()
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+        # The lazy request.user cannot be loaded from async code.
+        user = None
+        if settings.CLAIMS_SERVER_TIMING and hasattr(request, 'auser'):
+            user = await request.auser()
+        return self._finish(request, response, metrics, diagnostics, duration, user)
+
+    def _start(self, request):
+        metrics = RequestMetrics()
+        diagnostics = None
+        if settings.CLAIMS_QUERY_DIAGNOSTICS and random.random() < settings.CLAIMS_QUERY_DIAGNOSTICS_SAMPLE_RATE:
+            diagnostics = QueryDiagnostics(request=request)
+            metrics.observers.append(diagnostics)
+        return metrics, diagnostics
+
+    def _finish(self, request, response, metrics, diagnostics, duration, user):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unresolved'
+        response_bytes = None if response.streaming else len(response.content)
+
+        registry.record(view, request.method, response.status_code, duration, metrics, response_bytes)
+        if diagnostics is not None:
+            diagnostics.finish(view)
+
+        if settings.CLAIMS_SERVER_TIMING and user is not None and user.is_staff:
+            response['Server-Timing'] = (
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.query_count} queries, '
+                f'{metrics.duplicate_count} duplicate", '
+                f'tpl;dur={metrics.template_time * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        return response
+
+
+def _wrap_connections(metrics):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(metrics))
+    return stack
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:04
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def populate_summary(apps, schema_editor):
+    Claim = apps.get_model('claims', 'Claim')
+    ClaimDetail = apps.get_model('claims', 'ClaimDetail')
+    ClaimStatusSummary = apps.get_model('claims', 'ClaimStatusSummary')
+    DenialReasonSummary = apps.get_model('claims', 'DenialReasonSummary')
+
+    ClaimStatusSummary.objects.bulk_create(
+        ClaimStatusSummary(status=row['status'], claim_count=row['claim_count'], underpayment_total=row['underpayment_total'] or 0)
+        for row in Claim.objects.order_by().values('status').annotate(
+            claim_count=Count('pk'), underpayment_total=Sum(F('billed_amount') - F('paid_amount'))
+        )
+    )
+    DenialReasonSummary.objects.bulk_create(
+        DenialReasonSummary(denial_reason=row['denial_reason'], claim_count=row['claim_count'])
+        for row in ClaimDetail.objects.exclude(denial_reason__isnull=True).exclude(denial_reason='').order_by().values(
+            'denial_reason'
+        ).annotate(claim_count=Count('pk'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0005_uploadjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimStatusSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=50, unique=True)),
+                ('claim_count', models.BigIntegerField(default=0)),
+                ('underpayment_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DenialReasonSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('denial_reason', models.TextField(unique=True)),
+                ('claim_count', models.BigIntegerField(db_index=True, default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
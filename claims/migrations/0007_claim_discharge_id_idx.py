@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0006_dashboard_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['discharge_date', 'id'], name='claim_discharge_id_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:09
+
+from django.db import migrations
+
+from claims.search import SEARCH_TABLE, create_search_table, drop_search_table
+
+# The index as the schema stood at this migration (denial reasons were still text on the
+# detail row); claims.search.reindex_claims follows the current schema, so it is not used here.
+_POPULATE_SQL = {
+    'sqlite': (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, claim_number, patient_name, insurer_name, status, denial_reason, cpt_codes) "
+        "SELECT c.id, c.claim_id, c.patient_name, c.insurer_name, c.status, "
+        "COALESCE(d.denial_reason, ''), COALESCE(d.cpt_codes, '') "
+        "FROM claims_claim c LEFT JOIN claims_claimdetail d ON d.claim_id = c.id"
+    ),
+    'postgresql': (
+        f'INSERT INTO {SEARCH_TABLE} (claim_id, document, body) '
+        "SELECT c.id, "
+        "setweight(to_tsvector('simple', c.claim_id::text || ' ' || c.patient_name), 'A') || "
+        "setweight(to_tsvector('simple', c.insurer_name), 'B') || "
+        "setweight(to_tsvector('simple', c.status || ' ' || COALESCE(d.denial_reason, '')), 'C') || "
+        "setweight(to_tsvector('simple', COALESCE(d.cpt_codes, '')), 'D'), "
+        "concat_ws(' ', c.claim_id::text, c.patient_name, c.insurer_name, c.status, d.denial_reason, d.cpt_codes) "
+        "FROM claims_claim c LEFT JOIN claims_claimdetail d ON d.claim_id = c.id"
+    ),
+}
+
+
+def create_and_populate(apps, schema_editor):
+    # SQLite: FTS5 virtual table. PostgreSQL: tsvector + trigram indexes. Other backends: nothing.
+    create_search_table(schema_editor)
+    vendor = schema_editor.connection.vendor
+    if vendor in _POPULATE_SQL:
+        schema_editor.execute(_POPULATE_SQL[vendor])
+
+
+def drop(apps, schema_editor):
+    drop_search_table(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0007_claim_discharge_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_and_populate, drop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0008_claim_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='claimhistory',
+            index=models.Index(fields=['claim', 'timestamp'], name='history_claim_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimhistory',
+            index=models.Index(fields=['timestamp'], name='history_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flag',
+            index=models.Index(fields=['user', 'created_at'], name='flag_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['claim', 'created_at'], name='note_claim_created_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0009_per_user_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claim',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='claimdetail',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='claims_removed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='claims_unchanged',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='details_removed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='details_unchanged',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0010_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimDetailStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('load_token', models.CharField(max_length=32)),
+                ('claim_id', models.IntegerField()),
+                ('cpt_codes', models.CharField(max_length=255)),
+                ('denial_reason', models.TextField(blank=True, null=True)),
+                ('content_hash', models.CharField(max_length=32)),
+                ('claim_pk', models.IntegerField(null=True)),
+                ('changed', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['load_token', 'claim_pk'], name='claim_detail_staging_pk_idx')],
+                'constraints': [models.UniqueConstraint(fields=('load_token', 'claim_id'), name='claim_detail_staging_unique_row')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClaimStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('load_token', models.CharField(max_length=32)),
+                ('claim_id', models.IntegerField()),
+                ('patient_name', models.CharField(max_length=255)),
+                ('billed_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('paid_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(max_length=50)),
+                ('insurer_name', models.CharField(max_length=255)),
+                ('discharge_date', models.DateField()),
+                ('content_hash', models.CharField(max_length=32)),
+                ('changed', models.BooleanField(default=False)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('load_token', 'claim_id'), name='claim_staging_unique_row')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_cpt_codes(apps, schema_editor):
+    # Splits the existing comma-separated strings the way claims.cpt.parse_cpt_codes does, a batch at a time.
+    ClaimDetail = apps.get_model('claims', 'ClaimDetail')
+    ClaimCptCode = apps.get_model('claims', 'ClaimCptCode')
+    last_pk = 0
+    while True:
+        batch = list(
+            ClaimDetail.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'claim_id', 'cpt_codes')[:2000]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+        ClaimCptCode.objects.bulk_create(
+            ClaimCptCode(claim_id=claim_pk, code=code)
+            for _, claim_pk, cpt_codes in batch
+            for code in dict.fromkeys(code.strip().upper() for code in (cpt_codes or '').split(','))
+            # Codes too long for the column are skipped rather than cut, which could merge two codes.
+            if code and len(code) <= 16
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0011_overwrite_staging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimCptCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=16)),
+                ('claim', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cpt_codes', to='claims.claim')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['code', 'claim'], name='cpt_code_claim_idx')],
+                'constraints': [models.UniqueConstraint(fields=('claim', 'code'), name='claim_cpt_code_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_cpt_codes, migrations.RunPython.noop),
+    ]
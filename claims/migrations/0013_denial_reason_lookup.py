@@ -0,0 +1,75 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def intern_denial_reasons(apps, schema_editor):
+    ClaimDetail = apps.get_model('claims', 'ClaimDetail')
+    DenialReason = apps.get_model('claims', 'DenialReason')
+    DenialReason.objects.bulk_create(
+        DenialReason(text=text)
+        for text in ClaimDetail.objects.exclude(denial_reason_text__isnull=True).exclude(denial_reason_text='')
+        .order_by().values_list('denial_reason_text', flat=True).distinct()
+    )
+    ClaimDetail.objects.exclude(denial_reason_text__isnull=True).exclude(denial_reason_text='').update(
+        denial_reason=Subquery(DenialReason.objects.filter(text=OuterRef('denial_reason_text')).values('pk')[:1])
+    )
+    DenialReason.objects.update(claim_count=Coalesce(
+        Subquery(
+            ClaimDetail.objects.filter(denial_reason=OuterRef('pk')).order_by().values('denial_reason')
+            .annotate(count=Count('pk')).values('count')
+        ),
+        0,
+    ))
+
+
+def restore_denial_reason_text(apps, schema_editor):
+    ClaimDetail = apps.get_model('claims', 'ClaimDetail')
+    DenialReason = apps.get_model('claims', 'DenialReason')
+    ClaimDetail.objects.filter(denial_reason__isnull=False).update(
+        denial_reason_text=Subquery(DenialReason.objects.filter(pk=OuterRef('denial_reason')).values('text')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0012_cpt_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DenialReason',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(unique=True)),
+                ('claim_count', models.BigIntegerField(db_index=True, default=0)),
+            ],
+        ),
+        migrations.RenameField(
+            model_name='claimdetail',
+            old_name='denial_reason',
+            new_name='denial_reason_text',
+        ),
+        migrations.AddField(
+            model_name='claimdetail',
+            name='denial_reason',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='details', to='claims.denialreason'),
+        ),
+        migrations.AddField(
+            model_name='claimdetailstaging',
+            name='denial_reason_pk',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.RunPython(intern_denial_reasons, restore_denial_reason_text),
+        migrations.RemoveField(
+            model_name='claimdetail',
+            name='denial_reason_text',
+        ),
+        migrations.DeleteModel(
+            name='DenialReasonSummary',
+        ),
+    ]
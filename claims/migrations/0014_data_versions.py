@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:08
+
+from django.db import migrations, models
+
+
+def create_global_versions(apps, schema_editor):
+    # The counters every load and status change bumps (claims.versions.INGEST and CLAIMS),
+    # created up front so bumping them is a single UPDATE.
+    DataVersion = apps.get_model('claims', 'DataVersion')
+    DataVersion.objects.bulk_create([DataVersion(key='ingest'), DataVersion(key='claims')], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0013_denial_reason_lookup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(create_global_versions, migrations.RunPython.noop),
+    ]
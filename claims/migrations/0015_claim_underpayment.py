@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:15
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_underpayment(apps, schema_editor):
+    # One set-based UPDATE, before the index is built so it is not maintained row by row.
+    Claim = apps.get_model('claims', 'Claim')
+    Claim.objects.update(underpayment=F('billed_amount') - F('paid_amount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0014_data_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claim',
+            name='underpayment',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=11),
+        ),
+        migrations.RunPython(backfill_underpayment, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['status', 'underpayment'], name='claim_status_underpayment_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:20
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_aging_summary(apps, schema_editor):
+    # One grouped pass over the new (status, discharge_date) index.
+    Claim = apps.get_model('claims', 'Claim')
+    ClaimAgingSummary = apps.get_model('claims', 'ClaimAgingSummary')
+    ClaimAgingSummary.objects.bulk_create(
+        ClaimAgingSummary(
+            status=row['status'], discharge_date=row['discharge_date'],
+            claim_count=row['claim_count'], underpayment_total=row['underpayment_total'] or 0,
+        )
+        for row in Claim.objects.order_by().values('status', 'discharge_date').annotate(
+            claim_count=Count('pk'), underpayment_total=Sum('underpayment')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0015_claim_underpayment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimAgingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=50)),
+                ('discharge_date', models.DateField()),
+                ('claim_count', models.BigIntegerField(default=0)),
+                ('underpayment_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['status', 'discharge_date'], name='claim_status_discharge_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='claimagingsummary',
+            constraint=models.UniqueConstraint(fields=('status', 'discharge_date'), name='aging_summary_status_date_unique'),
+        ),
+        migrations.RunPython(populate_aging_summary, migrations.RunPython.noop),
+    ]
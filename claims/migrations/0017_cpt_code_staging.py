@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0016_claim_aging_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimCptCodeStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('load_token', models.CharField(max_length=32)),
+                ('claim_id', models.IntegerField()),
+                ('code', models.CharField(max_length=16)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['load_token', 'claim_id'], name='cpt_code_staging_claim_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0018_uploadjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claimcptcodestaging',
+            name='staged_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='claimdetailstaging',
+            name='staged_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='claimstaging',
+            name='staged_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
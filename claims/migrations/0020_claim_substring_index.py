@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:02
+
+from django.db import migrations
+
+from claims.search import SUBSTRING_TABLE, create_substring_table, drop_substring_table
+
+
+def create_and_populate(apps, schema_editor):
+    # SQLite 3.34+: an FTS5 trigram table for substring matches. Other backends: nothing.
+    create_substring_table(schema_editor)
+    if schema_editor.connection.vendor != 'sqlite' or SUBSTRING_TABLE not in schema_editor.connection.introspection.table_names():
+        return
+    schema_editor.execute(
+        f"INSERT INTO {SUBSTRING_TABLE} (rowid, body) "
+        "SELECT c.id, c.claim_id || ' ' || c.patient_name || ' ' || c.insurer_name || ' ' || c.status "
+        "|| ' ' || COALESCE(r.text, '') || ' ' || COALESCE(d.cpt_codes, '') "
+        "FROM claims_claim c LEFT JOIN claims_claimdetail d ON d.claim_id = c.id "
+        "LEFT JOIN claims_denialreason r ON r.id = d.denial_reason_id"
+    )
+
+
+def drop(apps, schema_editor):
+    drop_substring_table(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0019_staging_staged_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_and_populate, drop),
+    ]
@@ -1,7 +1,40 @@
 # claims\models.py
 
 from django.db import models
+from django.db.models import Count, Exists, OuterRef, Subquery
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+class ClaimQuerySet(models.QuerySet):
+    # Columns rendered by the claim list table (_claims_table_rows_partial.html).
+    LIST_FIELDS = (
+        'claim_id', 'patient_name', 'billed_amount', 'paid_amount', 'status', 'insurer_name', 'discharge_date',
+    )
+
+    def for_list(self, user, with_counts=False):
+        """
+        The claim list query: only the columns the table renders, plus whether
+        `user` flagged each claim, all in one query with no prefetches.
+
+        With `with_counts`, also annotates `notes_count` and `last_status_change`
+        through correlated subqueries (no joins, so no row multiplication).
+        """
+        qs = self.only(*self.LIST_FIELDS).annotate(
+            is_flagged_by_user=Exists(Flag.objects.filter(claim=OuterRef('pk'), user=user))
+        )
+        if with_counts:
+            qs = qs.annotate(
+                notes_count=Subquery(
+                    Note.objects.filter(claim=OuterRef('pk')).order_by().values('claim')
+                    .annotate(count=Count('pk')).values('count')[:1]
+                ),
+                last_status_change=Subquery(
+                    ClaimHistory.objects.filter(claim=OuterRef('pk')).order_by('-timestamp').values('timestamp')[:1]
+                ),
+            )
+        return qs
+
 
 class Claim(models.Model):
     STATUS_DENIED = 'Denied'
@@ -32,18 +65,83 @@ class Claim(models.Model):
     insurer_name = models.CharField(max_length=255, db_index=True)
     discharge_date = models.DateField()
 
+    # billed_amount - paid_amount, stored so the dashboard can read the largest ones off an index.
+    # Kept in step by save() and by the bulk loaders (claims.utils, claims.staging).
+    underpayment = models.DecimalField(max_digits=11, decimal_places=2, default=0, editable=False)
+
+    # Digest of the row as last loaded from a file; delta loads skip rows whose digest is unchanged.
+    content_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
+
+    objects = ClaimQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the claim list walks (discharge_date, id).
+            models.Index(fields=['discharge_date', 'id'], name='claim_discharge_id_idx'),
+            # The top denials by underpayment are a backward range scan of one status.
+            models.Index(fields=['status', 'underpayment'], name='claim_status_underpayment_idx'),
+            # The aging worklist pages through one status oldest discharge first.
+            models.Index(fields=['status', 'discharge_date'], name='claim_status_discharge_idx'),
+        ]
 
     def __str__(self):
         return f"Claim {self.claim_id} - {self.patient_name}"
 
+    def save(self, *args, **kwargs):
+        amount = self._meta.get_field('billed_amount').to_python
+        self.underpayment = amount(self.billed_amount) - amount(self.paid_amount)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'billed_amount', 'paid_amount'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'underpayment'}
+        super().save(*args, **kwargs)
+
+class DenialReason(models.Model):
+    """
+    A distinct denial reason text. Claim details refer to it by key rather
+    than repeating the text (see `claims.denial_reasons`).
+    """
+    text = models.TextField(unique=True)
+    # Materialized number of claim details with this reason, for the dashboard;
+    # maintained incrementally by `claims.summary`.
+    claim_count = models.BigIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return self.text
+
+
 class ClaimDetail(models.Model):
     claim = models.OneToOneField(Claim, on_delete=models.CASCADE, related_name="details")
     cpt_codes = models.CharField(max_length=255)
-    denial_reason = models.TextField(blank=True, null=True)
+    denial_reason = models.ForeignKey(
+        DenialReason, on_delete=models.PROTECT, related_name='details', blank=True, null=True
+    )
+    # Digest of the row as last loaded from a file (see Claim.content_hash).
+    content_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
 
     def __str__(self):
         return f"Details for Claim {self.claim.id}"
 
+
+class ClaimCptCode(models.Model):
+    """
+    One CPT code of a claim, split out of `ClaimDetail.cpt_codes` so code-level
+    filters and counts are index lookups. Kept in step by `claims.cpt`.
+    """
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='cpt_codes')
+    code = models.CharField(max_length=16)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['claim', 'code'], name='claim_cpt_code_unique'),
+        ]
+        indexes = [
+            # Claims with a given code (list filter) and per-code counts (dashboard), without touching the table.
+            models.Index(fields=['code', 'claim'], name='cpt_code_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"CPT {self.code} on Claim {self.claim_id}"
+
 class Note(models.Model):
     claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name="notes")
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -56,6 +154,11 @@ class Note(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A claim's notes in display order. The visibility filter (public OR the user's own)
+            # is an OR, which a leading is_public column could not serve, so it is checked per row.
+            models.Index(fields=['claim', 'created_at'], name='note_claim_created_idx'),
+        ]
 
 class ClaimHistory(models.Model):
     claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name="history")
@@ -70,6 +173,12 @@ class ClaimHistory(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # A claim's status history, newest first (detail view).
+            models.Index(fields=['claim', 'timestamp'], name='history_claim_timestamp_idx'),
+            # Recent activity across all claims (dashboard).
+            models.Index(fields=['timestamp'], name='history_timestamp_idx'),
+        ]
 
 
 # Model to handle user-specific flagging
@@ -83,6 +192,185 @@ class Flag(models.Model):
         # A user can only flag a specific claim once.
         unique_together = ('user', 'claim')
         ordering = ['-created_at']
+        indexes = [
+            # A user's flags, most recent first (dashboard). The unique (user, claim)
+            # index already serves the per-claim Exists() check in the claim list.
+            models.Index(fields=['user', 'created_at'], name='flag_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} flagged Claim {self.claim.claim_id}"
+
+
+class UploadJob(models.Model):
+    """Tracks an uploaded pair of claim files as it is loaded in the background."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_jobs')
+    mode = models.CharField(max_length=20)
+    claims_file = models.FileField(upload_to='uploads/%Y/%m/%d/')
+    details_file = models.FileField(upload_to='uploads/%Y/%m/%d/')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    rows_processed = models.PositiveIntegerField(default=0)
+    claims_created = models.PositiveIntegerField(default=0)
+    claims_updated = models.PositiveIntegerField(default=0)
+    details_created = models.PositiveIntegerField(default=0)
+    details_updated = models.PositiveIntegerField(default=0)
+    # Only filled in by delta and overwrite loads.
+    claims_unchanged = models.PositiveIntegerField(default=0)
+    claims_removed = models.PositiveIntegerField(default=0)
+    details_unchanged = models.PositiveIntegerField(default=0)
+    details_removed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by the worker on every progress report; a running job whose
+    # heartbeat stops lost its worker (see `claims.jobs.requeue_stale_jobs`).
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Upload job {self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @property
+    def success_message(self):
+        if self.mode in ('delta', 'overwrite'):
+            return (
+                f'Success! Claims: {self.claims_created} new, {self.claims_updated} changed, '
+                f'{self.claims_unchanged} unchanged, {self.claims_removed} removed. '
+                f'Details: {self.details_created} new, {self.details_updated} changed, '
+                f'{self.details_unchanged} unchanged, {self.details_removed} removed.'
+            )
+        return (
+            f'Success! {self.claims_created} claims created, {self.claims_updated} updated. '
+            f'{self.details_created} details created, {self.details_updated} updated.'
+        )
+
+
+class ClaimStatusSummary(models.Model):
+    """
+    Materialized per-status totals for the dashboard. Maintained incrementally
+    by `claims.summary` whenever claims are loaded or change status.
+    """
+    status = models.CharField(max_length=50, unique=True)
+    claim_count = models.BigIntegerField(default=0)
+    underpayment_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.claim_count} claims"
+
+
+class ClaimAgingSummary(models.Model):
+    """
+    Materialized claim counts and underpayment per status and discharge date,
+    for the aging worklist (see `claims.aging`). Maintained incrementally by
+    `claims.summary` alongside `ClaimStatusSummary`.
+    """
+    status = models.CharField(max_length=50)
+    discharge_date = models.DateField()
+    claim_count = models.BigIntegerField(default=0)
+    underpayment_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'discharge_date'], name='aging_summary_status_date_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} discharged {self.discharge_date}: {self.claim_count} claims"
+
+
+class DataVersion(models.Model):
+    """
+    A named change counter behind the ETag and Last-Modified validators of
+    the claim pages (see `claims.versions`): one per claim that has changed,
+    plus global ones bumped by loads and by anything the claim list shows.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+class ClaimStaging(models.Model):
+    """
+    Claim rows of an overwrite load in progress, keyed by the load's token.
+    `claims.staging` merges them into `Claim` in one transaction at the end.
+    """
+    load_token = models.CharField(max_length=32)
+    claim_id = models.IntegerField()
+    patient_name = models.CharField(max_length=255)
+    billed_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    paid_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=50)
+    insurer_name = models.CharField(max_length=255)
+    discharge_date = models.DateField()
+    content_hash = models.CharField(max_length=32)
+    # Set during the merge on rows that are new or differ from the live claim.
+    changed = models.BooleanField(default=False)
+    # Loads that stop writing rows for long enough were killed; see `claims.staging.purge_stale_staging`.
+    staged_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['load_token', 'claim_id'], name='claim_staging_unique_row'),
+        ]
+
+
+class ClaimDetailStaging(models.Model):
+    """Claim detail rows of an overwrite load in progress (see `ClaimStaging`)."""
+    load_token = models.CharField(max_length=32)
+    claim_id = models.IntegerField()
+    cpt_codes = models.CharField(max_length=255)
+    denial_reason = models.TextField(blank=True, null=True)
+    content_hash = models.CharField(max_length=32)
+    # Filled in during the merge: the live claim's and denial reason's primary keys and whether the row is new or differs.
+    claim_pk = models.IntegerField(null=True)
+    denial_reason_pk = models.IntegerField(null=True)
+    changed = models.BooleanField(default=False)
+    staged_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['load_token', 'claim_id'], name='claim_detail_staging_unique_row'),
+        ]
+        indexes = [
+            # The merge matches staged details to live ones by the resolved claim.
+            models.Index(fields=['load_token', 'claim_pk'], name='claim_detail_staging_pk_idx'),
+        ]
+
+
+class ClaimCptCodeStaging(models.Model):
+    """
+    The CPT codes of staged claim details, one row per code (see
+    `ClaimCptCode`). They are split out while the file is staged so the merge
+    can copy them into `ClaimCptCode` with one statement.
+    """
+    load_token = models.CharField(max_length=32)
+    claim_id = models.IntegerField()
+    code = models.CharField(max_length=16)
+    staged_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['load_token', 'claim_id'], name='cpt_code_staging_claim_idx'),
+        ]
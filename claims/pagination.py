@@ -0,0 +1,112 @@
+# claims/pagination.py
+
+import base64
+import binascii
+import json
+from datetime import date
+
+from django.db.models import Q
+
+# Claims are listed newest discharge first; `id` breaks ties so every row has
+# a unique position. Backed by the `claim_discharge_id_idx` index.
+KEYSET_ORDERING = ('-discharge_date', '-id')
+# The aging worklist's order, oldest discharge first.
+OLDEST_FIRST_ORDERING = ('discharge_date', 'id')
+
+
+def encode_cursor(claim, reverse=False):
+    """Builds an opaque cursor pointing just past `claim` in the list order."""
+    payload = {'d': claim.discharge_date.isoformat(), 'i': claim.pk}
+    if reverse:
+        payload['r'] = 1
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Reads a cursor made by `encode_cursor`.
+
+    :return: A tuple of (discharge_date, id, reverse), or None if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        return date.fromisoformat(payload['d']), int(payload['i']), bool(payload.get('r'))
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+
+class CursorPage:
+    """
+    One page of a keyset-paginated claim list. Iterates like a `Page` and
+    exposes the cursors for the neighbouring pages.
+    """
+    def __init__(self, object_list, next_cursor, previous_cursor, approximate_count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_count = approximate_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def _after(discharge_date, pk, oldest_first):
+    """Rows after (discharge_date, pk) in the list order."""
+    if oldest_first:
+        return Q(discharge_date__gt=discharge_date) | Q(discharge_date=discharge_date, id__gt=pk)
+    return Q(discharge_date__lt=discharge_date) | Q(discharge_date=discharge_date, id__lt=pk)
+
+
+def paginate_by_cursor(queryset, cursor, per_page, oldest_first=False):
+    """
+    Returns the `CursorPage` after (or, for a previous-page cursor, before)
+    `cursor`, in `KEYSET_ORDERING`, or in `OLDEST_FIRST_ORDERING` with
+    `oldest_first`.
+
+    Each page is one indexed range query for `per_page + 1` rows, so the cost
+    does not depend on how deep the page is. An invalid cursor yields the first page.
+    """
+    ordering = OLDEST_FIRST_ORDERING if oldest_first else KEYSET_ORDERING
+    backwards = KEYSET_ORDERING if oldest_first else OLDEST_FIRST_ORDERING
+    position = decode_cursor(cursor) if cursor else None
+
+    if position is None:
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        return CursorPage(rows, encode_cursor(rows[-1]) if has_more else None, None)
+
+    discharge_date, pk, reverse = position
+    if reverse:
+        rows = list(
+            queryset.filter(_after(discharge_date, pk, not oldest_first)).order_by(*backwards)[:per_page + 1]
+        )
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        if not rows:
+            return paginate_by_cursor(queryset, None, per_page, oldest_first)
+        return CursorPage(
+            rows,
+            encode_cursor(rows[-1]),
+            encode_cursor(rows[0], reverse=True) if has_more else None,
+        )
+
+    rows = list(queryset.filter(_after(discharge_date, pk, oldest_first)).order_by(*ordering)[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    return CursorPage(
+        rows,
+        encode_cursor(rows[-1]) if has_more else None,
+        # Any row before the cursor means there is a previous page; the first row marks where it ends.
+        encode_cursor(rows[0], reverse=True) if rows else None,
+    )
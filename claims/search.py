@@ -0,0 +1,312 @@
+# claims/search.py
+
+"""
+Full-text search over claims for the claim list's `q` filter.
+
+Each claim has one row in a `claims_claimsearch` index holding its claim
+number, patient, insurer, status, denial reason and CPT codes. On SQLite it
+is an FTS5 virtual table keyed by the claim's rowid; on PostgreSQL a table
+with a weighted `tsvector` (GIN) and a trigram index for substring matches.
+Other backends, or a database without the index, fall back to `icontains`.
+
+Words match as prefixes ("gold" finds "Goldsmith"). A query of three or
+more characters also matches anywhere inside the text ("smith" finds
+"Goldsmith"): through the trigram index on PostgreSQL, and on SQLite 3.34+
+through a second FTS5 table, `claims_claimsubstring`, with the trigram
+tokenizer. Substring-only matches rank after prefix matches.
+
+The index is refreshed per batch by the ingestion path (bulk writes send no
+signals) and by `post_save` receivers for single-object edits.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Claim, ClaimCptCode
+
+SEARCH_TABLE = 'claims_claimsearch'
+SUBSTRING_TABLE = 'claims_claimsubstring'
+
+# The trigram index has no entries for shorter strings.
+MIN_SUBSTRING_LENGTH = 3
+
+# Column weights for ranking: claim number and patient name matter most.
+_FTS5_COLUMNS = ['claim_number', 'patient_name', 'insurer_name', 'status', 'denial_reason', 'cpt_codes']
+_FTS5_WEIGHTS = '10.0, 10.0, 5.0, 2.0, 2.0, 1.0'
+
+# Query parameters of the claim list's filters.
+FILTER_PARAMS = ('q', 'patient_name', 'status', 'insurer_name', 'cpt_code', 'denial_reason')
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = {}
+
+
+def _tables():
+    if connection.alias not in _available:
+        with connection.cursor() as cursor:
+            names = set(connection.introspection.table_names(cursor))
+        _available[connection.alias] = {SEARCH_TABLE, SUBSTRING_TABLE} & names
+    return _available[connection.alias]
+
+
+def _backend():
+    """Returns 'fts5', 'postgres' or None for the default database."""
+    if connection.vendor not in ('sqlite', 'postgresql') or SEARCH_TABLE not in _tables():
+        return None
+    return 'fts5' if connection.vendor == 'sqlite' else 'postgres'
+
+
+def _has_substring_table():
+    return _backend() == 'fts5' and SUBSTRING_TABLE in _tables()
+
+
+def create_search_table(schema_editor):
+    """Creates the search index for the migration's database vendor; a no-op elsewhere."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            f"{', '.join(_FTS5_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            'claim_id bigint PRIMARY KEY REFERENCES claims_claim (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL, body text NOT NULL)'
+        )
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin (document)')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_body_trgm ON {SEARCH_TABLE} USING gin (body gin_trgm_ops)')
+    _available.clear()
+
+
+def drop_search_table(schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    _available.clear()
+
+
+def create_substring_table(schema_editor):
+    """
+    Creates SQLite's substring index where the trigram tokenizer exists
+    (3.34+); PostgreSQL's trigram index lives on `claims_claimsearch` itself.
+    """
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 34):
+        schema_editor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {SUBSTRING_TABLE} USING fts5(body, tokenize = 'trigram')")
+    _available.clear()
+
+
+def drop_substring_table(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SUBSTRING_TABLE}')
+    _available.clear()
+
+
+def reindex_claims(queryset):
+    """
+    Refreshes the index rows of the claims in `queryset` with two statements
+    per index table, however many claims it selects.
+    """
+    backend = _backend()
+    if backend is None:
+        return
+    pk_sql, pk_params = queryset.order_by().values('pk').query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        if backend == 'fts5':
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({pk_sql})', pk_params)
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(_FTS5_COLUMNS)}) "
+                "SELECT c.id, c.claim_id, c.patient_name, c.insurer_name, c.status, "
+                "COALESCE(r.text, ''), COALESCE(d.cpt_codes, '') "
+                "FROM claims_claim c LEFT JOIN claims_claimdetail d ON d.claim_id = c.id "
+                "LEFT JOIN claims_denialreason r ON r.id = d.denial_reason_id "
+                f"WHERE c.id IN ({pk_sql})",
+                pk_params,
+            )
+            if _has_substring_table():
+                cursor.execute(f'DELETE FROM {SUBSTRING_TABLE} WHERE rowid IN ({pk_sql})', pk_params)
+                cursor.execute(
+                    f"INSERT INTO {SUBSTRING_TABLE} (rowid, body) "
+                    "SELECT c.id, c.claim_id || ' ' || c.patient_name || ' ' || c.insurer_name || ' ' || c.status "
+                    "|| ' ' || COALESCE(r.text, '') || ' ' || COALESCE(d.cpt_codes, '') "
+                    "FROM claims_claim c LEFT JOIN claims_claimdetail d ON d.claim_id = c.id "
+                    "LEFT JOIN claims_denialreason r ON r.id = d.denial_reason_id "
+                    f"WHERE c.id IN ({pk_sql})",
+                    pk_params,
+                )
+        else:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (claim_id, document, body) '
+                "SELECT c.id, "
+                "setweight(to_tsvector('simple', c.claim_id::text || ' ' || c.patient_name), 'A') || "
+                "setweight(to_tsvector('simple', c.insurer_name), 'B') || "
+                "setweight(to_tsvector('simple', c.status || ' ' || COALESCE(r.text, '')), 'C') || "
+                "setweight(to_tsvector('simple', COALESCE(d.cpt_codes, '')), 'D'), "
+                "concat_ws(' ', c.claim_id::text, c.patient_name, c.insurer_name, c.status, r.text, d.cpt_codes) "
+                "FROM claims_claim c LEFT JOIN claims_claimdetail d ON d.claim_id = c.id "
+                "LEFT JOIN claims_denialreason r ON r.id = d.denial_reason_id "
+                f"WHERE c.id IN ({pk_sql}) "
+                'ON CONFLICT (claim_id) DO UPDATE SET document = EXCLUDED.document, body = EXCLUDED.body',
+                pk_params,
+            )
+
+
+def _fts5_tables():
+    return [SEARCH_TABLE, SUBSTRING_TABLE] if _has_substring_table() else [SEARCH_TABLE]
+
+
+def remove_claims(pks):
+    """Drops index rows for deleted claims (PostgreSQL also cascades on its own)."""
+    if _backend() == 'fts5' and pks:
+        with connection.cursor() as cursor:
+            for table in _fts5_tables():
+                cursor.execute(f"DELETE FROM {table} WHERE rowid IN ({', '.join(['%s'] * len(pks))})", list(pks))
+
+
+def prune_search_index():
+    """Drops index rows whose claim no longer exists (PostgreSQL cascades on its own)."""
+    if _backend() == 'fts5':
+        with connection.cursor() as cursor:
+            for table in _fts5_tables():
+                cursor.execute(f'DELETE FROM {table} WHERE rowid NOT IN (SELECT id FROM claims_claim)')
+
+
+def clear_search_index():
+    backend = _backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            for table in _fts5_tables() if backend == 'fts5' else [SEARCH_TABLE]:
+                cursor.execute(f'DELETE FROM {table}')
+
+
+def rebuild_search_index():
+    """Re-creates every index row from the claims tables."""
+    clear_search_index()
+    reindex_claims(Claim.objects.all())
+
+
+def _match_params(query):
+    """
+    Returns the parameters of the index queries for `query`: the prefix match
+    and the substring match (None when not searched), or None without words.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    text = query.strip()
+    substring = len(text) >= MIN_SUBSTRING_LENGTH
+    if _backend() == 'fts5':
+        # Quoted tokens can't be read as FTS5 operators; the trailing * makes each a prefix match.
+        prefix = ' '.join(f'"{token}"*' for token in tokens)
+        if not substring or not _has_substring_table():
+            return (prefix, None)
+        # One quoted phrase: the trigram table matches it anywhere in the text, case-insensitively.
+        phrase = text.replace('"', '""')
+        return (prefix, f'"{phrase}"')
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return (' & '.join(f'{token}:*' for token in tokens), f'%{escaped}%' if substring else None)
+
+
+def filter_claims(queryset, query):
+    """
+    Narrows a claim queryset to claims matching every word of `query` as a
+    prefix, or the whole query as a substring, leaving its ordering alone.
+    """
+    backend = _backend()
+    params = _match_params(query) if backend else None
+    if params is None:
+        return queryset.filter(
+            Q(patient_name__icontains=query) |
+            Q(status__icontains=query) |
+            Q(insurer_name__icontains=query)
+        )
+    prefix, substring = params
+    if backend == 'fts5':
+        sql = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        if substring is not None:
+            sql += f' UNION SELECT rowid FROM {SUBSTRING_TABLE} WHERE {SUBSTRING_TABLE} MATCH %s'
+    else:
+        sql = f"SELECT claim_id FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('simple', %s)"
+        if substring is not None:
+            sql += ' OR body ILIKE %s'
+    return queryset.filter(pk__in=RawSQL(sql, [param for param in params if param is not None]))
+
+
+def filter_claim_list(claims_list, params):
+    """
+    Applies the claim list's `FILTER_PARAMS` from `params` (a QueryDict or
+    dict); the claim list, the export and bulk status changes share them.
+
+    :return: A tuple of (queryset, whether any filter was applied).
+    """
+    search_query = params.get('q', '')
+    patient_query = params.get('patient_name', '')
+    status_query = params.get('status', '')
+    insurer_query = params.get('insurer_name', '')
+    cpt_query = params.get('cpt_code', '').strip().upper()
+    reason_query = params.get('denial_reason', '')
+
+    if search_query:
+        claims_list = filter_claims(claims_list, search_query)
+    if patient_query:
+        claims_list = claims_list.filter(patient_name__icontains=patient_query)
+    if status_query:
+        claims_list = claims_list.filter(status__icontains=status_query)
+    if insurer_query:
+        claims_list = claims_list.filter(insurer_name__icontains=insurer_query)
+    if cpt_query:
+        # An exact code is one range of the (code, claim) index, probed once rather than per claim.
+        claims_list = claims_list.filter(pk__in=ClaimCptCode.objects.filter(code=cpt_query).values('claim'))
+    if reason_query:
+        # Exact reason: its key from the unique text index, then the details' denial_reason index.
+        claims_list = claims_list.filter(details__denial_reason__text=reason_query)
+    return claims_list, any([search_query, patient_query, status_query, insurer_query, cpt_query, reason_query])
+
+
+def search_claims(query, limit=20):
+    """
+    Returns up to `limit` claims matching `query`, best match first (BM25 on
+    SQLite, `ts_rank` on PostgreSQL). Without an index, falls back to the
+    newest matching claims.
+    """
+    backend = _backend()
+    params = _match_params(query) if backend else None
+    if params is None:
+        return list(filter_claims(Claim.objects.all(), query).order_by('-discharge_date', '-id')[:limit])
+
+    with connection.cursor() as cursor:
+        if backend == 'fts5':
+            prefix, substring = params
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY bm25({SEARCH_TABLE}, {_FTS5_WEIGHTS}) LIMIT %s',
+                (prefix, limit),
+            )
+            pks = [row[0] for row in cursor.fetchall()]
+            if substring is not None and len(pks) < limit:
+                # Substring-only matches rank after every prefix match, most recently indexed first.
+                cursor.execute(
+                    f'SELECT rowid FROM {SUBSTRING_TABLE} WHERE {SUBSTRING_TABLE} MATCH %s '
+                    f'AND rowid NOT IN (SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s) '
+                    'ORDER BY rowid DESC LIMIT %s',
+                    (substring, prefix, limit - len(pks)),
+                )
+                pks += [row[0] for row in cursor.fetchall()]
+        else:
+            tsquery, like = params
+            where = "document @@ to_tsquery('simple', %s)" + (' OR body ILIKE %s' if like is not None else '')
+            # Substring-only matches rank 0, after every prefix match, most recently loaded first as on SQLite.
+            cursor.execute(
+                f"SELECT claim_id FROM {SEARCH_TABLE} WHERE {where} "
+                "ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC, claim_id DESC LIMIT %s",
+                [param for param in params if param is not None] + [tsquery, limit],
+            )
+            pks = [row[0] for row in cursor.fetchall()]
+    claims = Claim.objects.in_bulk(pks)
+    return [claims[pk] for pk in pks if pk in claims]
@@ -0,0 +1,76 @@
+# claims/signals.py
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth import user_cache
+from .cpt import sync_cpt_codes
+from .fragments import invalidate_claim_cards
+from .models import Claim, ClaimDetail, ClaimHistory, Flag, Note
+from .search import reindex_claims
+from .versions import CLAIMS, bump_versions, claim_key
+
+
+# Bulk ingestion sends no signals and refreshes the search index and cached
+# cards itself; these cover single-object edits from views and the admin.
+@receiver(post_save, sender=Claim)
+def reindex_saved_claim(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_claims(Claim.objects.filter(pk=instance.pk))
+        invalidate_claim_cards([instance.pk])
+
+
+@receiver(post_save, sender=ClaimDetail)
+def reindex_saved_claim_detail(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_claims(Claim.objects.filter(pk=instance.claim_id))
+        sync_cpt_codes([instance.claim_id])
+        invalidate_claim_cards([instance.claim_id])
+
+
+@receiver(post_save, sender=ClaimHistory)
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=ClaimDetail)
+@receiver(post_delete, sender=ClaimHistory)
+@receiver(post_delete, sender=Note)
+def invalidate_cards_of_changed_claim(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_claim_cards([instance.claim_id])
+
+
+# Changes the claim list or dashboard shows, not only the claim's own panel.
+LISTED_CHANGES = (Claim, ClaimDetail, ClaimHistory, Flag)
+
+
+@receiver(post_save, sender=Claim)
+@receiver(post_save, sender=ClaimDetail)
+@receiver(post_save, sender=ClaimHistory)
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=Flag)
+@receiver(post_delete, sender=ClaimDetail)
+@receiver(post_delete, sender=ClaimHistory)
+@receiver(post_delete, sender=Note)
+@receiver(post_delete, sender=Flag)
+def bump_versions_of_changed_claim(sender, instance, raw=False, origin=None, **kwargs):
+    # Rows deleted along with their claim or user are covered by whatever
+    # deleted that (a load or the admin), without a query per cascaded row.
+    if raw or (origin is not None and not _deleted_directly(sender, origin)):
+        return
+    claim_pk = instance.pk if sender is Claim else instance.claim_id
+    if sender in LISTED_CHANGES:
+        bump_versions(claim_key(claim_pk), CLAIMS)
+    else:
+        bump_versions(claim_key(claim_pk))
+
+
+def _deleted_directly(sender, origin):
+    return isinstance(origin, sender) or getattr(origin, 'model', None) is sender
+
+
+# Covers password changes, deactivation and deletion; bulk updates of users
+# are picked up when the cached entries expire.
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
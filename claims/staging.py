@@ -0,0 +1,346 @@
+# claims/staging.py
+
+"""
+Overwrite loads through staging tables.
+
+The rows of an overwrite load are first written to `ClaimStaging` and
+`ClaimDetailStaging` (with each detail's CPT codes split into
+`ClaimCptCodeStaging`) under a token for that load, which takes as long as
+the files do but leaves the live tables alone. `merge_staged()` then makes
+the live tables match the staged snapshot with a handful of set-based
+statements in one short transaction:
+
+- claims missing from the snapshot are deleted (with their notes, flags and
+  history, as the old delete-everything overwrite did for every claim);
+- claims whose `content_hash` differs are updated in place and new ones
+  inserted, so surviving claims keep their notes, flags and history (their
+  `underpayment` is computed in the same statements);
+- details follow the same steps, and the changed details' CPT code rows
+  are copied from the staged codes;
+- the dashboard summary tables are adjusted by the totals of the removed,
+  changed and new rows alone (a `SummaryDelta`), grouped by status and
+  discharge date, rather than recomputed over every claim.
+
+Where the database supports `UPDATE ... FROM`, the updates join the staging
+table once rather than running a subquery per column and row. Readers see
+the old data until that transaction commits, and a load that fails part-way
+leaves only staging rows behind (`discard_staged()`).
+
+SQLite takes its write lock when that transaction begins, so the per-claim
+work is left until it commits: the search index rows and cached cards of the
+changed claims are refreshed in batches, each its own short write, and the
+staging rows are discarded. Searches may return the old text of those claims
+until then.
+
+A load killed before it could discard its staging rows leaves them behind;
+`purge_stale_staging()` drops those of loads that stopped writing long ago
+whenever a new overwrite load begins.
+"""
+
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, Exists, F, Max, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .cpt import cpt_code_rows, prune_cpt_codes
+from .fragments import invalidate_claim_cards
+from .models import (
+    Claim, ClaimCptCode, ClaimCptCodeStaging, ClaimDetail, ClaimDetailStaging, ClaimStaging, DenialReason,
+)
+from .search import prune_search_index, reindex_claims
+from .summary import SummaryDelta, invalidate_dashboard_summary
+
+CLAIM_FIELDS = ['patient_name', 'billed_amount', 'paid_amount', 'status', 'insurer_name', 'discharge_date', 'content_hash']
+DETAIL_FIELDS = ['denial_reason', 'cpt_codes', 'content_hash']
+# Live detail field -> the staging column it is merged from (denial reasons by their resolved key).
+DETAIL_SOURCES = {'denial_reason': 'denial_reason_pk', 'cpt_codes': 'cpt_codes', 'content_hash': 'content_hash'}
+# Changed claims whose search index rows and cached cards are refreshed per write after the merge.
+REFRESH_BATCH_SIZE = 2000
+
+
+def new_load_token():
+    return uuid4().hex
+
+
+def _stage(model, token, rows, fields, supports_upsert):
+    objs = [model(load_token=token, claim_id=row['claim_id'], **{f: row[f] for f in fields}) for row in rows]
+    if supports_upsert:
+        model.objects.bulk_create(
+            objs, update_conflicts=True, unique_fields=['load_token', 'claim_id'], update_fields=fields,
+        )
+    else:
+        with transaction.atomic():
+            model.objects.filter(load_token=token, claim_id__in=[row['claim_id'] for row in rows]).delete()
+            model.objects.bulk_create(objs)
+
+
+def stage_claims(token, rows):
+    """Stages cleaned claim rows (with `content_hash`) for the load `token`; a repeated claim_id replaces the earlier row."""
+    _stage(ClaimStaging, token, rows, CLAIM_FIELDS, connection.features.supports_update_conflicts_with_target)
+
+
+def stage_details(token, rows):
+    """Stages cleaned claim detail rows (with `content_hash`) and their CPT codes for the load `token`."""
+    _stage(ClaimDetailStaging, token, rows, DETAIL_FIELDS, connection.features.supports_update_conflicts_with_target)
+    # A repeated claim_id replaces the codes staged for it too.
+    ClaimCptCodeStaging.objects.filter(load_token=token, claim_id__in=[row['claim_id'] for row in rows]).delete()
+    ClaimCptCodeStaging.objects.bulk_create(cpt_code_rows(
+        ClaimCptCodeStaging, ((row['claim_id'], row['cpt_codes']) for row in rows), load_token=token,
+    ))
+
+
+STAGING_MODELS = (ClaimStaging, ClaimDetailStaging, ClaimCptCodeStaging)
+
+
+def discard_staged(token):
+    for model in STAGING_MODELS:
+        model.objects.filter(load_token=token).delete()
+
+
+def purge_stale_staging():
+    """
+    Discards the staging rows of loads that have not staged a row for
+    `CLAIMS_STAGING_MAX_AGE_SECONDS`: their process was killed before it
+    could merge or discard them.
+
+    :return: The number of loads purged.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CLAIMS_STAGING_MAX_AGE_SECONDS)
+    recent, stale = set(), set()
+    for model in STAGING_MODELS:
+        # A load stages claims before details, so it is only stale once no table has a recent row of it.
+        for token, last_staged in model.objects.order_by().values_list('load_token').annotate(Max('staged_at')):
+            (recent if last_staged >= cutoff else stale).add(token)
+    stale -= recent
+    for token in stale:
+        discard_staged(token)
+    return len(stale)
+
+
+def _insert_select(target, columns, source_sql, params):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(target._meta.db_table)} ({', '.join(quote(c) for c in columns)}) {source_sql}",
+            params,
+        )
+        return cursor.rowcount
+
+
+def _supports_update_from():
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 33)
+    return connection.vendor == 'postgresql'
+
+
+def _update_from(target, assignments, source_sql, condition, params):
+    """
+    Runs `UPDATE target SET ... FROM source_sql WHERE condition`, with
+    `assignments` mapping target columns to expressions over the source.
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {quote(target._meta.db_table)} "
+            f"SET {', '.join(f'{quote(column)} = {value}' for column, value in assignments.items())} "
+            f"FROM {source_sql} WHERE {condition}",
+            params,
+        )
+        return cursor.rowcount
+
+
+def refresh_merged_claims(token, claim_pks, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Finishes a merge once it has committed: refreshes the search index rows
+    and cached cards of `claim_pks` a batch at a time, each batch its own
+    short transaction, then discards the load's staging rows.
+    """
+    prune_search_index()
+    for start in range(0, len(claim_pks), batch_size):
+        batch = claim_pks[start:start + batch_size]
+        with transaction.atomic():
+            reindex_claims(Claim.objects.filter(pk__in=batch))
+        invalidate_claim_cards(batch)
+    discard_staged(token)
+
+
+def _add_claim_totals(summary, claims, underpayment, sign):
+    """Adds the per-(status, discharge date) totals of `claims` to `summary`."""
+    for row in claims.order_by().values('status', 'discharge_date').annotate(
+        claim_count=Count('pk'), underpayment=Sum(underpayment, output_field=DecimalField()),
+    ):
+        summary.add_claim_totals(row['status'], row['discharge_date'], row['claim_count'], row['underpayment'], sign=sign)
+
+
+def _add_denial_reasons(summary, details, field, sign):
+    """Adds the per-reason detail counts of `details` (reason keys in `field`) to `summary`."""
+    for row in details.order_by().values(field).annotate(count=Count('pk')):
+        summary.add_denial_reason(row[field], sign=sign, count=row['count'])
+
+
+def merge_staged(token):
+    """
+    Replaces the live claims and details with the rows staged under `token`,
+    in one transaction. Once it commits, `refresh_merged_claims()` brings the
+    derived rows of the changed claims up to date and discards the staging rows.
+
+    :return: A dict of counts: claims/details each with new, changed, unchanged and removed.
+    """
+    quote = connection.ops.quote_name
+    claim_table = quote(Claim._meta.db_table)
+    detail_table = quote(ClaimDetail._meta.db_table)
+    claim_staging_table = quote(ClaimStaging._meta.db_table)
+    detail_staging_table = quote(ClaimDetailStaging._meta.db_table)
+    reason_table = quote(DenialReason._meta.db_table)
+    code_staging_table = quote(ClaimCptCodeStaging._meta.db_table)
+    update_from = _supports_update_from()
+
+    staged_claims = ClaimStaging.objects.filter(load_token=token)
+    staged_details = ClaimDetailStaging.objects.filter(load_token=token)
+
+    with transaction.atomic():
+        # --- Claims ---
+        staged_claims.exclude(
+            Exists(Claim.objects.filter(claim_id=OuterRef('claim_id'), content_hash=OuterRef('content_hash')))
+        ).update(changed=True)
+
+        # Removed and changed claims leave the summary with their old values (and
+        # removed claims take their details' reasons along) before they are touched.
+        summary = SummaryDelta()
+        removed_claims = Claim.objects.exclude(claim_id__in=staged_claims.values('claim_id'))
+        _add_claim_totals(
+            summary, Claim.objects.exclude(claim_id__in=staged_claims.filter(changed=False).values('claim_id')),
+            F('underpayment'), -1,
+        )
+        _add_denial_reasons(summary, ClaimDetail.objects.filter(claim__in=removed_claims), 'denial_reason', -1)
+
+        _, deleted = removed_claims.delete()
+        claims_removed = deleted.get(Claim._meta.label, 0)
+
+        claim_changed = staged_claims.filter(changed=True)
+        _add_claim_totals(summary, claim_changed, F('billed_amount') - F('paid_amount'), 1)
+        columns = ['claim_id'] + [Claim._meta.get_field(f).column for f in CLAIM_FIELDS]
+        if update_from:
+            claims_updated = _update_from(
+                Claim,
+                {**{column: f's.{quote(column)}' for column in columns[1:]},
+                 Claim._meta.get_field('underpayment').column: f"s.{quote('billed_amount')} - s.{quote('paid_amount')}"},
+                f'{claim_staging_table} s',
+                f'{claim_table}.claim_id = s.claim_id AND s.load_token = %s AND s.changed = %s',
+                [token, True],
+            )
+        else:
+            claims_updated = Claim.objects.filter(claim_id__in=claim_changed.values('claim_id')).update(**{
+                field: Subquery(staged_claims.filter(claim_id=OuterRef('claim_id')).values(field)[:1])
+                for field in CLAIM_FIELDS
+            }, underpayment=Subquery(
+                staged_claims.filter(claim_id=OuterRef('claim_id')).values(
+                    underpayment=F('billed_amount') - F('paid_amount')
+                )[:1]
+            ))
+        claims_created = _insert_select(
+            Claim, [*columns, Claim._meta.get_field('underpayment').column],
+            f"SELECT {', '.join('s.' + quote(c) for c in columns)}, "
+            f"s.{quote('billed_amount')} - s.{quote('paid_amount')} FROM {claim_staging_table} s "
+            f"WHERE s.load_token = %s AND NOT EXISTS (SELECT 1 FROM {claim_table} c WHERE c.claim_id = s.claim_id)",
+            [token],
+        )
+
+        # --- Details ---
+        # Reasons not seen before are interned in one statement, then every row gets its keys.
+        _insert_select(
+            DenialReason, ['text', 'claim_count'],
+            f"SELECT DISTINCT s.denial_reason, 0 FROM {detail_staging_table} s "
+            f"WHERE s.load_token = %s AND s.denial_reason <> '' "
+            f"AND NOT EXISTS (SELECT 1 FROM {reason_table} r WHERE r.text = s.denial_reason)",
+            [token],
+        )
+        if update_from:
+            # Rows without a live claim or a reason keep their NULL keys.
+            _update_from(
+                ClaimDetailStaging, {'claim_pk': 'c.id'}, f'{claim_table} c',
+                f'c.claim_id = {detail_staging_table}.claim_id AND {detail_staging_table}.load_token = %s', [token],
+            )
+            _update_from(
+                ClaimDetailStaging, {'denial_reason_pk': 'r.id'}, f'{reason_table} r',
+                f'r.text = {detail_staging_table}.denial_reason AND {detail_staging_table}.load_token = %s', [token],
+            )
+        else:
+            staged_details.update(
+                claim_pk=Subquery(Claim.objects.filter(claim_id=OuterRef('claim_id')).values('pk')[:1]),
+                denial_reason_pk=Subquery(DenialReason.objects.filter(text=OuterRef('denial_reason')).values('pk')[:1]),
+            )
+        staged_details.filter(claim_pk__isnull=False).exclude(
+            Exists(ClaimDetail.objects.filter(claim_id=OuterRef('claim_pk'), content_hash=OuterRef('content_hash')))
+        ).update(changed=True)
+
+        detail_changed = staged_details.filter(changed=True)
+        _add_denial_reasons(
+            summary,
+            ClaimDetail.objects.exclude(
+                claim_id__in=staged_details.filter(claim_pk__isnull=False, changed=False).values('claim_pk')
+            ),
+            'denial_reason', -1,
+        )
+        _add_denial_reasons(summary, detail_changed, 'denial_reason_pk', 1)
+
+        _, deleted = ClaimDetail.objects.exclude(
+            claim_id__in=staged_details.filter(claim_pk__isnull=False).values('claim_pk')
+        ).delete()
+        details_removed = deleted.get(ClaimDetail._meta.label, 0)
+
+        columns = [ClaimDetail._meta.get_field(f).column for f in DETAIL_SOURCES]
+        sources = [ClaimDetailStaging._meta.get_field(f).column for f in DETAIL_SOURCES.values()]
+        if update_from:
+            details_updated = _update_from(
+                ClaimDetail, {column: f's.{quote(source)}' for column, source in zip(columns, sources)},
+                f'{detail_staging_table} s',
+                f'{detail_table}.claim_id = s.claim_pk AND s.load_token = %s AND s.changed = %s',
+                [token, True],
+            )
+        else:
+            details_updated = ClaimDetail.objects.filter(claim_id__in=detail_changed.values('claim_pk')).update(**{
+                field: Subquery(staged_details.filter(claim_pk=OuterRef('claim_id')).values(source)[:1])
+                for field, source in DETAIL_SOURCES.items()
+            })
+        details_created = _insert_select(
+            ClaimDetail, ['claim_id'] + columns,
+            f"SELECT s.claim_pk, {', '.join('s.' + quote(c) for c in sources)} FROM {detail_staging_table} s "
+            f"WHERE s.load_token = %s AND s.claim_pk IS NOT NULL "
+            f"AND NOT EXISTS (SELECT 1 FROM {detail_table} d WHERE d.claim_id = s.claim_pk)",
+            [token],
+        )
+
+        # --- CPT codes ---
+        # Replaced for the changed details from the codes split out while staging.
+        ClaimCptCode.objects.filter(claim_id__in=detail_changed.values('claim_pk')).delete()
+        _insert_select(
+            ClaimCptCode, ['claim_id', 'code'],
+            f"SELECT s.claim_pk, c.code FROM {detail_staging_table} s JOIN {code_staging_table} c "
+            f"ON c.load_token = s.load_token AND c.claim_id = s.claim_id "
+            f"WHERE s.load_token = %s AND s.changed = %s",
+            [token, True],
+        )
+        prune_cpt_codes()
+
+        # --- Derived data ---
+        summary.apply()
+        # Renamed patients or insurers show up in the cached lists even when no total moved.
+        invalidate_dashboard_summary()
+        touched = Claim.objects.filter(claim_id__in=claim_changed.values('claim_id')) | Claim.objects.filter(
+            pk__in=detail_changed.values('claim_pk')
+        )
+        touched_pks = list(touched.values_list('pk', flat=True))
+        staged_claim_count = staged_claims.count()
+        staged_detail_count = staged_details.filter(claim_pk__isnull=False).count()
+        transaction.on_commit(lambda: refresh_merged_claims(token, touched_pks))
+
+    return {
+        'claims': {'new': claims_created, 'changed': claims_updated,
+                   'unchanged': staged_claim_count - claims_created - claims_updated, 'removed': claims_removed},
+        'details': {'new': details_created, 'changed': details_updated,
+                    'unchanged': staged_detail_count - details_created - details_updated, 'removed': details_removed},
+    }
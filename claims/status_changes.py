@@ -0,0 +1,94 @@
+# claims/status_changes.py
+
+"""
+Status changes of many claims at once.
+
+`change_claim_statuses()` moves the selected claims with one set-based
+UPDATE and writes their `ClaimHistory` rows with `bulk_create`, all in one
+transaction. Bulk writes send no signals, so the dashboard and aging
+summaries, the search index and the cached claim cards are brought up to
+date here a chunk of claims at a time, as ingestion does, and the claim
+pages are marked stale once for the whole change.
+"""
+
+import re
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .fragments import invalidate_claim_cards
+from .models import Claim, ClaimHistory
+from .search import reindex_claims
+from .summary import SummaryDelta
+from .utils import BATCH_SIZE, chunked
+from .versions import CLAIMS, INGEST, bump_versions
+
+_SEPARATORS = re.compile(r'[\s,]+')
+
+
+def parse_claim_ids(text):
+    """
+    Reads claim IDs separated by commas or whitespace.
+
+    :raises ValueError: If one of them is not a whole number.
+    """
+    return [int(value) for value in _SEPARATORS.split(text.strip()) if value]
+
+
+def change_claim_statuses(claims, new_status, user=None, comment='', batch_size=BATCH_SIZE):
+    """
+    Moves claims to `new_status`, recording who did it and why in each
+    claim's history. Claims already in that status are left alone.
+
+    :param claims: A `Claim` queryset, or an iterable of claim IDs (the
+                   `claim_id` numbers); IDs are selected `batch_size` at a
+                   time so no statement exceeds the database's parameter limit.
+    :param batch_size: Claims whose history and derived data are written per statement.
+    :return: The number of claims changed.
+    :raises ValueError: If `new_status` is not a claim status.
+    """
+    labels = dict(Claim.STATUS_CHOICES)
+    if new_status not in labels:
+        raise ValueError(f'Unknown claim status: {new_status!r}')
+
+    if isinstance(claims, QuerySet):
+        selections = [claims]
+    else:
+        selections = (Claim.objects.filter(claim_id__in=chunk) for chunk in chunked(sorted(set(claims)), batch_size))
+
+    changed = 0
+    with transaction.atomic():
+        for selection in selections:
+            changed += _change_selection(selection, new_status, labels, user, comment, batch_size)
+        if changed:
+            # One bump for every changed claim's pages, as a load does, rather than a version row per claim.
+            bump_versions(INGEST, CLAIMS)
+    return changed
+
+
+def _change_selection(claims, new_status, labels, user, comment, batch_size):
+    targets = Claim.objects.filter(pk__in=claims.values('pk')).exclude(status=new_status)
+    # The old values feed the history and summaries; locked (where supported) so they cannot change meanwhile.
+    rows = list(targets.select_for_update().order_by('pk').values_list(
+        'pk', 'status', 'billed_amount', 'paid_amount', 'discharge_date'
+    ))
+    if not rows:
+        return 0
+    targets.update(status=new_status)
+
+    for chunk in chunked(rows, batch_size):
+        delta = SummaryDelta()
+        history = []
+        for pk, old_status, billed_amount, paid_amount, discharge_date in chunk:
+            delta.remove_claim(old_status, billed_amount, paid_amount, discharge_date)
+            delta.add_claim(new_status, billed_amount, paid_amount, discharge_date)
+            history.append(ClaimHistory(
+                claim_id=pk, user=user, old_status=labels.get(old_status, old_status),
+                new_status=labels[new_status], comment=comment,
+            ))
+        ClaimHistory.objects.bulk_create(history)
+        delta.apply()
+        pks = [row[0] for row in chunk]
+        reindex_claims(Claim.objects.filter(pk__in=pks))
+        invalidate_claim_cards(pks)
+    return len(rows)
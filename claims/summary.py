@@ -0,0 +1,261 @@
+# claims/summary.py
+
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Claim, ClaimAgingSummary, ClaimCptCode, ClaimDetail, ClaimStatusSummary, DenialReason
+
+CACHE_KEY = 'claims:dashboard_summary'
+
+
+def get_dashboard_summary():
+    """
+    Returns the claim-wide dashboard figures, from the cache when possible.
+
+    On a miss the figures are read from the small summary tables (plus two
+    indexed top-5 lists), so the cost does not grow with the claims table.
+    Per-code counts are a scan of the (code, claim) index alone.
+    """
+    summary = cache.get(CACHE_KEY)
+    if summary is None:
+        summary = _compute_dashboard_summary()
+        cache.set(CACHE_KEY, summary, settings.CLAIMS_DASHBOARD_CACHE_SECONDS)
+    return summary
+
+
+def invalidate_dashboard_summary():
+    """
+    Drops the cached dashboard figures now and again once the current
+    transaction commits, so a request that re-cached the old figures in
+    between does not keep them.
+    """
+    cache.delete(CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def _listed_claims():
+    """The pks of the claims the cached dashboard lists by name."""
+    summary = cache.get(CACHE_KEY)
+    if summary is None:
+        return set()
+    return {row['pk'] for row in summary['high_value_denials'] + summary['aging_claims']}
+
+
+def _compute_dashboard_summary():
+    status_rows = list(ClaimStatusSummary.objects.filter(claim_count__gt=0))
+    status_counts = {row.status: row.claim_count for row in status_rows}
+    total_claims = sum(status_counts.values())
+    total_underpayment = sum((row.underpayment_total for row in status_rows), Decimal('0'))
+
+    high_value_denials = list(
+        Claim.objects.filter(status=Claim.STATUS_DENIED).order_by('-underpayment').values(
+            'pk', 'claim_id', 'patient_name', 'insurer_name', 'underpayment'
+        )[:5]
+    )
+    aging_claims = list(
+        Claim.objects.filter(status=Claim.STATUS_UNDER_REVIEW).order_by('discharge_date').values(
+            'pk', 'claim_id', 'patient_name', 'insurer_name', 'discharge_date'
+        )[:5]
+    )
+    top_denial_reasons = [
+        {'denial_reason': row.text, 'count': row.claim_count}
+        for row in DenialReason.objects.filter(claim_count__gt=0).order_by('-claim_count', 'text')[:3]
+    ]
+    top_cpt_codes = list(
+        ClaimCptCode.objects.order_by().values('code').annotate(count=Count('claim'))
+        .order_by('-count', 'code')[:5]
+    )
+
+    return {
+        'total_underpayment': total_underpayment if total_claims else None,
+        'average_underpayment': total_underpayment / total_claims if total_claims else None,
+        'claims_awaiting_action': (
+            status_counts.get(Claim.STATUS_DENIED, 0) + status_counts.get(Claim.STATUS_UNDER_REVIEW, 0)
+        ),
+        'status_counts': status_counts,
+        'high_value_denials': high_value_denials,
+        'aging_claims': aging_claims,
+        'top_denial_reasons': top_denial_reasons,
+        'top_cpt_codes': top_cpt_codes,
+    }
+
+
+class SummaryDelta:
+    """
+    Accumulates changes to the summary tables so a whole batch is applied
+    with a fixed number of queries.
+    """
+    def __init__(self):
+        self.status_counts = defaultdict(int)
+        self.status_underpayment = defaultdict(Decimal)
+        # Keyed by (status, discharge_date).
+        self.aging_counts = defaultdict(int)
+        self.aging_underpayment = defaultdict(Decimal)
+        # Keyed by DenialReason pk.
+        self.denial_reasons = defaultdict(int)
+        # Claims written in place, whose names the cached top-5 lists may show.
+        self.touched_claims = set()
+
+    def add_claim(self, status, billed_amount, paid_amount, discharge_date, sign=1):
+        self.add_claim_totals(status, discharge_date, 1, Decimal(billed_amount) - Decimal(paid_amount), sign=sign)
+
+    def remove_claim(self, status, billed_amount, paid_amount, discharge_date):
+        self.add_claim(status, billed_amount, paid_amount, discharge_date, sign=-1)
+
+    def add_claim_totals(self, status, discharge_date, claim_count, underpayment, sign=1):
+        """Adds `claim_count` claims of one status and discharge date totalling `underpayment`."""
+        self.status_counts[status] += sign * claim_count
+        self.status_underpayment[status] += sign * underpayment
+        self.aging_counts[status, discharge_date] += sign * claim_count
+        self.aging_underpayment[status, discharge_date] += sign * underpayment
+
+    def add_denial_reason(self, denial_reason_id, sign=1, count=1):
+        if denial_reason_id is not None:
+            self.denial_reasons[denial_reason_id] += sign * count
+
+    def touch_claims(self, claim_pks):
+        """Records claims that were rewritten, even if none of their totals moved."""
+        self.touched_claims.update(claim_pks)
+
+    def remove_denial_reason(self, denial_reason_id):
+        self.add_denial_reason(denial_reason_id, sign=-1)
+
+    def apply(self):
+        """
+        Writes the accumulated deltas and invalidates the cached dashboard. When
+        no total moved, the cache is only dropped if it lists a touched claim
+        (a renamed patient or insurer would show there).
+        """
+        statuses = [s for s in self.status_counts if self.status_counts[s] or self.status_underpayment[s]]
+        aging = [key for key in self.aging_counts if self.aging_counts[key] or self.aging_underpayment[key]]
+        reasons = [r for r, delta in self.denial_reasons.items() if delta]
+        if not statuses and not aging and not reasons:
+            if self.touched_claims & _listed_claims():
+                invalidate_dashboard_summary()
+            return
+
+        if statuses:
+            ClaimStatusSummary.objects.bulk_create(
+                [ClaimStatusSummary(status=s) for s in statuses], ignore_conflicts=True
+            )
+            ClaimStatusSummary.objects.filter(status__in=statuses).update(
+                claim_count=F('claim_count') + Case(
+                    *[When(status=s, then=Value(self.status_counts[s])) for s in statuses], default=Value(0)
+                ),
+                underpayment_total=F('underpayment_total') + Case(
+                    *[When(status=s, then=Value(self.status_underpayment[s])) for s in statuses],
+                    default=Value(Decimal('0')), output_field=ClaimStatusSummary._meta.get_field('underpayment_total'),
+                ),
+            )
+
+        if aging:
+            if connection.features.supports_update_conflicts_with_target:
+                self._upsert_aging(aging)
+            else:
+                self._update_aging(aging)
+
+        if reasons:
+            DenialReason.objects.filter(pk__in=reasons).update(
+                claim_count=F('claim_count') + Case(
+                    *[When(pk=r, then=Value(self.denial_reasons[r])) for r in reasons], default=Value(0)
+                ),
+            )
+
+        invalidate_dashboard_summary()
+
+    def _upsert_aging(self, keys):
+        """Adds the aging deltas with an additive upsert, as many rows per statement as the backend takes."""
+        ops = connection.ops
+        table = ops.quote_name(ClaimAgingSummary._meta.db_table)
+        columns = ['status', 'discharge_date', 'claim_count', 'underpayment_total']
+        batch_size = ops.bulk_batch_size(columns, keys)
+        with connection.cursor() as cursor:
+            for start in range(0, len(keys), batch_size):
+                chunk = keys[start:start + batch_size]
+                params = []
+                for status, discharge_date in chunk:
+                    params += [
+                        status, ops.adapt_datefield_value(discharge_date), self.aging_counts[status, discharge_date],
+                        ops.adapt_decimalfield_value(self.aging_underpayment[status, discharge_date]),
+                    ]
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(ops.quote_name(c) for c in columns)}) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(chunk))} "
+                    f"ON CONFLICT ({ops.quote_name('status')}, {ops.quote_name('discharge_date')}) DO UPDATE SET "
+                    + ', '.join(
+                        f"{ops.quote_name(c)} = {table}.{ops.quote_name(c)} + excluded.{ops.quote_name(c)}"
+                        for c in ('claim_count', 'underpayment_total')
+                    ),
+                    params,
+                )
+
+    def _update_aging(self, keys):
+        """Without ON CONFLICT: creates the missing rows, then adds the deltas with one CASE update."""
+        ClaimAgingSummary.objects.bulk_create(
+            [ClaimAgingSummary(status=s, discharge_date=d) for s, d in keys], ignore_conflicts=True
+        )
+        dates = defaultdict(list)
+        for s, d in keys:
+            dates[s].append(d)
+        ClaimAgingSummary.objects.filter(
+            reduce(or_, (Q(status=s, discharge_date__in=ds) for s, ds in dates.items()))
+        ).update(
+            claim_count=F('claim_count') + Case(
+                *[When(status=s, discharge_date=d, then=Value(self.aging_counts[s, d])) for s, d in keys],
+                default=Value(0),
+            ),
+            underpayment_total=F('underpayment_total') + Case(
+                *[When(status=s, discharge_date=d, then=Value(self.aging_underpayment[s, d])) for s, d in keys],
+                default=Value(Decimal('0')),
+                output_field=ClaimAgingSummary._meta.get_field('underpayment_total'),
+            ),
+        )
+
+
+def record_status_change(claim, old_status):
+    """Moves one claim between status totals after its status was changed."""
+    delta = SummaryDelta()
+    delta.remove_claim(old_status, claim.billed_amount, claim.paid_amount, claim.discharge_date)
+    delta.add_claim(claim.status, claim.billed_amount, claim.paid_amount, claim.discharge_date)
+    delta.apply()
+
+
+@transaction.atomic
+def rebuild_summary():
+    """Recomputes the summary tables from scratch with set-based aggregates."""
+    ClaimStatusSummary.objects.all().delete()
+    ClaimStatusSummary.objects.bulk_create(
+        ClaimStatusSummary(status=row['status'], claim_count=row['claim_count'], underpayment_total=row['underpayment_total'] or 0)
+        for row in Claim.objects.order_by().values('status').annotate(
+            claim_count=Count('pk'), underpayment_total=Sum('underpayment')
+        )
+    )
+    ClaimAgingSummary.objects.all().delete()
+    ClaimAgingSummary.objects.bulk_create(
+        ClaimAgingSummary(
+            status=row['status'], discharge_date=row['discharge_date'],
+            claim_count=row['claim_count'], underpayment_total=row['underpayment_total'] or 0,
+        )
+        for row in Claim.objects.order_by().values('status', 'discharge_date').annotate(
+            claim_count=Count('pk'), underpayment_total=Sum('underpayment')
+        )
+    )
+
+    # One count per reason over the details' denial_reason index.
+    DenialReason.objects.update(claim_count=Coalesce(
+        Subquery(
+            ClaimDetail.objects.filter(denial_reason=OuterRef('pk')).order_by().values('denial_reason')
+            .annotate(count=Count('pk')).values('count')
+        ),
+        0,
+    ))
+
+    invalidate_dashboard_summary()
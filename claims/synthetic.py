@@ -0,0 +1,123 @@
+# claims/synthetic.py
+
+"""
+Reproducible synthetic claims data for benchmarks and query-plan checks.
+
+Rows come out in the same shape as the upload files (so they can go through
+`process_claim_data`), with the skew seen in real insurer drops: a few
+insurers carry most of the volume, most claims are paid, and a handful of
+denial reasons account for most denials.
+"""
+
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.models import User
+
+from .models import Claim, ClaimHistory, Flag, Note
+
+INSURERS = [
+    ('Blue Shield', 28), ('UnitedHealthcare', 22), ('Aetna', 14), ('Cigna', 11), ('Humana', 8),
+    ('Kaiser Permanente', 6), ('Anthem', 5), ('Molina Healthcare', 3), ('Centene', 2), ('Oscar Health', 1),
+]
+STATUSES = [
+    (Claim.STATUS_PAID, 55), (Claim.STATUS_DENIED, 22), (Claim.STATUS_UNDER_REVIEW, 18), (Claim.STATUS_APPEALED, 5),
+]
+DENIAL_REASONS = [
+    ('Missing prior authorization', 30), ('Service not covered under plan', 20), ('Duplicate claim submission', 14),
+    ('Timely filing limit exceeded', 10), ('Incorrect patient information', 8), ('Medical necessity not established', 8),
+    ('Coordination of benefits required', 5), ('Invalid CPT/modifier combination', 5),
+]
+CPT_CODES = [
+    '99213', '99214', '99215', '99203', '99204', '93000', '71045', '80053', '85025', '36415', '97110', '20610',
+]
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'William', 'Barbara', 'Maria', 'Wei', 'Aisha', 'Carlos', 'Priya', 'Olga', 'Kenji', 'Fatima']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Nguyen', 'Patel', 'Kim', 'Ivanova', 'Okafor']
+
+# Discharge dates are spread over the two years up to this day.
+END_DATE = date(2025, 6, 30)
+
+
+def _weighted(choices):
+    values = [value for value, _ in choices]
+    cum_weights = list(accumulate(weight for _, weight in choices))
+    return lambda rng: rng.choices(values, cum_weights=cum_weights)[0]
+
+
+_insurer = _weighted(INSURERS)
+_status = _weighted(STATUSES)
+_denial_reason = _weighted(DENIAL_REASONS)
+
+
+def claim_rows(count, seed=0, start_id=1):
+    """Yields `count` claim records (upload-file shape) with ids from `start_id`."""
+    rng = random.Random(seed)
+    for claim_id in range(start_id, start_id + count):
+        status = _status(rng)
+        billed = round(rng.lognormvariate(7, 1), 2)
+        if status == Claim.STATUS_PAID:
+            paid = round(billed * rng.uniform(0.7, 1.0), 2)
+        elif status == Claim.STATUS_DENIED:
+            paid = 0
+        else:
+            paid = round(billed * rng.uniform(0, 0.6), 2)
+        yield {
+            'id': claim_id,
+            'patient_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'billed_amount': f'{billed:.2f}',
+            'paid_amount': f'{paid:.2f}',
+            'status': status,
+            'insurer_name': _insurer(rng),
+            'discharge_date': (END_DATE - timedelta(days=int(rng.expovariate(1 / 120)) % 730)).isoformat(),
+        }
+
+
+def detail_rows(count, seed=0, start_id=1):
+    """
+    Yields claim detail records for the claims made by `claim_rows` with the
+    same arguments; denied and appealed claims get a denial reason.
+    """
+    rng = random.Random(seed + 1)
+    for claim, claim_id in zip(claim_rows(count, seed, start_id), range(start_id, start_id + count)):
+        denied = claim['status'] in (Claim.STATUS_DENIED, Claim.STATUS_APPEALED)
+        yield {
+            'id': claim_id,
+            'claim_id': claim_id,
+            'denial_reason': _denial_reason(rng) if denied else '',
+            'cpt_codes': ','.join(rng.sample(CPT_CODES, rng.randint(1, 3))),
+        }
+
+
+def seed_activity(users=20, seed=0, note_ratio=0.3, flag_ratio=0.02, history_ratio=0.4):
+    """
+    Adds users, and notes, flags and status history spread over the existing
+    claims in the given proportions. Returns the created users.
+    """
+    rng = random.Random(seed + 2)
+    User.objects.bulk_create(
+        [User(username=f'bench_user_{seed}_{i}') for i in range(users)], ignore_conflicts=True
+    )
+    bench_users = list(User.objects.filter(username__startswith=f'bench_user_{seed}_'))
+    claim_pks = list(Claim.objects.values_list('pk', flat=True))
+
+    notes, flags, history = [], [], []
+    for pk in claim_pks:
+        if rng.random() < note_ratio:
+            for _ in range(rng.randint(1, 5)):
+                notes.append(Note(claim_id=pk, user=rng.choice(bench_users), text='Followed up with the insurer.',
+                                  is_public=rng.random() < 0.5))
+        if rng.random() < history_ratio:
+            for _ in range(rng.randint(1, 3)):
+                history.append(ClaimHistory(claim_id=pk, user=rng.choice(bench_users),
+                                            old_status=Claim.STATUS_UNDER_REVIEW, new_status=Claim.STATUS_DENIED))
+    for user in bench_users:
+        for pk in rng.sample(claim_pks, min(len(claim_pks), int(len(claim_pks) * flag_ratio))):
+            flags.append(Flag(user=user, claim_id=pk))
+
+    Note.objects.bulk_create(notes, batch_size=1000)
+    ClaimHistory.objects.bulk_create(history, batch_size=1000)
+    Flag.objects.bulk_create(flags, batch_size=1000, ignore_conflicts=True)
+    return bench_users
@@ -1,18 +1,44 @@
 # path: claims/tests.py
 
 
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
-from django.db import IntegrityError
+from django.utils import timezone
+from django.db import IntegrityError, connection, connections
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
+import csv
+import environ
 import json
-from io import StringIO
-from django.core.management import call_command
+import os
+import tempfile
+import urllib.parse
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from django.core.management import CommandError, call_command
 
-from .models import Claim, ClaimDetail, Note, Flag, ClaimHistory
-from .utils import process_claim_data
+from django.core.cache import cache
+from . import synthetic
+from .jobs import run_upload_job
+from .models import Claim, ClaimCptCode, ClaimDetail, DenialReason, Note, Flag, ClaimHistory, UploadJob, ClaimStatusSummary, ClaimAgingSummary, ClaimStaging, ClaimDetailStaging, ClaimCptCodeStaging
+from .aging import aging_buckets, worklist_claims
+from .auth import CachedModelBackend, user_cache
+from .denial_reasons import intern_denial_reason
+from .diagnostics import diagnose_queries, fingerprint, process_log_path
+from .middleware import registry
+from .pagination import OLDEST_FIRST_ORDERING, paginate_by_cursor
+from .search import filter_claims, search_claims
+from .staging import new_load_token, stage_claims, stage_details
+from .status_changes import change_claim_statuses
+from .summary import get_dashboard_summary, rebuild_summary
+from .utils import clean_claim_row, clean_detail_row, load_claim_data, process_claim_data, iter_data_from_stream
 from .forms import CustomUserCreationForm
+from erisa_project.database import database_settings
 
 # ================================================================= #
 # 1. MODEL TESTS
@@ -51,7 +77,7 @@ class ModelTests(TestCase):
 
     def test_cascade_delete_on_claim(self):
         """EDGE CASE: Verifies that deleting a Claim also deletes its related Notes, Flags, etc."""
-        ClaimDetail.objects.create(claim=self.claim, cpt_codes='123', denial_reason='Test')
+        ClaimDetail.objects.create(claim=self.claim, cpt_codes='123', denial_reason=intern_denial_reason('Test'))
         Note.objects.create(user=self.user, claim=self.claim, text='A note')
         Flag.objects.create(user=self.user, claim=self.claim)
         ClaimHistory.objects.create(claim=self.claim, old_status='A', new_status='B')
@@ -122,6 +148,61 @@ class UtilsTests(TestCase):
         stats = process_claim_data(self.claims_data_json, bad_details_data, 'append')
         self.assertEqual(stats, (1, 0, 0, 0))
 
+    def test_process_data_batches_across_chunks(self):
+        """PERFORMANCE: Verifies rows are written per chunk, not per record, with unchanged counters."""
+        claims = [
+            {"id": str(40000 + i), "patient_name": f"Patient {i}", "billed_amount": "100.00", "paid_amount": "10.00",
+             "status": "Denied", "insurer_name": "InsureCo", "discharge_date": "2025-01-01"}
+            for i in range(25)
+        ]
+        details = [{"id": str(i), "claim_id": str(40000 + i), "denial_reason": "", "cpt_codes": "99213"} for i in range(25)]
+        Claim.objects.create(claim_id=40000, patient_name='Existing', billed_amount=1, paid_amount=1, status='Paid', insurer_name='Old', discharge_date='2024-01-01')
+
+        # 3 chunks of claims and 3 chunks of details, each a bounded number of queries
+        # (including three per claim chunk to adjust the dashboard and aging summaries, four per
+        # chunk to refresh the search and substring indexes (one upsert on PostgreSQL) and one per
+        # detail chunk for the CPT code rows), plus one at the end to mark the cached claim pages stale.
+        index_queries = 4 if connection.vendor == 'sqlite' else 1
+        with self.assertNumQueries(40 + 6 * index_queries):
+            stats = process_claim_data(claims, details, 'append', batch_size=10)
+        self.assertEqual(stats, (24, 1, 25, 0))
+        self.assertEqual(Claim.objects.get(claim_id=40000).patient_name, 'Patient 0')
+        self.assertEqual(ClaimDetail.objects.count(), 25)
+
+    def test_process_data_counts_repeated_rows_as_updates(self):
+        """EDGE CASE: Verifies a claim repeated in one file is created once, then counted as updated."""
+        repeated = self.claims_data_json + [dict(self.claims_data_json[0], patient_name="Jane Later")]
+        stats = process_claim_data(repeated, self.details_data_json, 'append')
+        self.assertEqual(stats, (1, 1, 1, 0))
+        self.assertEqual(Claim.objects.get(claim_id=30001).patient_name, "Jane Later")
+
+    @mock.patch('claims.utils.STREAM_CHUNK_SIZE', 7)
+    def test_iter_data_from_stream_csv_across_reads(self):
+        """FUNCTIONALITY: Verifies CSV rows (including quoted newlines and multi-byte text) parse lazily across small reads."""
+        content = 'id,claim_id,denial_reason,cpt_codes\n1,30001,"Line one\nline two","99204,82947"\n2,30002,Résumé,90834\n'
+        rows = iter_data_from_stream(BytesIO(content.encode('utf-8')), 'details.csv')
+        self.assertEqual(next(rows)['denial_reason'], 'Line one\nline two')
+        self.assertEqual(list(rows), [{'id': '2', 'claim_id': '30002', 'denial_reason': 'Résumé', 'cpt_codes': '90834'}])
+
+    @mock.patch('claims.utils.STREAM_CHUNK_SIZE', 5)
+    def test_iter_data_from_stream_json_array_and_lines(self):
+        """FUNCTIONALITY: Verifies top-level JSON arrays and JSON Lines are decoded incrementally."""
+        records = [{"id": 30001, "patient_name": "Zoë"}, {"id": 30002, "patient_name": "Bo"}]
+        array = json.dumps(records, ensure_ascii=False).encode('utf-8')
+        lines = '\n'.join(json.dumps(r) for r in records).encode('utf-8')
+        self.assertEqual(list(iter_data_from_stream(BytesIO(array), 'claims.json')), records)
+        self.assertEqual(list(iter_data_from_stream(BytesIO(lines), 'claims.jsonl')), records)
+        self.assertEqual(list(iter_data_from_stream(BytesIO(b'[12, 345]'), 'numbers.json')), [12, 345])
+
+    def test_iter_data_from_stream_rejects_bad_input(self):
+        """EDGE CASE: Verifies unsupported formats fail immediately and malformed JSON fails while iterating."""
+        with self.assertRaises(ValueError):
+            iter_data_from_stream(BytesIO(b''), 'claims.xlsx')
+        with self.assertRaises(ValueError):
+            list(iter_data_from_stream(BytesIO(b'[{"id": 1} {"id": 2}]'), 'claims.json'))
+        with self.assertRaises(ValueError):
+            list(iter_data_from_stream(BytesIO(b'[{"id": 1}, {"id": '), 'claims.json'))
+
 # ================================================================= #
 # 3. REGISTRATION AND LOGIN TESTS
 # ================================================================= #
@@ -254,8 +335,14 @@ class ViewTests(TestCase):
     # ======================================= #
     # START OF NEW TESTS FOR CSV UPLOAD
     # ======================================= #
+    @override_settings(CLAIMS_UPLOAD_EAGER=True)
     def test_upload_view_with_csv(self):
         """FUNCTIONALITY: Verifies the upload view can process valid CSV files."""
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
         self.client_a.login(username='user_a', password='password123')
 
         claims_csv_content = "id,patient_name,billed_amount,paid_amount,status,insurer_name,discharge_date\n40001,CSV Patient,500.00,400.00,Paid,CSV Insurer,2025-03-01"
@@ -273,7 +360,13 @@ class ViewTests(TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'claims/dashboard.html')
-        self.assertContains(response, "Upload successful! Claims: 1 created")
+        job = UploadJob.objects.get()
+        self.assertEqual(job.status, UploadJob.STATUS_DONE)
+        # The overwrite replaces the two claims from setUp.
+        self.assertTrue(job.success_message.startswith('Success! Claims: 1 new, 0 changed, 0 unchanged, 2 removed.'))
+        # The dashboard shows the message from its URL (and the queued message) rather than the page body.
+        self.assertIn(urllib.parse.quote(job.success_message), response.redirect_chain[-1][0])
+        self.assertEqual([str(m) for m in response.context['messages']], [job.success_message])
         self.assertTrue(Claim.objects.filter(claim_id=40001).exists())
     # ======================================= #
     # END OF NEW TESTS
@@ -325,4 +418,1813 @@ class ManagementCommandTests(TestCase):
         call_command('load_claims', 'test_claims.csv', 'test_details.csv', '--mode=overwrite', stdout=out)
         self.assertIn('Processing complete. Claims: 1 created, 0 updated.', out.getvalue())
         self.assertEqual(Claim.objects.count(), 1)
-        self.assertTrue(Claim.objects.filter(claim_id=40001).exists())
\ No newline at end of file
+        self.assertTrue(Claim.objects.filter(claim_id=40001).exists())
+
+    def test_load_claims_command_directory_in_parallel(self):
+        """FUNCTIONALITY: Verifies a directory of sharded files loads through the worker pool and reports throughput."""
+        with tempfile.TemporaryDirectory() as drop_dir:
+            header = "id,patient_name,billed_amount,paid_amount,status,insurer_name,discharge_date\n"
+            with open(os.path.join(drop_dir, 'claims_jan.csv'), 'w') as f:
+                f.write(header + "".join(f"{50000 + i},Patient {i},100.00,10.00,denied,InsureCo,2025-01-0{i + 1}\n" for i in range(5)))
+            with open(os.path.join(drop_dir, 'claims_feb.csv'), 'w') as f:
+                f.write(header + "50100,Feb Patient,200.00,20.00,Paid,InsureCo,2025-02-01\n"
+                                 "50101,Bad Status,200.00,20.00,Lost,InsureCo,2025-02-01\n")
+            with open(os.path.join(drop_dir, 'claim_details.jsonl'), 'w') as f:
+                f.write('{"id": 1, "claim_id": 50000, "denial_reason": "Late", "cpt_codes": "99204"}\n'
+                        '{"id": 2, "claim_id": 50100, "denial_reason": "", "cpt_codes": "90834"}\n')
+
+            out = StringIO()
+            call_command('load_claims', f'--dir={drop_dir}', '--workers=2', '--shard-lines=2', stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('Processing complete. Claims: 6 created, 0 updated. Details: 2 created, 0 updated.', output)
+        self.assertIn('claims_jan.csv [claims]: 5 rows in 3 shard(s), 0 skipped', output)
+        self.assertIn('claims_feb.csv [claims]: 2 rows in 1 shard(s), 1 skipped', output)
+        self.assertIn('rows/s', output)
+        self.assertEqual(Claim.objects.get(claim_id=50000).status, Claim.STATUS_DENIED)
+        self.assertFalse(Claim.objects.filter(claim_id=50101).exists())
+
+    def test_load_claims_command_shards_keep_multiline_csv_fields_whole(self):
+        """EDGE CASE: Verifies shards end on record boundaries, so a quoted field spanning lines is not split."""
+        with tempfile.TemporaryDirectory() as drop_dir:
+            path = os.path.join(drop_dir, 'claims.csv')
+            with open(path, 'w', newline='') as f:
+                f.write("id,patient_name,billed_amount,paid_amount,status,insurer_name,discharge_date\n"
+                        '50200,"Doe,\nJane\nMarie",100.00,10.00,Paid,InsureCo,2025-01-01\n'
+                        "50201,Plain Patient,200.00,20.00,Denied,InsureCo,2025-01-02\n"
+                        '50202,"Roe,\nRichard",300.00,30.00,Paid,InsureCo,2025-01-03\n')
+
+            out = StringIO()
+            call_command('load_claims', f'--claims={path}', '--workers=0', '--shard-lines=1', stdout=out)
+
+        self.assertIn('claims.csv [claims]: 3 rows in 3 shard(s), 0 skipped', out.getvalue())
+        self.assertEqual(Claim.objects.get(claim_id=50200).patient_name, 'Doe,\nJane\nMarie')
+        self.assertEqual(Claim.objects.get(claim_id=50202).patient_name, 'Roe,\nRichard')
+        self.assertEqual(Claim.objects.get(claim_id=50201).status, Claim.STATUS_DENIED)
+
+    def test_load_claims_command_skips_unparseable_rows(self):
+        """EDGE CASE: Verifies bad ids, impossible dates and NaN or infinite amounts are skipped instead of aborting the load."""
+        with tempfile.TemporaryDirectory() as drop_dir:
+            path = os.path.join(drop_dir, 'claims.csv')
+            with open(path, 'w') as f:
+                f.write("id,patient_name,billed_amount,paid_amount,status,insurer_name,discharge_date\n"
+                        "50300,Good Patient,100.00,10.00,Paid,InsureCo,2025-01-01\n"
+                        "ABC,Bad Id,100.00,10.00,Paid,InsureCo,2025-01-01\n"
+                        "50301,Bad Date,100.00,10.00,Paid,InsureCo,2025-13-01\n"
+                        "50302,NaN Amount,NaN,10.00,Paid,InsureCo,2025-01-01\n"
+                        "50303,Infinite Amount,100.00,-Infinity,Paid,InsureCo,2025-01-01\n")
+
+            out = StringIO()
+            call_command('load_claims', f'--claims={path}', '--workers=0', '--shard-lines=2', stdout=out)
+
+        self.assertIn('claims.csv [claims]: 5 rows in 3 shard(s), 4 skipped', out.getvalue())
+        self.assertEqual(list(Claim.objects.values_list('claim_id', flat=True)), [50300])
+
+    def test_explain_claim_indexes_shows_index_scans_and_rolls_back(self):
+        """PERFORMANCE: Verifies the seeded plans use the per-user lookup indexes and nothing is left behind."""
+        out = StringIO()
+        call_command('explain_claim_indexes', '--claims', '2000', '--users', '5', stdout=out)
+        output = out.getvalue()
+        indexes = ['flag_user_created_idx', 'history_timestamp_idx']
+        if connection.vendor == 'sqlite':
+            # PostgreSQL's planner reads a claim's few notes and history rows through the foreign key indexes.
+            indexes += ['note_claim_created_idx', 'history_claim_timestamp_idx']
+        for index in indexes:
+            self.assertIn(f'uses: {index}', output)
+        self.assertFalse(Claim.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith='bench_user_').exists())
+        with connection.cursor() as cursor:
+            self.assertIn('note_claim_created_idx', connection.introspection.get_constraints(cursor, 'claims_note'))
+
+    def test_benchmark_claims_writes_json_report(self):
+        """PERFORMANCE: Verifies the benchmark times every hot path and reports percentiles, query counts and RSS."""
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            call_command('benchmark_claims', '--sizes', '300', '--iterations', '2', '--users', '3', '--use-current-db',
+                         stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        dataset = report['datasets'][0]
+        self.assertEqual(dataset['claims'], 300)
+        self.assertEqual(dataset['ingest']['claims_created'], 300)
+        scenarios = dataset['scenarios']
+        # 16 list filter combinations, a deep cursor, detail, two dashboards and an upload.
+        self.assertEqual(len([name for name in scenarios if name.startswith('claim_list[')]), 17)
+        for name in ('claim_list[unfiltered]', 'claim_list[q,patient_name,status,insurer_name]', 'claim_detail',
+                     'dashboard[cold_cache]', 'upload_claims[500_rows]'):
+            self.assertEqual(set(scenarios[name]), {'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'queries', 'peak_rss_mb'})
+        # Session, version check and claims; the user is cached by the auth backend after the warm-up request.
+        self.assertEqual(scenarios['claim_list[unfiltered]']['queries'], 3)
+
+    def test_synthetic_data_is_reproducible_and_skewed(self):
+        """FUNCTIONALITY: Verifies the generator gives identical data for a seed and a skewed status mix."""
+        first = list(synthetic.claim_rows(2000, seed=7))
+        self.assertEqual(first, list(synthetic.claim_rows(2000, seed=7)))
+        self.assertNotEqual(first, list(synthetic.claim_rows(2000, seed=8)))
+        statuses = [row['status'] for row in first]
+        self.assertGreater(statuses.count(Claim.STATUS_PAID), statuses.count(Claim.STATUS_DENIED))
+        self.assertGreater(statuses.count(Claim.STATUS_DENIED), statuses.count(Claim.STATUS_APPEALED))
+        details = list(synthetic.detail_rows(2000, seed=7))
+        self.assertTrue(all(
+            bool(detail['denial_reason']) == (claim['status'] in (Claim.STATUS_DENIED, Claim.STATUS_APPEALED))
+            for claim, detail in zip(first, details)
+        ))
+
+# ================================================================= #
+# 6. BACKGROUND UPLOAD JOB TESTS
+# ================================================================= #
+class UploadJobTests(TestCase):
+    """
+    Tests that uploads are saved and queued instead of being loaded inside
+    the request, and that the progress endpoint reports the job's outcome.
+    """
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = User.objects.create_user(username='uploader', password='password123')
+        self.client.login(username='uploader', password='password123')
+
+    def _post_upload(self, claims_csv, details_csv, **extra):
+        return self.client.post(reverse('claims:upload-claims'), {
+            'claims_file': SimpleUploadedFile("claims.csv", claims_csv.encode('utf-8'), content_type="text/csv"),
+            'details_file': SimpleUploadedFile("details.csv", details_csv.encode('utf-8'), content_type="text/csv"),
+            'mode': 'append',
+        }, **extra)
+
+    def test_upload_is_queued_and_polled_to_completion(self):
+        """FUNCTIONALITY: Verifies the request only queues a job, and polling redirects once a worker has run it."""
+        response = self._post_upload(
+            "id,patient_name,billed_amount,paid_amount,status,insurer_name,discharge_date\n40001,CSV Patient,500.00,400.00,Paid,CSV Insurer,2025-03-01",
+            "id,claim_id,denial_reason,cpt_codes\n1,40001,,99215",
+            HTTP_HX_REQUEST='true',
+        )
+        job = UploadJob.objects.get()
+        self.assertEqual(job.status, UploadJob.STATUS_QUEUED)
+        self.assertFalse(Claim.objects.exists())
+        self.assertContains(response, 'hx-trigger="every 2s"')
+
+        run_upload_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.STATUS_DONE)
+        self.assertEqual((job.claims_created, job.details_created, job.rows_processed), (1, 1, 2))
+        self.assertTrue(Claim.objects.filter(claim_id=40001).exists())
+
+        response = self.client.get(reverse('claims:upload-job', kwargs={'pk': job.pk}), HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 204)
+        self.assertIn(reverse('claims:dashboard'), response['HX-Redirect'])
+
+    @override_settings(CLAIMS_UPLOAD_EAGER=True)
+    def test_failed_job_reports_error_summary(self):
+        """EDGE CASE: Verifies a job with a missing column is marked failed with a readable error."""
+        self._post_upload("id,patient_name\n40001,No Amounts", "id,claim_id,denial_reason,cpt_codes\n1,40001,,99215")
+        job = UploadJob.objects.get()
+        self.assertEqual(job.status, UploadJob.STATUS_FAILED)
+        self.assertIn('A required column is missing', job.error)
+
+        response = self.client.get(reverse('claims:upload-job', kwargs={'pk': job.pk}))
+        self.assertContains(response, 'Upload failed')
+        self.assertNotContains(response, 'hx-trigger="every 2s"')
+
+    @override_settings(CLAIMS_UPLOAD_STALE_SECONDS=60)
+    def test_jobs_abandoned_by_a_restarted_worker_are_requeued(self):
+        """EDGE CASE: Verifies running jobs whose heartbeat stopped are requeued and run, while live ones are left alone."""
+        self._post_upload(
+            "id,patient_name,billed_amount,paid_amount,status,insurer_name,discharge_date\n40001,CSV Patient,500.00,400.00,Paid,CSV Insurer,2025-03-01",
+            "id,claim_id,denial_reason,cpt_codes\n1,40001,,99215",
+        )
+        self._post_upload(
+            "id,patient_name,billed_amount,paid_amount,status,insurer_name,discharge_date\n40002,CSV Patient,500.00,400.00,Paid,CSV Insurer,2025-03-01",
+            "id,claim_id,denial_reason,cpt_codes\n2,40002,,99215",
+        )
+        stale, live = UploadJob.objects.order_by('pk')
+        now = timezone.now()
+        # A worker that died mid-load, and one that is still reporting progress.
+        UploadJob.objects.filter(pk=stale.pk).update(
+            status=UploadJob.STATUS_RUNNING, started_at=now - timedelta(hours=1),
+            heartbeat_at=now - timedelta(minutes=5), rows_processed=1,
+        )
+        UploadJob.objects.filter(pk=live.pk).update(
+            status=UploadJob.STATUS_RUNNING, started_at=now - timedelta(hours=1), heartbeat_at=now,
+        )
+
+        out = StringIO()
+        call_command('process_upload_jobs', stdout=out)
+        self.assertIn('Requeued 1 stale job(s).', out.getvalue())
+        stale.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual(stale.status, UploadJob.STATUS_DONE)
+        self.assertEqual(stale.rows_processed, 2)
+        self.assertEqual(live.status, UploadJob.STATUS_RUNNING)
+        self.assertTrue(Claim.objects.filter(claim_id=40001).exists())
+
+        # Polling a stale job's page requeues it on the web process's own pool.
+        UploadJob.objects.filter(pk=live.pk).update(heartbeat_at=now - timedelta(minutes=5))
+        with override_settings(CLAIMS_UPLOAD_EAGER=True):
+            response = self.client.get(reverse('claims:upload-job', kwargs={'pk': live.pk}), HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 204)
+        live.refresh_from_db()
+        self.assertEqual(live.status, UploadJob.STATUS_DONE)
+        self.assertTrue(Claim.objects.filter(claim_id=40002).exists())
+
+# ================================================================= #
+# 7. DASHBOARD SUMMARY TESTS
+# ================================================================= #
+class DashboardSummaryTests(TestCase):
+    """
+    Tests that the dashboard figures are maintained incrementally as claims
+    are loaded and change status, and served without scanning the claims table.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='analyst', password='password123')
+        self.client.login(username='analyst', password='password123')
+        claims = [
+            {"id": 1, "patient_name": "A", "billed_amount": "500.00", "paid_amount": "100.00", "status": "Denied", "insurer_name": "X", "discharge_date": "2025-01-01"},
+            {"id": 2, "patient_name": "B", "billed_amount": "300.00", "paid_amount": "300.00", "status": "Paid", "insurer_name": "Y", "discharge_date": "2025-01-02"},
+            {"id": 3, "patient_name": "C", "billed_amount": "200.00", "paid_amount": "50.00", "status": "Under Review", "insurer_name": "Z", "discharge_date": "2025-01-03"},
+        ]
+        details = [
+            {"id": 1, "claim_id": 1, "denial_reason": "Not covered", "cpt_codes": "99213"},
+            {"id": 2, "claim_id": 3, "denial_reason": "Not covered", "cpt_codes": "99214"},
+        ]
+        process_claim_data(claims, details, 'append')
+
+    def _recomputed(self):
+        summary = get_dashboard_summary()
+        cache.clear()
+        rebuild_summary()
+        return summary, get_dashboard_summary()
+
+    def test_incremental_summary_matches_full_rebuild(self):
+        """FUNCTIONALITY: Verifies loads, re-loads and status changes keep the summary equal to a full recompute."""
+        process_claim_data(
+            [{"id": 1, "patient_name": "A", "billed_amount": "500.00", "paid_amount": "500.00", "status": "Paid", "insurer_name": "X", "discharge_date": "2025-01-01"}],
+            [{"id": 1, "claim_id": 1, "denial_reason": "Late filing", "cpt_codes": "99213"}],
+            'append',
+        )
+        claim = Claim.objects.get(claim_id=3)
+        self.client.post(reverse('claims:change-claim-status', kwargs={'pk': claim.pk}), {'status': Claim.STATUS_DENIED})
+
+        incremental, rebuilt = self._recomputed()
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(incremental['total_underpayment'], 150)
+        self.assertEqual(incremental['claims_awaiting_action'], 1)
+        self.assertEqual(incremental['status_counts'], {'Paid': 2, 'Denied': 1})
+        self.assertEqual(
+            {r['denial_reason']: r['count'] for r in incremental['top_denial_reasons']},
+            {'Not covered': 1, 'Late filing': 1},
+        )
+
+    def test_overwrite_resets_summary(self):
+        """EDGE CASE: Verifies an overwrite load leaves no totals from the deleted claims behind."""
+        process_claim_data([], [], 'overwrite')
+        summary = get_dashboard_summary()
+        self.assertIsNone(summary['total_underpayment'])
+        self.assertEqual(summary['claims_awaiting_action'], 0)
+        self.assertEqual(summary['top_denial_reasons'], [])
+
+    def test_dashboard_served_from_cache(self):
+        """PERFORMANCE: Verifies a warm dashboard only runs the per-user queries, and writes invalidate it."""
+        self.client.get(reverse('claims:dashboard'))
+        # Version check, session, flag count, flagged items and recent activity (the user is cached by the auth backend).
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('claims:dashboard'))
+        self.assertContains(response, '550.00')
+
+        ClaimStatusSummary.objects.update(claim_count=0)
+        process_claim_data(
+            [{"id": 4, "patient_name": "D", "billed_amount": "10.00", "paid_amount": "0.00", "status": "Denied", "insurer_name": "X", "discharge_date": "2025-01-04"}],
+            [], 'append',
+        )
+        self.assertEqual(get_dashboard_summary()['status_counts'], {'Denied': 1})
+
+    def test_renaming_a_listed_claim_invalidates_the_cache(self):
+        """EDGE CASE: Verifies a re-load that only renames a claim on the cached top-5 lists drops the cache."""
+        self.assertEqual([row['patient_name'] for row in get_dashboard_summary()['high_value_denials']], ['A'])
+        renamed = {"id": 1, "patient_name": "A Renamed", "billed_amount": "500.00", "paid_amount": "100.00", "status": "Denied", "insurer_name": "X", "discharge_date": "2025-01-01"}
+        for mode in ('append', 'delta'):
+            with self.subTest(mode=mode):
+                renamed['patient_name'] += '!'
+                # Delta loads treat the input as a full snapshot, so the other claims come along.
+                others = [] if mode == 'append' else [
+                    {"id": 2, "patient_name": "B", "billed_amount": "300.00", "paid_amount": "300.00", "status": "Paid", "insurer_name": "Y", "discharge_date": "2025-01-02"},
+                    {"id": 3, "patient_name": "C", "billed_amount": "200.00", "paid_amount": "50.00", "status": "Under Review", "insurer_name": "Z", "discharge_date": "2025-01-03"},
+                ]
+                process_claim_data([renamed] + others, [], mode)
+                self.assertEqual(
+                    [row['patient_name'] for row in get_dashboard_summary()['high_value_denials']], [renamed['patient_name']]
+                )
+
+    def test_admin_edits_move_the_summary_without_a_rebuild(self):
+        """PERFORMANCE: Verifies admin saves and deletes adjust the totals by the edited rows and match a full recompute."""
+        User.objects.create_superuser(username='admin', password='password123')
+        self.client.login(username='admin', password='password123')
+        claim = Claim.objects.get(claim_id=3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('admin:claims_claim_change', args=[claim.pk]), {
+                'claim_id': 3, 'patient_name': 'C', 'billed_amount': '900.00', 'paid_amount': '50.00',
+                'status': Claim.STATUS_DENIED, 'insurer_name': 'Z', 'discharge_date': '2025-01-03',
+            })
+            self.assertEqual(response.status_code, 302)
+            detail = ClaimDetail.objects.get(claim__claim_id=1)
+            self.client.post(reverse('admin:claims_claimdetail_delete', args=[detail.pk]), {'post': 'yes'})
+            self.client.post(reverse('admin:claims_claim_changelist'), {
+                'action': 'delete_selected', 'post': 'yes',
+                '_selected_action': [Claim.objects.get(claim_id=2).pk],
+            })
+        self.assertFalse([q for q in queries.captured_queries if 'DELETE FROM "claims_claimstatussummary"' in q['sql']])
+
+        incremental, rebuilt = self._recomputed()
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(incremental['status_counts'], {'Denied': 2})
+        self.assertEqual(incremental['total_underpayment'], 1250)
+        self.assertEqual(incremental['top_denial_reasons'], [{'denial_reason': 'Not covered', 'count': 1}])
+
+# ================================================================= #
+# 8. CURSOR PAGINATION TESTS
+# ================================================================= #
+class CursorPaginationTests(TestCase):
+    """
+    Tests keyset pagination of the claim list: stable order across equal
+    discharge dates, working previous/next cursors, and constant cost per page.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pager', password='password123')
+        self.client.login(username='pager', password='password123')
+        # 23 claims over 4 discharge dates, so many rows share a sort key.
+        process_claim_data([
+            {"id": 60000 + i, "patient_name": f"Pager {i}", "billed_amount": "10.00", "paid_amount": "0.00",
+             "status": "Denied", "insurer_name": "X", "discharge_date": f"2025-01-0{1 + i % 4}"}
+            for i in range(23)
+        ], [], 'append')
+
+    def test_cursor_walk_visits_every_claim_once(self):
+        """FUNCTIONALITY: Verifies next cursors visit each claim exactly once and previous cursors walk back."""
+        expected = list(Claim.objects.order_by('-discharge_date', '-id').values_list('pk', flat=True))
+        pages, cursor = [], None
+        while True:
+            page = paginate_by_cursor(Claim.objects.all(), cursor, 5)
+            pages.append([claim.pk for claim in page])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual([pk for page in pages for pk in page], expected)
+        self.assertEqual(len(pages), 5)
+
+        walked_back = [[claim.pk for claim in page]]
+        while page.has_previous():
+            page = paginate_by_cursor(Claim.objects.all(), page.previous_cursor, 5)
+            walked_back.append([claim.pk for claim in page])
+        self.assertEqual(walked_back[::-1], pages)
+
+    def test_list_view_renders_cursor_links_and_tolerates_bad_cursor(self):
+        """EDGE CASE: Verifies the HTMX partial links by cursor and a tampered cursor falls back to the first page."""
+        response = self.client.get(reverse('claims:claim-list'), HTTP_HX_REQUEST='true')
+        self.assertTemplateUsed(response, 'claims/partials/_claims_content_partial.html')
+        self.assertContains(response, '23 claims')
+        self.assertContains(response, f'hx-get="?cursor={response.context["page_obj"].next_cursor}&')
+
+        response = self.client.get(reverse('claims:claim-list') + '?cursor=not-a-cursor!')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_deep_page_costs_the_same_as_first_page(self):
+        """PERFORMANCE: Verifies a deep page runs the same queries as the first, with no COUNT over the table."""
+        last = paginate_by_cursor(Claim.objects.all(), None, 5)
+        while last.has_next():
+            deep_cursor = last.next_cursor
+            last = paginate_by_cursor(Claim.objects.all(), deep_cursor, 5)
+
+        self.client.get(reverse('claims:claim-list'), HTTP_HX_REQUEST='true')
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(reverse('claims:claim-list'), HTTP_HX_REQUEST='true')
+        with CaptureQueriesContext(connection) as deep:
+            response = self.client.get(reverse('claims:claim-list') + f'?cursor={deep_cursor}', HTTP_HX_REQUEST='true')
+        self.assertEqual(len(response.context['page_obj']), 3)
+        self.assertEqual(len(deep.captured_queries), len(first.captured_queries))
+        self.assertFalse(any('OFFSET' in q['sql'] or 'COUNT(' in q['sql'] for q in deep.captured_queries))
+
+# ================================================================= #
+# 9. FULL-TEXT SEARCH TESTS
+# ================================================================= #
+class SearchTests(TestCase):
+    """
+    Tests the search index behind the claim list's `q` filter: prefix matches
+    over claim, detail and CPT fields, ranking, and keeping it in sync.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='searcher', password='password123')
+        self.client.login(username='searcher', password='password123')
+        process_claim_data([
+            {"id": 70001, "patient_name": "Jordan Baker", "billed_amount": "10.00", "paid_amount": "0.00", "status": "Denied", "insurer_name": "Acme Health", "discharge_date": "2025-01-01"},
+            {"id": 70002, "patient_name": "Casey Acme", "billed_amount": "10.00", "paid_amount": "0.00", "status": "Paid", "insurer_name": "Blue Shield", "discharge_date": "2025-01-02"},
+            {"id": 70003, "patient_name": "Riley Stone", "billed_amount": "10.00", "paid_amount": "0.00", "status": "Under Review", "insurer_name": "Blue Shield", "discharge_date": "2025-01-03"},
+        ], [
+            {"id": 1, "claim_id": 70001, "denial_reason": "Missing prior authorization", "cpt_codes": "99213,99214"},
+            {"id": 2, "claim_id": 70003, "denial_reason": "", "cpt_codes": "71045"},
+        ], 'append')
+
+    def _search(self, q):
+        response = self.client.get(reverse('claims:claim-list'), {'q': q}, HTTP_HX_REQUEST='true')
+        return sorted(claim.claim_id for claim in response.context['page_obj'])
+
+    def test_prefix_search_covers_claim_detail_and_cpt_fields(self):
+        """FUNCTIONALITY: Verifies prefix matches on names, insurer, status, denial reason and CPT codes, and reindexing on save."""
+        self.assertEqual(self._search('jord'), [70001])
+        self.assertEqual(self._search('blue shi'), [70002, 70003])
+        self.assertEqual(self._search('prior auth'), [70001])
+        self.assertEqual(self._search('7104'), [70003])
+        self.assertEqual(self._search('under rev'), [70003])
+
+        claim = Claim.objects.get(claim_id=70003)
+        self.client.post(reverse('claims:change-claim-status', kwargs={'pk': claim.pk}), {'status': Claim.STATUS_APPEALED})
+        self.assertEqual(self._search('appealed'), [70003])
+        self.assertEqual(self._search('under rev'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        """SECURITY: Verifies FTS operators and quotes in user input are treated as plain words."""
+        self.assertEqual(self._search('"acme" OR NEAR(*'), [])
+        self.assertEqual(self._search('acme)'), [70001, 70002])
+        self.assertEqual(self._search('%'), [])
+
+    def test_search_uses_index_and_ranks_matches(self):
+        """PERFORMANCE: Verifies the list filter reads the search index instead of LIKE scans, and ranking favours the patient name."""
+        with CaptureQueriesContext(connection) as queries:
+            self._search('acme')
+        sql = ' '.join(q['sql'] for q in queries.captured_queries)
+        if connection.vendor == 'sqlite':
+            self.assertIn('MATCH', sql)
+            self.assertNotIn('LIKE', sql)
+        else:
+            # The only LIKE is the substring match on the trigram-indexed body, never on the claim columns.
+            self.assertIn('@@', sql)
+            self.assertEqual(sql.count('LIKE'), sql.count('body ILIKE'))
+
+        self.assertEqual([claim.claim_id for claim in search_claims('acme')], [70002, 70001])
+
+    @skipUnless(connection.vendor != 'sqlite' or connection.Database.sqlite_version_info >= (3, 34),
+                'Substring search needs the FTS5 trigram tokenizer.')
+    def test_whole_query_also_matches_inside_words(self):
+        """FUNCTIONALITY: Verifies a query of three or more characters finds text inside words, ranked after prefix matches, and stays in sync."""
+        process_claim_data([
+            {"id": 70004, "patient_name": "Ana Goldsmith", "billed_amount": "10.00", "paid_amount": "0.00", "status": "Paid", "insurer_name": "Acme Health", "discharge_date": "2025-01-04"},
+            {"id": 70005, "patient_name": "Smith Jones", "billed_amount": "10.00", "paid_amount": "0.00", "status": "Paid", "insurer_name": "Acme Health", "discharge_date": "2025-01-05"},
+        ], [], 'append')
+        self.assertEqual(self._search('smith'), [70004, 70005])
+        self.assertEqual([claim.claim_id for claim in search_claims('smith')], [70005, 70004])
+        self.assertEqual(self._search('ldsmi'), [70004])
+        self.assertEqual(self._search('horizati'), [70001])
+        # Shorter queries only match as prefixes.
+        self.assertEqual(self._search('th'), [])
+
+        claim = Claim.objects.get(claim_id=70004)
+        claim.patient_name = 'Ana Gold'
+        claim.save()
+        self.assertEqual(self._search('smith'), [70005])
+        process_claim_data([], [], 'overwrite')
+        self.assertEqual(self._search('smith'), [])
+
+# ================================================================= #
+# 10. QUERY BUDGET TESTS
+# ================================================================= #
+class QueryBudgetTests(TestCase):
+    """
+    Pins the number of queries the claim list and claim detail views run, so
+    per-row prefetches and N+1 lookups can't creep back in.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='budget', password='password123')
+        self.client.login(username='budget', password='password123')
+        authors = [self.user] + [User.objects.create_user(username=f'author{i}', password='x') for i in range(3)]
+        for i in range(8):
+            claim = Claim.objects.create(claim_id=80000 + i, patient_name=f'Budget {i}', billed_amount=100, paid_amount=0,
+                                         status='Denied', insurer_name='InsureCo', discharge_date='2025-01-01')
+            ClaimDetail.objects.create(claim=claim, cpt_codes='99213,99214', denial_reason=intern_denial_reason('Not covered'))
+            for author in authors:
+                Note.objects.create(claim=claim, user=author, text='note', is_public=True)
+                ClaimHistory.objects.create(claim=claim, user=author, old_status='Paid', new_status='Denied')
+        Flag.objects.create(claim=claim, user=self.user)
+        self.claim = claim
+
+    def test_claim_list_query_budget(self):
+        """PERFORMANCE: Verifies a list page is session + version check + one claims query (the user is cached), with no note or history fetches."""
+        self.client.get(reverse('claims:claim-list'), HTTP_HX_REQUEST='true')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('claims:claim-list'), HTTP_HX_REQUEST='true')
+        self.assertEqual(len(queries.captured_queries), 3)
+        sql = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertNotIn('claims_note', sql)
+        self.assertNotIn('claims_claimhistory', sql)
+        self.assertTrue(next(c for c in response.context['page_obj'] if c.pk == self.claim.pk).is_flagged_by_user)
+
+        # A filter adds only the capped count.
+        with self.assertNumQueries(4):
+            self.client.get(reverse('claims:claim-list'), {'insurer_name': 'Insure'}, HTTP_HX_REQUEST='true')
+
+    def test_claim_detail_query_budget(self):
+        """PERFORMANCE: Verifies the detail view's query count does not grow with notes or history, and drops once its cards are cached."""
+        # Session, user, version check, claim with details and flag, visible notes with authors, history with users.
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('claims:claim-detail', kwargs={'pk': self.claim.pk}))
+        self.assertContains(response, 'author2')
+        # The cached claim cards skip the history query, and the auth backend now has the user.
+        with self.assertNumQueries(4):
+            self.client.get(reverse('claims:claim-detail', kwargs={'pk': self.claim.pk}))
+
+    def test_list_counts_are_annotated_in_one_query(self):
+        """FUNCTIONALITY: Verifies the optional notes count and last status change come from the same query."""
+        with self.assertNumQueries(1):
+            claim = Claim.objects.for_list(self.user, with_counts=True).get(pk=self.claim.pk)
+        self.assertEqual(claim.notes_count, 4)
+        self.assertEqual(claim.last_status_change, ClaimHistory.objects.filter(claim=self.claim).latest('timestamp').timestamp)
+        self.assertTrue(claim.is_flagged_by_user)
+
+# ================================================================= #
+# 11. CLAIM DETAIL FRAGMENT CACHE TESTS
+# ================================================================= #
+class ClaimDetailCacheTests(TestCase):
+    """
+    Tests that the claim detail panel is rendered in one pass, that the shared
+    cards are cached per claim and dropped on change, and that per-user cards never are.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user_a = User.objects.create_user(username='card_a', password='password123')
+        self.user_b = User.objects.create_user(username='card_b', password='password123')
+        self.client_b = Client()
+        self.client_b.login(username='card_b', password='password123')
+        self.client.login(username='card_a', password='password123')
+        self.claim = Claim.objects.create(claim_id=90001, patient_name='Card Patient', billed_amount=300, paid_amount=100,
+                                          status='Denied', insurer_name='InsureCo', discharge_date='2025-01-01')
+        ClaimDetail.objects.create(claim=self.claim, cpt_codes='99213', denial_reason=intern_denial_reason('Old reason'))
+        self.url = reverse('claims:claim-detail', kwargs={'pk': self.claim.pk})
+
+    def test_single_render_contains_every_card(self):
+        """FUNCTIONALITY: Verifies one template render produces the details card and all six out-of-band cards."""
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, 'claims/partials/_claim_detail_response.html')
+        self.assertContains(response, 'Claim Details - 90001')
+        for card in ('change-status-card', 'analyse-agent-card', 'status-history-card', 'notes-card', 'actions-card', 'placeholder-idea-card'):
+            self.assertContains(response, f'id="{card}" hx-swap-oob="innerHTML"', count=1)
+
+    def test_cached_cards_are_invalidated_by_changes(self):
+        """EDGE CASE: Verifies status changes and detail edits show up immediately despite the cached cards."""
+        self.client.get(self.url)
+        self.client.post(reverse('claims:change-claim-status', kwargs={'pk': self.claim.pk}), {'status': 'Appealed', 'comment': 'Sent appeal'})
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Sent appeal')
+        self.assertContains(response, '>Appealed<')
+
+        process_claim_data([], [{"id": 1, "claim_id": 90001, "denial_reason": "New reason", "cpt_codes": "99215"}], 'append')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'New reason')
+        self.assertNotContains(response, 'Old reason')
+
+    def test_user_specific_cards_are_not_shared(self):
+        """SECURITY: Verifies one user's private notes and flag never leak to another through the cache."""
+        Note.objects.create(claim=self.claim, user=self.user_a, text='A private thought', is_public=False)
+        Flag.objects.create(claim=self.claim, user=self.user_a)
+        self.assertContains(self.client.get(self.url), 'A private thought')
+        self.assertContains(self.client.get(self.url), 'Unflag Claim')
+
+        response = self.client_b.get(self.url)
+        self.assertNotContains(response, 'A private thought')
+        self.assertNotContains(response, 'Unflag Claim')
+        self.assertContains(response, 'Flag for Review')
+
+# ================================================================= #
+# 12. REQUEST METRICS TESTS
+# ================================================================= #
+class RequestMetricsTests(TestCase):
+    """
+    Tests the performance middleware's Server-Timing header and the
+    Prometheus metrics endpoint.
+    """
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.user = User.objects.create_user(username='observer', password='password123')
+        self.client.login(username='observer', password='password123')
+        self.claim = Claim.objects.create(claim_id=95001, patient_name='Metric Patient', billed_amount=10, paid_amount=0,
+                                          status='Denied', insurer_name='InsureCo', discharge_date='2025-01-01')
+
+    def test_server_timing_header_reports_request_costs(self):
+        """FUNCTIONALITY: Verifies the header carries DB time, query and duplicate counts, template and total time."""
+        self.user.is_staff = True
+        self.user.save()
+        url = reverse('claims:claim-detail', kwargs={'pk': self.claim.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries, \d+ duplicate", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertIn(f'"{len(queries.captured_queries)} queries, 0 duplicate"', timing)
+
+    def test_server_timing_header_is_only_sent_to_staff(self):
+        """SECURITY: Verifies regular and anonymous users never see query counts or timings."""
+        response = self.client.get(reverse('claims:claim-detail', kwargs={'pk': self.claim.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('Server-Timing', Client().get(reverse('claims:login')))
+
+    def test_metrics_endpoint_exposes_histograms_per_url_name(self):
+        """FUNCTIONALITY: Verifies requests are aggregated into per-view Prometheus histograms and counters."""
+        self.client.get(reverse('claims:claim-list'))
+        self.client.get(reverse('claims:claim-list'))
+        self.user.is_staff = True
+        self.user.save()
+
+        response = self.client.get(reverse('claims:metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('# TYPE claims_http_request_duration_seconds histogram', body)
+        self.assertIn('claims_http_request_duration_seconds_count{view="claims:claim-list"} 2', body)
+        self.assertIn('claims_http_request_duration_seconds_bucket{view="claims:claim-list",le="+Inf"} 2', body)
+        self.assertIn('claims_http_request_queries_count{view="claims:claim-list"} 2', body)
+        self.assertIn('claims_http_responses_total{view="claims:claim-list",method="GET",status="2xx"} 2', body)
+        self.assertIn('claims_http_response_bytes_total{view="claims:claim-list"}', body)
+
+    @override_settings(CLAIMS_METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint_requires_staff_or_token(self):
+        """SECURITY: Verifies non-staff users and wrong tokens are refused, and the scraper token works without a session."""
+        self.assertEqual(self.client.get(reverse('claims:metrics')).status_code, 403)
+        anonymous = Client()
+        self.assertEqual(anonymous.get(reverse('claims:metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(anonymous.get(reverse('claims:metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+
+
+# ================================================================= #
+# 13. QUERY DIAGNOSTICS TESTS
+# ================================================================= #
+class QueryDiagnosticsTests(TestCase):
+    """
+    Tests SQL fingerprinting, N+1 detection, the slow-query log and the
+    command that summarizes it.
+    """
+    def setUp(self):
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        self.log_path = os.path.join(log_dir.name, 'slow.log')
+        settings_override = override_settings(
+            CLAIMS_SLOW_QUERY_LOG=self.log_path, CLAIMS_N_PLUS_ONE_THRESHOLD=10, CLAIMS_QUERY_DIAGNOSTICS=True,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='diagnoser', password='password123')
+        self.client.login(username='diagnoser', password='password123')
+        self.claims = [
+            Claim.objects.create(claim_id=96000 + i, patient_name=f'Diag {i}', billed_amount=10, paid_amount=0,
+                                 status='Denied', insurer_name='InsureCo', discharge_date='2025-01-01')
+            for i in range(12)
+        ]
+
+    def _entries(self):
+        with open(process_log_path(self.log_path), encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_fingerprint_strips_literals_and_collapses_lists(self):
+        """FUNCTIONALITY: Verifies statements differing only in values, IN-list length or batch size share a fingerprint."""
+        self.assertEqual(
+            fingerprint('SELECT "claims_claim"."id" FROM "claims_claim"\n WHERE "claims_claim"."claim_id" = %s LIMIT 21'),
+            'SELECT "claims_claim"."id" FROM "claims_claim" WHERE "claims_claim"."claim_id" = ? LIMIT ?',
+        )
+        self.assertEqual(
+            fingerprint("SELECT * FROM t1 WHERE name = 'O''Brien' AND id IN (%s, %s, %s)"),
+            fingerprint("SELECT * FROM t1 WHERE name = 'Smith' AND id IN (%s)"),
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'),
+            fingerprint('INSERT INTO t (a, b) VALUES (%s, %s)'),
+        )
+
+    def test_per_row_lookups_are_reported_with_their_call_site(self):
+        """PERFORMANCE: Verifies a per-row get in a loop is logged as a probable N+1 pointing at the loop, and summarized."""
+        with diagnose_queries('per-row-loop') as diagnostics:
+            for claim in self.claims:
+                Claim.objects.get(claim_id=claim.claim_id)
+
+        [(key, executions, _, _)] = diagnostics.n_plus_one()
+        self.assertEqual(executions, 12)
+        [entry] = [e for e in self._entries() if e['kind'] == 'n_plus_one']
+        self.assertEqual(entry['view'], 'per-row-loop')
+        self.assertEqual(entry['fingerprint'], key)
+        self.assertIn('tests.py', entry['call_site'])
+        self.assertIn('Claim.objects.get(claim_id=claim.claim_id)', entry['call_site'])
+        self.assertNotIn('site-packages', entry['call_site'])
+
+        out = StringIO()
+        call_command('summarize_slow_queries', log=self.log_path, stdout=out)
+        self.assertIn('per-row-loop: 12 executions in 1 request(s)', out.getvalue())
+
+    @override_settings(CLAIMS_SLOW_QUERY_MS=0)
+    def test_requests_log_slow_queries_and_detail_has_no_n_plus_one(self):
+        """PERFORMANCE: Verifies queries over the threshold are logged per view and the detail view with many notes has no N+1."""
+        claim = self.claims[0]
+        for i in range(15):
+            author = User.objects.create_user(username=f'note_author_{i}')
+            Note.objects.create(claim=claim, user=author, text=f'Note {i}', is_public=True)
+
+        response = self.client.get(reverse('claims:claim-detail', kwargs={'pk': claim.pk}))
+        self.assertEqual(response.status_code, 200)
+
+        entries = [e for e in self._entries() if e['view'] == 'claims:claim-detail']
+        self.assertTrue(entries)
+        self.assertEqual({e['kind'] for e in entries}, {'slow'})
+
+        out = StringIO()
+        call_command('summarize_slow_queries', log=self.log_path, stdout=out)
+        self.assertIn('Top slow query fingerprints by total time', out.getvalue())
+        self.assertIn('claims:claim-detail', out.getvalue())
+
+
+    @override_settings(CLAIMS_SLOW_QUERY_MS=0, CLAIMS_QUERY_DIAGNOSTICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_diagnosed(self):
+        """PERFORMANCE: Verifies requests outside the sample skip fingerprinting and write nothing to the log."""
+        response = self.client.get(reverse('claims:claim-detail', kwargs={'pk': self.claims[0].pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(process_log_path(self.log_path)))
+
+    def test_each_process_logs_to_its_own_file_and_all_are_summarized(self):
+        """EDGE CASE: Verifies the log is written per process (no shared rotation) and the summary reads every process's files."""
+        with diagnose_queries('this-process'):
+            for claim in self.claims:
+                Claim.objects.get(claim_id=claim.claim_id)
+        self.assertFalse(os.path.exists(self.log_path))
+        self.assertEqual(self._entries()[0]['view'], 'this-process')
+
+        entry = {'kind': 'n_plus_one', 'fingerprint': 'SELECT ?', 'executions': 11, 'duration_ms': 1.0, 'call_site': ''}
+        for name, view in ((process_log_path(self.log_path, pid=1), 'other-worker'),
+                           (process_log_path(self.log_path, pid=1) + '.1', 'other-worker-rotated')):
+            with open(name, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({**entry, 'view': view}) + '\n')
+
+        out = StringIO()
+        call_command('summarize_slow_queries', log=self.log_path, stdout=out)
+        for view in ('this-process: 12 executions', 'other-worker: 11 executions', 'other-worker-rotated: 11 executions'):
+            self.assertIn(view, out.getvalue())
+
+# ================================================================= #
+# 14. CLAIM EXPORT TESTS
+# ================================================================= #
+class ClaimExportTests(TestCase):
+    """
+    Tests the streaming export of filtered claim sets.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='analyst', password='password123')
+        self.client.login(username='analyst', password='password123')
+        # Three claims share a discharge date so batches have to break ties on id.
+        for i, discharge_date in enumerate(['2025-03-01', '2025-02-01', '2025-02-01', '2025-02-01', '2025-01-01']):
+            claim = Claim.objects.create(claim_id=97000 + i, patient_name=f'Export {i}', billed_amount=100 + i, paid_amount=0,
+                                         status='Denied' if i % 2 else 'Paid', insurer_name='InsureCo', discharge_date=discharge_date)
+            ClaimDetail.objects.create(claim=claim, cpt_codes='99213,99214', denial_reason=intern_denial_reason('No auth, "prior"' if i % 2 else ''))
+
+    def _content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_applies_the_list_filters(self):
+        """FUNCTIONALITY: Verifies the CSV export streams only the claims the list filters match, details included."""
+        response = self.client.get(reverse('claims:export-claims'), {'status': 'denied', 'insurer_name': 'insure'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="claims-', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(self._content(response))))
+        self.assertEqual(rows[0], ['id', 'patient_name', 'billed_amount', 'paid_amount', 'status', 'insurer_name',
+                                   'discharge_date', 'denial_reason', 'cpt_codes'])
+        self.assertEqual(rows[1:], [
+            ['97003', 'Export 3', '103.00', '0.00', 'Denied', 'InsureCo', '2025-02-01', 'No auth, "prior"', '99213,99214'],
+            ['97001', 'Export 1', '101.00', '0.00', 'Denied', 'InsureCo', '2025-02-01', 'No auth, "prior"', '99213,99214'],
+        ])
+
+    @override_settings(CLAIMS_EXPORT_BATCH_SIZE=2)
+    def test_jsonl_export_reads_in_bounded_keyset_batches(self):
+        """PERFORMANCE: Verifies every claim is exported once, in list order, by queries of at most the batch size."""
+        response = self.client.get(reverse('claims:export-claims'), {'format': 'jsonl'})
+        self.assertEqual(response['Content-Type'], 'application/jsonl')
+        with CaptureQueriesContext(connection) as queries:
+            lines = self._content(response).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [97000, 97003, 97002, 97001, 97004])
+        self.assertEqual(json.loads(lines[0])['billed_amount'], '100.00')
+        self.assertEqual(json.loads(lines[0])['denial_reason'], '')
+
+        claim_queries = [q['sql'] for q in queries.captured_queries if 'claims_claim' in q['sql']]
+        self.assertEqual(len(claim_queries), 3)
+        self.assertTrue(all('LIMIT 2' in sql for sql in claim_queries))
+
+    def test_export_requires_login_and_a_known_format(self):
+        """SECURITY: Verifies anonymous users are redirected and unsupported formats are refused."""
+        self.assertEqual(self.client.get(reverse('claims:export-claims'), {'format': 'xlsx'}).status_code, 404)
+        response = Client().get(reverse('claims:export-claims'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('claims:login'), response.url)
+
+
+# ================================================================= #
+# 15. DELTA LOAD TESTS
+# ================================================================= #
+class DeltaLoadTests(TestCase):
+    """
+    Tests the content-hash based 'delta' load mode.
+    """
+    def setUp(self):
+        self.claims = [
+            {"id": 1, "patient_name": "A", "billed_amount": "500.00", "paid_amount": "100.00", "status": "Denied", "insurer_name": "X", "discharge_date": "2025-01-01"},
+            {"id": 2, "patient_name": "B", "billed_amount": "300.00", "paid_amount": "300.00", "status": "Paid", "insurer_name": "Y", "discharge_date": "2025-01-02"},
+            {"id": 3, "patient_name": "C", "billed_amount": "200.00", "paid_amount": "50.00", "status": "Under Review", "insurer_name": "Z", "discharge_date": "2025-01-03"},
+        ]
+        self.details = [
+            {"id": 1, "claim_id": 1, "denial_reason": "Not covered", "cpt_codes": "99213"},
+            {"id": 2, "claim_id": 3, "denial_reason": "Late filing", "cpt_codes": "99214"},
+        ]
+        process_claim_data(self.claims, self.details, 'append')
+        self.user = User.objects.create_user(username='deltauser', password='password123')
+
+    def test_unchanged_file_writes_nothing(self):
+        """PERFORMANCE: Verifies re-loading an identical file (amounts formatted differently) skips every row without writing."""
+        reformatted = [dict(row, billed_amount=str(float(row['billed_amount']))) for row in self.claims]
+        with CaptureQueriesContext(connection) as queries:
+            loader = load_claim_data(reformatted, self.details, 'delta')
+        self.assertEqual(loader.delta_stats, {
+            'claims': {'new': 0, 'changed': 0, 'unchanged': 3, 'removed': 0},
+            'details': {'new': 0, 'changed': 0, 'unchanged': 2, 'removed': 0},
+        })
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+    def test_delta_writes_changed_fields_and_removes_missing_claims(self):
+        """FUNCTIONALITY: Verifies new, changed and removed rows are counted, only changed columns are written, and kept claims keep their notes."""
+        Note.objects.create(claim=Claim.objects.get(claim_id=2), user=self.user, text='Keep me')
+        claims = [
+            dict(self.claims[0], status='Appealed'),
+            self.claims[1],
+            {"id": 4, "patient_name": "D", "billed_amount": "80.00", "paid_amount": "0.00", "status": "Denied", "insurer_name": "X", "discharge_date": "2025-01-04"},
+        ]
+        details = [self.details[0], {"id": 3, "claim_id": 4, "denial_reason": "Not covered", "cpt_codes": "99215"}]
+
+        with CaptureQueriesContext(connection) as queries:
+            loader = load_claim_data(claims, details, 'delta')
+        self.assertEqual(loader.delta_stats, {
+            'claims': {'new': 1, 'changed': 1, 'unchanged': 1, 'removed': 1},
+            'details': {'new': 1, 'changed': 0, 'unchanged': 1, 'removed': 0},
+        })
+        [claim_update] = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "claims_claim"')]
+        self.assertIn('"status"', claim_update)
+        self.assertNotIn('"patient_name"', claim_update)
+
+        self.assertEqual(Claim.objects.get(claim_id=1).status, 'Appealed')
+        self.assertFalse(Claim.objects.filter(claim_id=3).exists())
+        self.assertEqual(Note.objects.filter(claim__claim_id=2).count(), 1)
+
+        summary = get_dashboard_summary()
+        cache.clear()
+        rebuild_summary()
+        self.assertEqual(summary, get_dashboard_summary())
+
+    def test_invalid_rows_prevent_removal(self):
+        """EDGE CASE: Verifies a delta file with an invalid row never removes claims it may have meant to keep."""
+        claims = [self.claims[0], dict(self.claims[1], status='Not a status')]
+        loader = load_claim_data(claims, [], 'delta')
+        self.assertEqual(loader.claims_removed, 0)
+        self.assertEqual(Claim.objects.count(), 3)
+        self.assertEqual(ClaimDetail.objects.count(), 2)
+
+
+# ================================================================= #
+# 16. STAGED OVERWRITE TESTS
+# ================================================================= #
+class StagedOverwriteTests(TestCase):
+    """
+    Tests that 'overwrite' loads stage rows and merge them in one step,
+    keeping collaboration data on surviving claims.
+    """
+    def setUp(self):
+        self.claims = [
+            {"id": i, "patient_name": f"P{i}", "billed_amount": "100.00", "paid_amount": "10.00", "status": "Denied",
+             "insurer_name": "X", "discharge_date": "2025-01-01"}
+            for i in range(1, 4)
+        ]
+        self.details = [{"id": i, "claim_id": i, "denial_reason": "Not covered", "cpt_codes": "99213"} for i in range(1, 4)]
+        process_claim_data(self.claims, self.details, 'append')
+        self.user = User.objects.create_user(username='overwriter', password='password123')
+        self.kept = Claim.objects.get(claim_id=1)
+        Note.objects.create(claim=self.kept, user=self.user, text='Still here')
+        Flag.objects.create(claim=self.kept, user=self.user)
+        ClaimHistory.objects.create(claim=self.kept, user=self.user, old_status='Under Review', new_status='Denied')
+
+    def test_overwrite_keeps_collaboration_data_on_surviving_claims(self):
+        """FUNCTIONALITY: Verifies surviving claims keep their pk, notes, flags and history while others are updated, added or removed."""
+        claims = [dict(self.claims[0], status='Paid', paid_amount='100.00'), self.claims[1],
+                  dict(self.claims[2], id=4, patient_name='P4')]
+        details = [self.details[0], dict(self.details[2], claim_id=4)]
+        # The search index and staging rows are finished once the merge commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            loader = load_claim_data(claims, details, 'overwrite')
+
+        self.assertEqual(loader.delta_stats, {
+            'claims': {'new': 1, 'changed': 1, 'unchanged': 1, 'removed': 1},
+            'details': {'new': 1, 'changed': 0, 'unchanged': 1, 'removed': 1},
+        })
+        kept = Claim.objects.get(claim_id=1)
+        self.assertEqual((kept.pk, kept.status), (self.kept.pk, 'Paid'))
+        self.assertEqual((kept.notes.count(), kept.flags.count(), kept.history.count()), (1, 1, 1))
+        self.assertEqual(sorted(Claim.objects.values_list('claim_id', flat=True)), [1, 2, 4])
+        self.assertFalse(ClaimDetail.objects.filter(claim__claim_id=2).exists())
+        self.assertEqual(get_dashboard_summary()['status_counts'], {'Paid': 1, 'Denied': 2})
+        self.assertEqual([c.claim_id for c in search_claims('P4')], [4])
+        self.assertFalse(ClaimStaging.objects.exists() or ClaimDetailStaging.objects.exists())
+
+    def test_failed_overwrite_leaves_live_data_untouched(self):
+        """EDGE CASE: Verifies a load that fails part-way changes nothing and leaves no staging rows."""
+        claims = [dict(self.claims[0], patient_name='Changed'), {"id": 9}]
+        with self.assertRaises(KeyError):
+            process_claim_data(claims, self.details, 'overwrite', batch_size=1)
+        self.assertEqual(Claim.objects.count(), 3)
+        self.assertEqual(Claim.objects.get(claim_id=1).patient_name, 'P1')
+        self.assertEqual(self.kept.notes.count(), 1)
+        self.assertFalse(ClaimStaging.objects.exists())
+
+    def test_live_tables_only_change_in_the_final_merge(self):
+        """PERFORMANCE: Verifies readers see the old data while rows are staged, and the merge uses a fixed number of statements."""
+        observed = []
+        claims = [dict(row, patient_name='New ' + row['patient_name']) for row in self.claims]
+        claims += [dict(self.claims[0], id=100 + i) for i in range(40)]
+
+        def progress(rows):
+            observed.append((Claim.objects.count(), Claim.objects.filter(patient_name__startswith='New').count()))
+
+        with CaptureQueriesContext(connection) as queries:
+            load_claim_data(claims, self.details, 'overwrite', batch_size=5, progress=progress)
+        self.assertEqual(set(observed), {(3, 0)})
+        self.assertEqual(Claim.objects.count(), 43)
+
+        live_writes = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith(('INSERT INTO "claims_claim" ', 'UPDATE "claims_claim" ', 'DELETE FROM "claims_claim" '))
+        ]
+        # One update and one INSERT ... SELECT, however many rows and batches were loaded.
+        self.assertEqual(len(live_writes), 2)
+
+
+    def test_search_index_is_refreshed_after_the_merge_commits(self):
+        """PERFORMANCE: Verifies the merge transaction writes CPT rows set-based and leaves reindexing to after commit."""
+        claims = [dict(row, patient_name='Renamed ' + row['patient_name']) for row in self.claims]
+        details = [dict(row, cpt_codes='99214, 99215') for row in self.details]
+        details.append(dict(details[0], cpt_codes='90834'))  # A repeated claim replaces the codes staged for it.
+
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+            load_claim_data(claims, details, 'overwrite', batch_size=2)
+
+        self.assertEqual(sorted(ClaimCptCode.objects.values_list('claim__claim_id', 'code')),
+                         [(1, '90834'), (2, '99214'), (2, '99215'), (3, '99214'), (3, '99215')])
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO claims_claimsearch')])
+        self.assertEqual(search_claims('Renamed'), [])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(sorted(c.claim_id for c in search_claims('Renamed')), [1, 2, 3])
+        self.assertFalse(ClaimStaging.objects.exists() or ClaimCptCodeStaging.objects.exists())
+
+    def test_merge_adjusts_the_summary_by_the_changed_rows(self):
+        """PERFORMANCE: Verifies the merge moves only the changed claims' totals and ends equal to a full recompute."""
+        process_claim_data([dict(self.claims[0], id=5, status='Paid', discharge_date='2025-02-01')],
+                           [dict(self.details[0], claim_id=5, denial_reason='')], 'append')
+        cache.clear()
+        get_dashboard_summary()
+        claims = [
+            dict(self.claims[0], status='Paid', paid_amount='100.00'),  # Status and amount change.
+            dict(self.claims[1], discharge_date='2025-03-01'),  # Moves to another aging date.
+            dict(self.claims[2], id=6, patient_name='P6'),  # New; claims 3 and 5 are removed.
+        ]
+        details = [dict(self.details[0], denial_reason='Late filing'), self.details[1], dict(self.details[2], claim_id=6)]
+
+        with CaptureQueriesContext(connection) as queries:
+            load_claim_data(claims, details, 'overwrite')
+        self.assertFalse([q for q in queries.captured_queries
+                          if q['sql'].startswith('DELETE FROM "claims_claimstatussummary"')])
+
+        summary = get_dashboard_summary()
+        self.assertEqual(summary['status_counts'], {'Paid': 1, 'Denied': 2})
+        self.assertEqual(
+            {r['denial_reason']: r['count'] for r in summary['top_denial_reasons']},
+            {'Not covered': 2, 'Late filing': 1},
+        )
+        incremental = (
+            sorted(ClaimStatusSummary.objects.filter(claim_count__gt=0).values_list('status', 'claim_count', 'underpayment_total')),
+            sorted(ClaimAgingSummary.objects.filter(claim_count__gt=0).values_list('status', 'discharge_date', 'claim_count', 'underpayment_total')),
+            sorted(DenialReason.objects.values_list('text', 'claim_count')),
+        )
+        rebuild_summary()
+        self.assertEqual(incremental, (
+            sorted(ClaimStatusSummary.objects.filter(claim_count__gt=0).values_list('status', 'claim_count', 'underpayment_total')),
+            sorted(ClaimAgingSummary.objects.filter(claim_count__gt=0).values_list('status', 'discharge_date', 'claim_count', 'underpayment_total')),
+            sorted(DenialReason.objects.values_list('text', 'claim_count')),
+        ))
+
+    @override_settings(CLAIMS_STAGING_MAX_AGE_SECONDS=3600)
+    def test_staging_rows_of_killed_loads_are_purged(self):
+        """EDGE CASE: Verifies a new overwrite load drops staging rows that loads stopped writing long ago."""
+        killed, running = new_load_token(), new_load_token()
+        stage_claims(killed, [dict(clean_claim_row(self.claims[0]), content_hash='x')])
+        stage_details(killed, [dict(clean_detail_row(self.details[0]), content_hash='x')])
+        stage_claims(running, [dict(clean_claim_row(self.claims[0]), content_hash='x')])
+        stage_details(running, [dict(clean_detail_row(self.details[0]), content_hash='x')])
+        long_ago = timezone.now() - timedelta(hours=2)
+        for model in (ClaimStaging, ClaimDetailStaging, ClaimCptCodeStaging):
+            model.objects.filter(load_token=killed).update(staged_at=long_ago)
+        # A load still staging its details is kept, however old its claim rows are.
+        ClaimStaging.objects.filter(load_token=running).update(staged_at=long_ago)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            load_claim_data(self.claims, self.details, 'overwrite')
+
+        for model in (ClaimStaging, ClaimDetailStaging, ClaimCptCodeStaging):
+            self.assertEqual(set(model.objects.values_list('load_token', flat=True)), {running})
+
+# ================================================================= #
+# 17. CPT CODE TESTS
+# ================================================================= #
+class CptCodeTests(TestCase):
+    """
+    Tests that CPT codes are kept as indexed per-code rows through every
+    load path, and that the list filter and dashboard read them.
+    """
+    def setUp(self):
+        self.claims = [
+            {"id": i, "patient_name": f"P{i}", "billed_amount": "100.00", "paid_amount": "0.00",
+             "status": "Denied", "insurer_name": "Acme", "discharge_date": "2025-01-01"}
+            for i in range(1, 4)
+        ]
+        self.details = [
+            {"id": 1, "claim_id": 1, "denial_reason": "", "cpt_codes": "99204, 82947,99204"},
+            {"id": 2, "claim_id": 2, "denial_reason": "", "cpt_codes": "99204"},
+            {"id": 3, "claim_id": 3, "denial_reason": "", "cpt_codes": "90834"},
+        ]
+        process_claim_data(self.claims, self.details, 'append')
+        self.user = User.objects.create_user(username='coder', password='password123')
+        self.client.login(username='coder', password='password123')
+        cache.clear()
+
+    def codes(self):
+        return sorted(ClaimCptCode.objects.values_list('claim__claim_id', 'code'))
+
+    def test_codes_follow_every_load_path(self):
+        """FUNCTIONALITY: Verifies code rows are split, de-duplicated and rewritten by append, delta and overwrite loads."""
+        self.assertEqual(self.codes(), [(1, '82947'), (1, '99204'), (2, '99204'), (3, '90834')])
+
+        process_claim_data(self.claims, [dict(self.details[0], cpt_codes='99213')], 'append')
+        self.assertEqual(self.codes(), [(1, '99213'), (2, '99204'), (3, '90834')])
+
+        load_claim_data(self.claims, [dict(self.details[1], cpt_codes='99214'), self.details[2]], 'delta')
+        self.assertEqual(self.codes(), [(2, '99214'), (3, '90834')])
+
+        load_claim_data(self.claims[:2], [self.details[0]], 'overwrite')
+        self.assertEqual(self.codes(), [(1, '82947'), (1, '99204')])
+
+        detail = ClaimDetail.objects.get(claim__claim_id=1)
+        detail.cpt_codes = '11111'
+        detail.save()
+        self.assertEqual(self.codes(), [(1, '11111')])
+
+    def test_codes_too_long_to_index_are_skipped_not_truncated(self):
+        """EDGE CASE: Verifies over-long codes are logged and left unindexed on every load path instead of being cut and merged."""
+        long_codes = 'ABCDEFGHIJKLMNOP-1, ABCDEFGHIJKLMNOP-2, 99213'
+        for mode in ('append', 'overwrite'):
+            with self.subTest(mode=mode), self.assertLogs('claims.cpt', 'WARNING') as logs, \
+                    self.captureOnCommitCallbacks(execute=True):
+                load_claim_data(self.claims, [dict(self.details[0], cpt_codes=long_codes)] + self.details[1:], mode)
+            self.assertIn('Skipped 2 CPT code(s) longer than 16 characters', logs.output[0])
+            self.assertEqual(self.codes(), [(1, '99213'), (2, '99204'), (3, '90834')])
+
+        # The detail keeps the full codes and the card shows them.
+        claim = Claim.objects.get(claim_id=1)
+        self.assertEqual(claim.details.cpt_codes, long_codes)
+        response = self.client.get(reverse('claims:claim-detail', kwargs={'pk': claim.pk}))
+        self.assertContains(response, 'ABCDEFGHIJKLMNOP-2')
+
+    def test_list_filter_and_dashboard_use_code_rows(self):
+        """FUNCTIONALITY: Verifies the cpt_code filter matches whole codes and the dashboard counts claims per code."""
+        response = self.client.get(reverse('claims:claim-list'), {'cpt_code': ' 99204 '})
+        self.assertEqual(sorted(c.claim_id for c in response.context['page_obj']), [1, 2])
+        response = self.client.get(reverse('claims:claim-list'), {'cpt_code': '9920'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+        self.assertEqual(get_dashboard_summary()['top_cpt_codes'][:2], [
+            {'code': '99204', 'count': 2}, {'code': '82947', 'count': 1},
+        ])
+        response = self.client.get(reverse('claims:dashboard'))
+        self.assertContains(response, '?cpt_code=99204')
+
+    def test_loads_changing_only_codes_refresh_the_cached_dashboard(self):
+        """EDGE CASE: Verifies a load that changes nothing but CPT codes still drops the cached top codes."""
+        self.assertEqual(get_dashboard_summary()['top_cpt_codes'][0], {'code': '99204', 'count': 2})
+
+        process_claim_data(self.claims, [dict(self.details[0], cpt_codes='90834')], 'append')
+        self.assertEqual(get_dashboard_summary()['top_cpt_codes'][0], {'code': '90834', 'count': 2})
+
+        load_claim_data(self.claims, [dict(self.details[0], cpt_codes='90834'),
+                                      dict(self.details[1], cpt_codes='90834'), self.details[2]], 'delta')
+        self.assertEqual(get_dashboard_summary()['top_cpt_codes'], [{'code': '90834', 'count': 3}])
+
+    @skipUnless(connection.vendor == 'sqlite', 'Checks SQLite query plans.')
+    def test_code_lookups_use_the_code_index(self):
+        """PERFORMANCE: Verifies filtering and counting by code are served by the (code, claim) index."""
+        qs = Claim.objects.filter(pk__in=ClaimCptCode.objects.filter(code='99204').values('claim'))
+        self.assertIn('COVERING INDEX cpt_code_claim_idx (code=?)', qs.order_by('discharge_date', 'id').explain())
+        counts = ClaimCptCode.objects.order_by().values('code').annotate(count=Count('claim'))
+        self.assertIn('COVERING INDEX cpt_code_claim_idx', counts.explain())
+        self.assertNotIn('TEMP B-TREE', counts.explain())
+
+
+# ================================================================= #
+# 18. DENIAL REASON LOOKUP TESTS
+# ================================================================= #
+class DenialReasonLookupTests(TestCase):
+    """
+    Tests that denial reasons are stored once and referenced by key, with
+    counts and filters working on the key.
+    """
+    def setUp(self):
+        self.claims = [
+            {"id": i, "patient_name": f"P{i}", "billed_amount": "100.00", "paid_amount": "0.00",
+             "status": "Denied", "insurer_name": "Acme", "discharge_date": "2025-01-01"}
+            for i in range(1, 7)
+        ]
+        self.user = User.objects.create_user(username='reasons', password='password123')
+        self.client.login(username='reasons', password='password123')
+        cache.clear()
+
+    def details(self, *reasons):
+        return [{"id": i, "claim_id": i, "denial_reason": reason, "cpt_codes": "99213"}
+                for i, reason in enumerate(reasons, start=1)]
+
+    def test_reasons_are_interned_across_load_modes(self):
+        """FUNCTIONALITY: Verifies each reason text is stored once, counted, filterable and shown, whatever the load mode."""
+        process_claim_data(self.claims, self.details('Not covered', 'Not covered', 'Late filing'), 'append')
+        load_claim_data(self.claims[:4], self.details('Not covered', 'Not covered', 'Late filing', 'Duplicate'), 'overwrite')
+
+        self.assertEqual(sorted(DenialReason.objects.values_list('text', 'claim_count')),
+                         [('Duplicate', 1), ('Late filing', 1), ('Not covered', 2)])
+        self.assertEqual(get_dashboard_summary()['top_denial_reasons'][0], {'denial_reason': 'Not covered', 'count': 2})
+        response = self.client.get(reverse('claims:claim-list'), {'denial_reason': 'Not covered'})
+        self.assertEqual(sorted(c.claim_id for c in response.context['page_obj']), [1, 2])
+        claim = Claim.objects.get(claim_id=4)
+        response = self.client.get(reverse('claims:claim-detail', args=[claim.pk]))
+        self.assertContains(response, 'Duplicate')
+
+    def test_blank_reasons_are_stored_as_no_reason(self):
+        """EDGE CASE: Verifies blank and missing reasons reference nothing and drop out of the counts when a reason is cleared."""
+        process_claim_data(self.claims, self.details('Not covered', '', None), 'append')
+        self.assertEqual(ClaimDetail.objects.filter(denial_reason__isnull=True).count(), 2)
+        process_claim_data(self.claims, self.details(''), 'append')
+        self.assertEqual(DenialReason.objects.get(text='Not covered').claim_count, 0)
+        self.assertEqual(get_dashboard_summary()['top_denial_reasons'], [])
+        rebuild_summary()
+        self.assertEqual(DenialReason.objects.get(text='Not covered').claim_count, 0)
+
+    def test_reason_texts_are_looked_up_once_per_load(self):
+        """PERFORMANCE: Verifies a load resolves each reason text once, not once per chunk, and re-loads write no reasons."""
+        def reason_queries(queries):
+            # Lookups and inserts only; the per-chunk count UPDATEs are the dashboard summary's.
+            return [q['sql'].split(' ', 1)[0] for q in queries.captured_queries
+                    if q['sql'].startswith(('SELECT', 'INSERT'))
+                    and '"claims_denialreason"' in q['sql'].split('(', 1)[0].split('WHERE', 1)[0]]
+
+        details = self.details(*['Not covered', 'Late filing'] * 3)
+        process_claim_data(self.claims, [], 'append')
+        with CaptureQueriesContext(connection) as queries:
+            process_claim_data([], details, 'append', batch_size=2)
+        # The first chunk looks both texts up, creates them and reads their keys; later chunks hit the cache.
+        self.assertEqual(reason_queries(queries), ['SELECT', 'INSERT', 'SELECT'])
+
+        with CaptureQueriesContext(connection) as queries:
+            process_claim_data([], details, 'append', batch_size=2)
+        self.assertEqual(reason_queries(queries), ['SELECT'])
+
+
+# ================================================================= #
+# 19. DATABASE SETTINGS TESTS
+# ================================================================= #
+class DatabaseSettingsTests(TestCase):
+    """
+    Tests the environment-driven database settings and the SQLite tuning
+    applied to every connection.
+    """
+    def settings_for(self, **environment):
+        with mock.patch.dict(os.environ, environment, clear=True):
+            return database_settings(environ.Env(), '/srv/erisa/db.sqlite3')
+
+    def test_database_url_selects_postgres_with_pooling(self):
+        """FUNCTIONALITY: Verifies DATABASE_URL configures PostgreSQL with persistent connections, or a pool when asked."""
+        config = self.settings_for(DATABASE_URL='postgres://erisa:secret@db:5432/erisa', DB_CONN_MAX_AGE='300')
+        self.assertEqual((config['ENGINE'], config['NAME'], config['HOST']), ('django.db.backends.postgresql', 'erisa', 'db'))
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (300, True))
+        self.assertNotIn('pool', config['OPTIONS'])
+
+        config = self.settings_for(DATABASE_URL='postgres://erisa:secret@db:5432/erisa', DB_POOL='True', DB_POOL_MAX_SIZE='20')
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 2, 'max_size': 20, 'timeout': 10})
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+    def test_sqlite_tuning_defaults_and_opt_out(self):
+        """EDGE CASE: Verifies the default SQLite file is tuned, explicit options win, and the tuning can be switched off."""
+        config = self.settings_for()
+        self.assertEqual((config['ENGINE'], config['NAME']), ('django.db.backends.sqlite3', '/srv/erisa/db.sqlite3'))
+        self.assertIn('PRAGMA journal_mode=WAL', config['OPTIONS']['init_command'])
+        self.assertEqual((config['OPTIONS']['timeout'], config['OPTIONS']['transaction_mode']), (20, 'IMMEDIATE'))
+
+        config = self.settings_for(DATABASE_URL='sqlite:////tmp/other.sqlite3?timeout=5')
+        self.assertEqual((config['NAME'], config['OPTIONS']['timeout']), ('/tmp/other.sqlite3', 5))
+
+        self.assertEqual(self.settings_for(DB_SQLITE_TUNED='False')['OPTIONS'], {})
+
+    @skipUnless(connection.vendor == 'sqlite', 'Checks SQLite connection pragmas.')
+    def test_sqlite_connections_are_tuned_on_connect(self):
+        """PERFORMANCE: Verifies every SQLite connection waits for the write lock, takes it up front, and uses the larger caches."""
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('synchronous', 'busy_timeout', 'cache_size', 'temp_store'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'synchronous': 1, 'busy_timeout': 20000, 'cache_size': -64 * 1024, 'temp_store': 2})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+# ================================================================= #
+# 20. ASYNC PARTIAL VIEW TESTS
+# ================================================================= #
+class AsyncPartialViewTests(TestCase):
+    """
+    Tests that the detail, flag and note partials run as async views under
+    ASGI with the same queries, permissions and instrumentation as before,
+    and that the sync claim list is served through the ASGI handler too.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='async_a', password='password123')
+        self.other = User.objects.create_user(username='async_b', password='password123')
+        self.claim = Claim.objects.create(claim_id=95001, patient_name='Async Patient', billed_amount=500, paid_amount=100,
+                                          status='Denied', insurer_name='Async Insurer', discharge_date='2025-02-01')
+        ClaimDetail.objects.create(claim=self.claim, cpt_codes='99213', denial_reason=intern_denial_reason('Not covered'))
+        self.note = Note.objects.create(claim=self.claim, user=self.user, text='Original', is_public=True)
+
+    async def test_partials_are_served_asynchronously(self):
+        """FUNCTIONALITY: Verifies the detail, flag and note endpoints are async views and all work through the ASGI handler."""
+        from asgiref.sync import iscoroutinefunction
+        from . import views
+        for view in (views.claim_detail_view, views.flag_claim_view,
+                     views.add_note_view, views.edit_note_view, views.delete_note_view):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+        # Its search, paging and count are sync ORM code, so the list is an honest sync view.
+        self.assertFalse(iscoroutinefunction(views.claim_list_view))
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('claims:claim-list'), headers={'HX-Request': 'true'})
+        self.assertContains(response, 'Async Patient')
+        response = await self.async_client.get(reverse('claims:claim-detail', kwargs={'pk': self.claim.pk}))
+        self.assertContains(response, 'Original')
+
+        flag_url = reverse('claims:flag-claim', kwargs={'pk': self.claim.pk})
+        await self.async_client.post(flag_url)
+        self.assertTrue(await Flag.objects.filter(user=self.user, claim=self.claim).aexists())
+        await self.async_client.post(flag_url)
+        self.assertFalse(await Flag.objects.filter(user=self.user, claim=self.claim).aexists())
+
+        response = await self.async_client.post(reverse('claims:add-note', kwargs={'pk': self.claim.pk}), {'note_text': 'Async note'})
+        self.assertContains(response, 'Async note')
+        response = await self.async_client.post(reverse('claims:edit-note', kwargs={'pk': self.note.pk}), {'note_text': 'Edited'})
+        self.assertContains(response, 'Edited')
+        self.assertEqual((await Note.objects.aget(pk=self.note.pk)).text, 'Edited')
+
+    async def test_async_views_keep_query_budget_and_metrics(self):
+        """PERFORMANCE: Verifies the async detail view runs the same 6 queries under ASGI and the metrics middleware still sees them."""
+        from asgiref.sync import iscoroutinefunction
+        from .middleware import PerformanceMiddleware
+
+        async def get_response(request):
+            return None
+        self.assertTrue(iscoroutinefunction(PerformanceMiddleware(get_response)))
+
+        # Counted by the middleware's connection wrapper, which also sees the ORM's worker thread.
+        self.user.is_staff = True
+        await self.user.asave()
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('claims:claim-detail', kwargs={'pk': self.claim.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="6 queries, 0 duplicate"', response['Server-Timing'])
+        # The cached claim cards skip the history query and the auth backend the user, as in the sync view.
+        response = await self.async_client.get(reverse('claims:claim-detail', kwargs={'pk': self.claim.pk}))
+        self.assertIn('desc="4 queries, 0 duplicate"', response['Server-Timing'])
+
+    async def test_async_note_endpoints_reject_other_users(self):
+        """SECURITY: Verifies another user cannot edit or delete a note through the async endpoints."""
+        await self.async_client.aforce_login(self.other)
+        response = await self.async_client.post(reverse('claims:edit-note', kwargs={'pk': self.note.pk}), {'note_text': 'Hijacked'})
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.post(reverse('claims:delete-note', kwargs={'pk': self.note.pk}))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual((await Note.objects.aget(pk=self.note.pk)).text, 'Original')
+
+        await self.async_client.alogout()
+        response = await self.async_client.post(reverse('claims:delete-note', kwargs={'pk': self.note.pk}))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(await Note.objects.filter(pk=self.note.pk).aexists())
+
+
+# ================================================================= #
+# 21. CACHED SESSION AND USER TESTS
+# ================================================================= #
+class CachedSessionAndUserTests(TestCase):
+    """
+    Tests that cached sessions and the per-process user cache take the
+    session and user queries off the HTMX partials, and that changes to a
+    user are not served stale.
+    """
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user(username='cached_user', password='password123')
+        self.claim = Claim.objects.create(claim_id=96001, patient_name='Cached Patient', billed_amount=500, paid_amount=100,
+                                          status='Denied', insurer_name='Cached Insurer', discharge_date='2025-03-01')
+        ClaimDetail.objects.create(claim=self.claim, cpt_codes='99213', denial_reason=intern_denial_reason('Not covered'))
+
+    def test_partials_skip_session_and_user_queries(self):
+        """PERFORMANCE: Verifies that with cached_db or signed-cookie sessions a warm HTMX partial runs only its own queries."""
+        detail_url = reverse('claims:claim-detail', kwargs={'pk': self.claim.pk})
+        for engine in ('cached_db', 'signed_cookies'):
+            with self.subTest(engine=engine), override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                client = Client()
+                client.login(username='cached_user', password='password123')
+                client.get(detail_url)
+                client.get(reverse('claims:claim-list'), HTTP_HX_REQUEST='true')
+                # The version check and the claims page (the total comes from the cached dashboard summary).
+                with self.assertNumQueries(2):
+                    client.get(reverse('claims:claim-list'), HTTP_HX_REQUEST='true')
+                # The version check, the claim with its flag, and the visible notes (the claim cards are cached).
+                with self.assertNumQueries(3):
+                    response = client.get(detail_url)
+                self.assertContains(response, 'Cached Patient')
+
+    def test_saving_a_user_drops_the_cached_copy(self):
+        """SECURITY: Verifies a deactivated user or a changed password takes effect on the next request despite the cache."""
+        self.client.login(username='cached_user', password='password123')
+        list_url = reverse('claims:claim-list')
+        self.assertEqual(self.client.get(list_url).status_code, 200)
+        self.assertIsNotNone(user_cache.get(self.user.pk))
+
+        self.user.set_password('new-password-456')
+        self.user.save()
+        self.assertIsNone(user_cache.get(self.user.pk))
+        self.assertEqual(self.client.get(list_url).status_code, 302)
+
+        self.client.login(username='cached_user', password='new-password-456')
+        self.assertEqual(self.client.get(list_url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(list_url).status_code, 302)
+
+    def test_user_cache_expires_copies_and_can_be_disabled(self):
+        """EDGE CASE: Verifies cached users expire after the timeout, are handed out as copies, and a zero timeout always queries."""
+        backend = CachedModelBackend()
+        with self.assertNumQueries(1):
+            first = backend.get_user(self.user.pk)
+            second = backend.get_user(self.user.pk)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+
+        now = time.monotonic()
+        with mock.patch('claims.auth.time.monotonic', return_value=now + 3600):
+            self.assertIsNone(user_cache.get(self.user.pk))
+
+        with override_settings(CLAIMS_USER_CACHE_SECONDS=0), self.assertNumQueries(2):
+            backend.get_user(self.user.pk)
+            backend.get_user(self.user.pk)
+        self.assertIsNone(user_cache.get(self.user.pk))
+
+# ================================================================= #
+# 22. CONDITIONAL GET TESTS
+# ================================================================= #
+class ConditionalGetTests(TestCase):
+    """
+    Tests that the claim detail, claim list and dashboard answer unchanged
+    repeat requests with 304, and that every change they show moves their ETag.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='etag_user', password='password123')
+        self.client.login(username='etag_user', password='password123')
+        self.claim = Claim.objects.create(claim_id=97001, patient_name='Etag Patient', billed_amount=500, paid_amount=100,
+                                          status='Denied', insurer_name='Etag Insurer', discharge_date='2025-04-01')
+        ClaimDetail.objects.create(claim=self.claim, cpt_codes='99213', denial_reason=intern_denial_reason('Not covered'))
+        self.detail_url = reverse('claims:claim-detail', kwargs={'pk': self.claim.pk})
+        self.list_url = reverse('claims:claim-list')
+
+    def etag(self, url, client=None, **headers):
+        response = (client or self.client).get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def revalidate(self, url, etag, **headers):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag, **headers).status_code
+
+    def test_unchanged_pages_answer_304_without_rendering(self):
+        """PERFORMANCE: Verifies a repeat request with a current ETag costs the session and one version read, and renders nothing."""
+        for url, headers in ((self.detail_url, {}), (self.list_url, {'HTTP_HX_REQUEST': 'true'}), (reverse('claims:dashboard'), {})):
+            with self.subTest(url=url):
+                response = self.client.get(url, **headers)
+                self.assertEqual(response['Cache-Control'], 'private, no-cache')
+                self.assertIn('HX-Request', response['Vary'])
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(2):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **headers)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertFalse(response.templates)
+
+    def test_claim_changes_move_the_etags(self):
+        """FUNCTIONALITY: Verifies flags, notes and status changes refresh the detail, and only listed changes the claim list."""
+        hx = {'HTTP_HX_REQUEST': 'true'}
+        detail, listing = self.etag(self.detail_url), self.etag(self.list_url, **hx)
+
+        self.client.post(reverse('claims:add-note', kwargs={'pk': self.claim.pk}), {'note_text': 'New note'})
+        self.assertEqual(self.revalidate(self.detail_url, detail), 200)
+        self.assertEqual(self.revalidate(self.list_url, listing, **hx), 304)
+
+        for change in (
+            lambda: self.client.post(reverse('claims:flag-claim', kwargs={'pk': self.claim.pk})),
+            lambda: self.client.post(reverse('claims:change-claim-status', kwargs={'pk': self.claim.pk}), {'status': 'Appealed'}),
+            lambda: Note.objects.get(text='New note').delete(),
+        ):
+            detail, listing = self.etag(self.detail_url), self.etag(self.list_url, **hx)
+            change()
+            self.assertEqual(self.revalidate(self.detail_url, detail), 200)
+        # Status changes and flags show in the list; deleting a note does not.
+        self.assertEqual(self.revalidate(self.list_url, listing, **hx), 304)
+
+    def test_note_times_are_absolute_so_the_detail_etag_does_not_expire(self):
+        """EDGE CASE: Verifies notes show when they were written rather than their age, so the detail's copy stays current over time."""
+        note = Note.objects.create(claim=self.claim, user=self.user, text='Dated note', is_public=True)
+        Note.objects.filter(pk=note.pk).update(created_at=timezone.make_aware(datetime(2025, 5, 6, 14, 30)))
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, '05/06/2025 2:30 p.m.')
+        self.assertNotContains(response, ' ago<')
+        etag = response['ETag']
+        later = timezone.now() + timedelta(hours=3)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.revalidate(self.detail_url, etag), 304)
+
+    def test_loads_users_and_page_kinds_get_their_own_etags(self):
+        """EDGE CASE: Verifies a load refreshes every page unless it changed nothing, and ETags differ per user and per HTMX or full page."""
+        detail, listing = self.etag(self.detail_url), self.etag(self.list_url)
+        self.assertNotEqual(listing, self.etag(self.list_url, HTTP_HX_REQUEST='true'))
+
+        other = Client()
+        other.login(username=User.objects.create_user(username='etag_other', password='password123').username, password='password123')
+        self.assertNotEqual(detail, self.etag(self.detail_url, client=other))
+
+        row = {'id': 97001, 'patient_name': 'Etag Patient', 'billed_amount': '500.00', 'paid_amount': '100.00',
+               'status': 'Denied', 'insurer_name': 'Etag Insurer', 'discharge_date': '2025-04-01'}
+        detail_row = {'claim_id': 97001, 'cpt_codes': '99213', 'denial_reason': 'Not covered'}
+        load_claim_data([row], [detail_row], 'delta')
+        detail, listing = self.etag(self.detail_url), self.etag(self.list_url)
+        # An identical file changes nothing, so the pages stay current.
+        load_claim_data([row], [detail_row], 'delta')
+        self.assertEqual(self.revalidate(self.detail_url, detail), 304)
+        self.assertEqual(self.revalidate(self.list_url, listing), 304)
+
+        load_claim_data([dict(row, paid_amount='50.00')], [detail_row], 'delta')
+        self.assertEqual(self.revalidate(self.detail_url, detail), 200)
+        self.assertEqual(self.revalidate(self.list_url, listing), 200)
+
+
+# ================================================================= #
+# 23. STORED UNDERPAYMENT TESTS
+# ================================================================= #
+class StoredUnderpaymentTests(TestCase):
+    """
+    Tests that `Claim.underpayment` follows the amounts through every write
+    path, and that the top denials are read off the (status, underpayment) index.
+    """
+    def setUp(self):
+        self.claims = [
+            {"id": i, "patient_name": f"P{i}", "billed_amount": f"{100 * i}.00", "paid_amount": "25.50",
+             "status": "Denied", "insurer_name": "Acme", "discharge_date": "2025-01-01"}
+            for i in range(1, 4)
+        ]
+        process_claim_data(self.claims, [], 'append')
+        cache.clear()
+
+    def underpayments(self):
+        return dict(Claim.objects.values_list('claim_id', 'underpayment'))
+
+    def test_every_write_path_keeps_underpayment(self):
+        """FUNCTIONALITY: Verifies append, delta and staged overwrite loads and saves all store billed minus paid."""
+        self.assertEqual(self.underpayments(), {1: Decimal('74.50'), 2: Decimal('174.50'), 3: Decimal('274.50')})
+
+        load_claim_data([dict(self.claims[0], paid_amount='100.00'), self.claims[1], self.claims[2]], [], 'delta')
+        self.assertEqual(self.underpayments()[1], Decimal('0.00'))
+
+        new = {**self.claims[0], "id": 4, "billed_amount": "50.00", "paid_amount": "75.00"}
+        load_claim_data([dict(self.claims[1], billed_amount='1000.00'), self.claims[2], new], [], 'overwrite')
+        self.assertEqual(self.underpayments(), {2: Decimal('974.50'), 3: Decimal('274.50'), 4: Decimal('-25.00')})
+
+        claim = Claim.objects.get(claim_id=3)
+        claim.paid_amount = 300.25
+        claim.save(update_fields=['paid_amount'])
+        self.assertEqual(claim.underpayment, Decimal('-0.25'))
+        self.assertEqual(self.underpayments()[3], Decimal('-0.25'))
+
+    def test_dashboard_and_detail_read_the_stored_column(self):
+        """EDGE CASE: Verifies the top denials, status totals and detail card agree with the stored amounts."""
+        Claim.objects.create(claim_id=9, patient_name='Paid', billed_amount=5000, paid_amount=0,
+                             status='Paid', insurer_name='Acme', discharge_date='2025-01-01')
+        summary = get_dashboard_summary()
+        self.assertEqual([row['claim_id'] for row in summary['high_value_denials']], [3, 2, 1])
+        self.assertEqual(summary['high_value_denials'][0]['underpayment'], Decimal('274.50'))
+        rebuild_summary()
+        self.assertEqual(get_dashboard_summary()['total_underpayment'], Decimal('5523.50'))
+
+        user = User.objects.create_user(username='underpaid', password='password123')
+        self.client.force_login(user)
+        response = self.client.get(reverse('claims:claim-detail', kwargs={'pk': Claim.objects.get(claim_id=2).pk}))
+        self.assertEqual(response.context['underpayment_amount'], Decimal('174.50'))
+
+    @skipUnless(connection.vendor == 'sqlite', 'Checks SQLite query plans.')
+    def test_top_denials_are_an_index_range_scan(self):
+        """PERFORMANCE: Verifies the top denials by underpayment are read from the index without sorting."""
+        plan = Claim.objects.filter(status=Claim.STATUS_DENIED).order_by('-underpayment')[:5].explain()
+        self.assertIn('claim_status_underpayment_idx (status=?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+# ================================================================= #
+# 24. AGING WORKLIST TESTS
+# ================================================================= #
+class AgingWorklistTests(TestCase):
+    """
+    Tests that the aging worklist pages through one status oldest first and
+    that its bucket totals are kept up to date by every write path.
+    """
+    def setUp(self):
+        today = timezone.localdate()
+        self.claims = [
+            {"id": 60000 + days, "patient_name": f"Aged {days}", "billed_amount": f"{days}.00", "paid_amount": "0.00",
+             "status": "Under Review", "insurer_name": "Acme", "discharge_date": (today - timedelta(days=days)).isoformat()}
+            for days in (-3, 10, 30, 31, 45, 75, 100, 120, 121, 400)
+        ]
+        process_claim_data(self.claims, [], 'append')
+        self.user = User.objects.create_user(username='collector', password='password123')
+        self.client.login(username='collector', password='password123')
+        cache.clear()
+
+    def buckets(self, status=Claim.STATUS_UNDER_REVIEW):
+        return {row['key']: (row['count'], row['underpayment']) for row in aging_buckets(status, timezone.localdate())}
+
+    def test_bucket_totals_follow_loads_and_status_changes(self):
+        """FUNCTIONALITY: Verifies bucket counts and dollars move with loads and status changes and match a full rebuild."""
+        self.assertEqual(self.buckets(), {
+            '0-30': (3, Decimal('37.00')), '31-60': (2, Decimal('76.00')), '61-90': (1, Decimal('75.00')),
+            '91-120': (2, Decimal('220.00')), '120+': (2, Decimal('521.00')),
+        })
+
+        claim = Claim.objects.get(claim_id=60045)
+        self.client.post(reverse('claims:change-claim-status', kwargs={'pk': claim.pk}), {'status': 'Denied'})
+        moved = dict(self.claims[4], discharge_date=self.claims[9]['discharge_date'], status='Denied', paid_amount='5.00')
+        load_claim_data([dict(self.claims[0], billed_amount='50.00'), *self.claims[1:4], moved, *self.claims[5:]], [], 'delta')
+        remaining = self.buckets()
+        self.assertEqual(remaining['0-30'], (3, Decimal('90.00')))
+        self.assertEqual(remaining['31-60'], (1, Decimal('31.00')))
+        self.assertEqual(self.buckets(Claim.STATUS_DENIED)['120+'], (1, Decimal('40.00')))
+
+        rebuild_summary()
+        self.assertEqual(self.buckets(), remaining)
+
+    @mock.patch('claims.views.AGING_PER_PAGE', 3)
+    def test_worklist_pages_oldest_first_within_a_bucket(self):
+        """EDGE CASE: Verifies keyset pages run oldest first, buckets filter the rows, and unknown parameters fall back."""
+        url = reverse('claims:aging-worklist')
+        response = self.client.get(url)
+        self.assertEqual([c.claim_id for c in response.context['page_obj']], [60400, 60121, 60120])
+        self.assertEqual(response.context['page_obj'].object_list[0].days_aged, 400)
+        response = self.client.get(url, {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual([c.claim_id for c in response.context['page_obj']], [60100, 60075, 60045])
+        response = self.client.get(url, {'cursor': response.context['page_obj'].previous_cursor})
+        self.assertEqual([c.claim_id for c in response.context['page_obj']], [60400, 60121, 60120])
+
+        response = self.client.get(url, {'bucket': '0-30'}, HTTP_HX_REQUEST='true')
+        self.assertTemplateUsed(response, 'claims/partials/_aging_worklist_partial.html')
+        self.assertEqual([c.claim_id for c in response.context['page_obj']], [60030, 60010, 59997])
+
+        response = self.client.get(url, {'status': 'Paid', 'bucket': 'never'})
+        self.assertEqual(response.context['status'], Claim.STATUS_UNDER_REVIEW)
+        self.assertIsNone(response.context['bucket'])
+
+    def test_worklist_cost_does_not_grow_with_claims(self):
+        """PERFORMANCE: Verifies a page is a fixed number of queries on the (status, discharge_date) index and the summary rows."""
+        url = reverse('claims:aging-worklist')
+        self.client.get(url)
+        # Session, versions, one page of claims and one aggregate for the buckets.
+        with self.assertNumQueries(4):
+            self.client.get(url, {'bucket': '120+'})
+        if connection.vendor == 'sqlite':
+            page = worklist_claims(Claim.STATUS_UNDER_REVIEW).order_by(*OLDEST_FIRST_ORDERING)[:26]
+            self.assertIn('claim_status_discharge_idx (status=?)', page.explain())
+            self.assertNotIn('TEMP B-TREE', page.explain())
+
+
+# ================================================================= #
+# 25. BULK STATUS CHANGE TESTS
+# ================================================================= #
+class BulkStatusChangeTests(TestCase):
+    """
+    Tests that many claims change status in one transaction with set-based
+    writes, through the endpoint and the management command, keeping the
+    history, summaries and search index in step.
+    """
+    def setUp(self):
+        self.claims = [
+            {"id": 70000 + i, "patient_name": f"Bulk {i}", "billed_amount": "100.00", "paid_amount": "40.00",
+             "status": "Denied" if i % 3 else "Paid", "insurer_name": "Acme" if i < 6 else "Other",
+             "discharge_date": "2025-02-01"}
+            for i in range(9)
+        ]
+        process_claim_data(self.claims, [], 'append')
+        self.user = User.objects.create_user(username='bulk_user', password='password123')
+        self.client.login(username='bulk_user', password='password123')
+        self.url = reverse('claims:bulk-change-status')
+        cache.clear()
+
+    def statuses(self):
+        return dict(Claim.objects.values_list('claim_id', 'status'))
+
+    def test_filtered_change_writes_history_and_keeps_summaries(self):
+        """FUNCTIONALITY: Verifies matching claims move, each gets a history entry, and the summaries and search follow."""
+        response = self.client.post(self.url, {
+            'new_status': 'Appealed', 'comment': 'Batch appeal', 'status': 'Denied', 'insurer_name': 'Acme',
+        }, HTTP_HX_REQUEST='true')
+        self.assertContains(response, '4 claims moved to Appealed.')
+
+        appealed = sorted(claim_id for claim_id, status in self.statuses().items() if status == 'Appealed')
+        self.assertEqual(appealed, [70001, 70002, 70004, 70005])
+        history = ClaimHistory.objects.filter(claim__claim_id__in=appealed)
+        self.assertEqual(history.count(), 4)
+        self.assertEqual(set(history.values_list('user__username', 'old_status', 'new_status', 'comment')),
+                         {('bulk_user', 'Denied', 'Appealed', 'Batch appeal')})
+
+        summary = get_dashboard_summary()['status_counts']
+        self.assertEqual(summary, {'Appealed': 4, 'Denied': 2, 'Paid': 3})
+        aging = self.client.get(reverse('claims:aging-worklist'), {'status': 'Appealed'}).context['buckets']
+        self.assertEqual(sum(row['count'] for row in aging), 4)
+        rebuild_summary()
+        self.assertEqual(get_dashboard_summary()['status_counts'], summary)
+        self.assertEqual(len(filter_claims(Claim.objects.all(), 'appealed')), 4)
+
+        # Claims already in the new status are left alone.
+        response = self.client.post(self.url, {'new_status': 'Appealed', 'claim_ids': '70001, 70002'}, HTTP_HX_REQUEST='true')
+        self.assertContains(response, 'No claims needed a change.')
+        self.assertEqual(ClaimHistory.objects.count(), 4)
+
+    def test_selection_must_be_explicit_and_valid(self):
+        """SECURITY: Verifies the endpoint needs a login, a POST, a known status and IDs or filters, and the command checks its input."""
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        for data in ({'new_status': 'Closed', 'status': 'Denied'}, {'new_status': 'Paid'},
+                     {'new_status': 'Paid', 'claim_ids': '70001, abc'}):
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post(self.url, data).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.post(self.url, {'new_status': 'Paid', 'claim_ids': '70001'}).status_code, 302)
+        self.assertEqual(ClaimHistory.objects.count(), 0)
+
+        for args in ([], ['--claim-ids', '70001', '--filter', 'status=Denied'], ['--filter', 'color=red'],
+                     ['--username', 'nobody', '--claim-ids', '70001']):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                call_command('change_claim_status', 'Paid', *args, stdout=StringIO())
+
+        out = StringIO()
+        call_command('change_claim_status', 'Paid', '--claim-ids', '70001', '70002', '70003', '99999', '--dry-run', stdout=out)
+        self.assertIn('2 claims would move to Paid.', out.getvalue())
+        call_command('change_claim_status', 'Paid', '--claim-ids', '70001', '70002', '70003', '99999',
+                     '--username', 'bulk_user', '--batch-size', '1', stdout=out)
+        self.assertIn('2 claims moved to Paid.', out.getvalue())
+        self.assertEqual(ClaimHistory.objects.filter(user=self.user, new_status='Paid').count(), 2)
+
+    def test_statement_count_does_not_grow_with_claims(self):
+        """PERFORMANCE: Verifies one UPDATE moves every claim and the other writes are per batch, not per claim."""
+        process_claim_data([dict(row, id=row['id'] + 100) for row in self.claims], [], 'append')
+
+        def statements(claims):
+            with CaptureQueriesContext(connection) as ctx:
+                changed = change_claim_statuses(claims, 'Under Review', user=self.user)
+            updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "claims_claim"')]
+            return changed, len(ctx.captured_queries), len(updates)
+
+        small = statements(Claim.objects.filter(claim_id__lt=70003))
+        large = statements(Claim.objects.filter(claim_id__gte=70003))
+        self.assertEqual(small[0], 3)
+        self.assertEqual(large[0], 15)
+        self.assertEqual(small[1:], large[1:])
+        self.assertEqual(small[2], 1)
+
+
+# ================================================================= #
+# 26. POSTGRESQL TESTS
+# ================================================================= #
+@skipUnless(connection.vendor == 'postgresql', 'Runs against PostgreSQL (set DATABASE_URL=postgres://...).')
+class PostgreSQLTests(TestCase):
+    """
+    Tests the PostgreSQL-only paths: the tsvector and trigram search index,
+    the ON CONFLICT upserts and UPDATE ... FROM merge, and the psycopg pool.
+    """
+    def setUp(self):
+        self.claims = [
+            {"id": 90001, "patient_name": "Jordan Acme", "billed_amount": "100.00", "paid_amount": "10.00", "status": "Denied", "insurer_name": "Acme Health", "discharge_date": "2025-01-01"},
+            {"id": 90002, "patient_name": "Ana Goldsmith", "billed_amount": "50.00", "paid_amount": "50.00", "status": "Paid", "insurer_name": "Blue Shield", "discharge_date": "2025-01-02"},
+            {"id": 90003, "patient_name": "Smith Jones", "billed_amount": "80.00", "paid_amount": "0.00", "status": "Under Review", "insurer_name": "Blue Shield", "discharge_date": "2025-01-03"},
+        ]
+        self.details = [
+            {"id": 1, "claim_id": 90001, "denial_reason": "Missing prior authorization", "cpt_codes": "99213,99214"},
+            {"id": 2, "claim_id": 90003, "denial_reason": "", "cpt_codes": "71045"},
+        ]
+        process_claim_data(self.claims, self.details, 'append')
+        cache.clear()
+
+    def search(self, query):
+        return sorted(filter_claims(Claim.objects.all(), query).values_list('claim_id', flat=True))
+
+    def summaries(self):
+        return (
+            sorted(ClaimStatusSummary.objects.filter(claim_count__gt=0).values_list('status', 'claim_count', 'underpayment_total')),
+            sorted(ClaimAgingSummary.objects.filter(claim_count__gt=0).values_list('status', 'discharge_date', 'claim_count', 'underpayment_total')),
+            sorted(DenialReason.objects.filter(claim_count__gt=0).values_list('text', 'claim_count')),
+        )
+
+    def test_search_matches_prefixes_and_substrings_through_the_indexes(self):
+        """PERFORMANCE: Verifies prefix and substring queries match, rank and plan onto the tsvector and trigram GIN indexes."""
+        self.assertEqual(self.search('jord'), [90001])
+        self.assertEqual(self.search('blue shi'), [90002, 90003])
+        self.assertEqual(self.search('prior auth'), [90001])
+        self.assertEqual(self.search('7104'), [90003])
+        self.assertEqual(self.search('smith'), [90002, 90003])
+        self.assertEqual(self.search('ldsmi'), [90002])
+        # Shorter queries only match as prefixes, as on SQLite; LIKE wildcards are literal.
+        self.assertEqual(self.search('th'), [])
+        self.assertEqual(self.search('%'), [])
+        self.assertEqual(self.search('"acme" | !x:*'), [])
+        self.assertEqual([claim.claim_id for claim in search_claims('smith')], [90003, 90002])
+        self.assertEqual([claim.claim_id for claim in search_claims('acme')], [90001])
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            self.assertTrue(cursor.fetchone())
+            # The tables are tiny; without these plans PostgreSQL shows which indexes can serve the query.
+            for plan_type in ('seqscan', 'indexscan', 'nestloop'):
+                cursor.execute(f'SET LOCAL enable_{plan_type} = off')
+        plan = filter_claims(Claim.objects.all(), 'smith').explain()
+        self.assertIn('claims_claimsearch_document', plan)
+        self.assertIn('claims_claimsearch_body_trgm', plan)
+
+    def test_upserts_and_merges_keep_the_index_and_summaries_in_step(self):
+        """FUNCTIONALITY: Verifies append, delta and overwrite loads upsert rows, reindex them and move the summaries as a rebuild would."""
+        changed = [dict(self.claims[0], patient_name='Jordan Stone', status='Paid', paid_amount='100.00'), self.claims[1]]
+        self.assertEqual(process_claim_data(changed, [dict(self.details[0], denial_reason='Late filing')], 'append'), (0, 2, 0, 1))
+        self.assertEqual(Claim.objects.get(claim_id=90001).underpayment, Decimal('0.00'))
+        self.assertEqual(self.search('stone'), [90001])
+        self.assertEqual(self.search('acme'), [90001])  # Still the insurer's name.
+        self.assertEqual(self.search('late fil'), [90001])
+
+        loader = load_claim_data(changed, [dict(self.details[0], denial_reason='Late filing')], 'delta')
+        # The removed claim's detail goes with it.
+        self.assertEqual((loader.claims_unchanged, loader.claims_removed, loader.details_removed), (2, 1, 0))
+        self.assertEqual(self.search('smith'), [90002])
+
+        new = dict(self.claims[2], id=90004, patient_name='Riley Smithers')
+        with self.captureOnCommitCallbacks(execute=True):
+            load_claim_data([dict(changed[0], status='Denied'), new], [dict(self.details[1], claim_id=90004)], 'overwrite')
+        self.assertEqual(sorted(Claim.objects.values_list('claim_id', 'status')), [(90001, 'Denied'), (90004, 'Under Review')])
+        self.assertEqual(self.search('smith'), [90004])
+        self.assertEqual(self.search('late fil'), [])
+        self.assertEqual(ClaimStaging.objects.count() + ClaimDetailStaging.objects.count() + ClaimCptCodeStaging.objects.count(), 0)
+
+        incremental = self.summaries()
+        rebuild_summary()
+        self.assertEqual(incremental, self.summaries())
+
+    def test_connection_pool_reuses_connections(self):
+        """PERFORMANCE: Verifies DB_POOL's settings open a psycopg pool that hands its one connection to every later request."""
+        with mock.patch.dict(os.environ, {'DATABASE_URL': 'postgres://erisa@db/erisa', 'DB_POOL': 'True',
+                                          'DB_POOL_MIN_SIZE': '1', 'DB_POOL_MAX_SIZE': '1'}, clear=True):
+            pool = database_settings(environ.Env(), '')['OPTIONS']['pool']
+        settings_dict = dict(connection.settings_dict, CONN_MAX_AGE=0, OPTIONS=dict(connection.settings_dict['OPTIONS'], pool=pool))
+        pooled = type(connections[connection.alias])(settings_dict, alias='pool_check')
+        try:
+            backend_pids = set()
+            for _ in range(3):
+                with pooled.cursor() as cursor:
+                    cursor.execute('SELECT pg_backend_pid()')
+                    backend_pids.add(cursor.fetchone()[0])
+                pooled.close()
+            self.assertEqual(len(backend_pids), 1)
+        finally:
+            pooled.close_pool()
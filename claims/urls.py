@@ -11,8 +11,11 @@ urlpatterns = [
     path('', views.home_view, name='home'),
 
     path('claims/', views.claim_list_view, name='claim-list'),
+    path('claims/export/', views.export_claims_view, name='export-claims'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('dashboard/aging/', views.aging_worklist_view, name='aging-worklist'),
     path('upload/', views.upload_claims_view, name='upload-claims'),
+    path('upload/jobs/<int:pk>/', views.upload_job_view, name='upload-job'),
     
     # URL for downloading template files
     path('download_template/<str:file_type>/', views.download_template_view, name='download-template'),
@@ -27,7 +30,11 @@ urlpatterns = [
     path('claim/<int:pk>/flag/', views.flag_claim_view, name='flag-claim'),
     path('claim/<int:pk>/add_note/', views.add_note_view, name='add-note'),
     path('claim/<int:pk>/change_status/', views.change_claim_status_view, name='change-claim-status'),
+    path('claims/change_status/', views.bulk_change_status_view, name='bulk-change-status'),
     path('claim/<int:pk>/report/', views.generate_report_view, name='generate-report'),
     path('note/<int:pk>/delete/', views.delete_note_view, name='delete-note'),
     path('note/<int:pk>/edit/', views.edit_note_view, name='edit-note'),
+
+    # Monitoring
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,108 +1,755 @@
 
 # claims/utils.py
 
+import codecs
+import hashlib
 import json
 import csv
-import io
+from collections import defaultdict
+from datetime import date
 from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
 from .models import Claim, ClaimDetail
+from .cpt import store_cpt_codes, sync_cpt_codes
+from .denial_reasons import DenialReasonCache
+from .fragments import invalidate_claim_cards
+from .search import reindex_claims, remove_claims
+from .staging import discard_staged, merge_staged, new_load_token, purge_stale_staging, stage_claims, stage_details
+from .summary import SummaryDelta
+from .versions import CLAIMS, INGEST, bump_versions
 
-def parse_data_from_stream(file_stream, filename):
+# Rows are written in chunks of this size, one transaction per chunk.
+BATCH_SIZE = 1000
+
+# Uploaded files are read and decoded this many bytes at a time.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+CLAIM_FIELDS = ['patient_name', 'billed_amount', 'paid_amount', 'status', 'insurer_name', 'discharge_date']
+DETAIL_FIELDS = ['denial_reason', 'cpt_codes']
+
+LOAD_MODES = ('append', 'overwrite', 'delta')
+
+_discharge_date_field = Claim._meta.get_field('discharge_date')
+_status_lookup = {
+    key.lower(): value for value, label in Claim.STATUS_CHOICES for key in (value, label)
+}
+
+def _iter_text_chunks(file_stream):
     """
-    Parses data from a file stream (CSV or JSON) into a list of dictionaries.
+    Reads a binary (or text) stream in fixed-size pieces, decoding UTF-8
+    incrementally so multi-byte characters split across reads survive.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        chunk = file_stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _iter_text_lines(file_stream):
+    """
+    Yields the lines of a stream one at a time, keeping their line endings.
+    """
+    pending = ''
+    for text in _iter_text_chunks(file_stream):
+        pending += text
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+def _iter_csv_rows(file_stream):
+    try:
+        yield from csv.DictReader(_iter_text_lines(file_stream))
+    except Exception as e:
+        raise ValueError(f"Error parsing CSV file: {e}")
+
+
+def _iter_json_values(file_stream):
+    """
+    Incrementally decodes JSON from a stream.
+
+    A top-level array yields its elements one by one; anything else is read
+    as a sequence of JSON values, which covers JSON Lines. Only the value
+    currently being decoded is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    chunks = _iter_text_chunks(file_stream)
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        text = next(chunks, None)
+        if text is None:
+            eof = True
+            return False
+        buffer = buffer[pos:] + text
+        pos = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return
+
+    def decode_value():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof or not fill():
+                    raise ValueError(f"Invalid JSON file: {e}")
+                continue
+            # A value ending exactly at the buffer edge (e.g. a number) may continue in the next read.
+            if end == len(buffer) and not eof and fill():
+                continue
+            pos = end
+            return value
+
+    skip_whitespace()
+    if buffer[pos:pos + 1] != '[':
+        while pos < len(buffer):
+            yield decode_value()
+            skip_whitespace()
+        return
+
+    pos += 1
+    skip_whitespace()
+    if buffer[pos:pos + 1] == ']':
+        return
+    while True:
+        yield decode_value()
+        skip_whitespace()
+        separator = buffer[pos:pos + 1]
+        pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Invalid JSON file: expected ',' or ']' but found {separator or 'end of file'!r}")
+        skip_whitespace()
+
+
+def iter_data_from_stream(file_stream, filename):
+    """
+    Lazily parses data from a file stream (CSV, JSON or JSON Lines), yielding
+    one dictionary per record.
+
+    The stream is read in fixed-size pieces, so memory use does not grow with
+    the size of the file. Format errors surface as `ValueError` while iterating.
 
     :param file_stream: An open file-like object.
     :param filename: The name of the file, used to determine the format.
-    :return: A list of dictionaries representing the data.
+    :return: An iterator of dictionaries representing the data.
     :raises ValueError: If the file format is unsupported or data is malformed.
     """
     filename = filename.lower()
-    
-    if filename.endswith('.json'):
-        try:
-            # Decode the stream from bytes if necessary, then load JSON
-            decoded_stream = file_stream.read().decode('utf-8')
-            return json.loads(decoded_stream)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid JSON file: {e}")
 
+    if filename.endswith(('.json', '.jsonl', '.ndjson')):
+        return _iter_json_values(file_stream)
     elif filename.endswith('.csv'):
-        try:
-            # Decode and wrap in a StringIO to be read by csv.DictReader
-            decoded_stream = io.StringIO(file_stream.read().decode('utf-8'))
-            reader = csv.DictReader(decoded_stream)
-            # Convert reader object to a list of dictionaries
-            return [row for row in reader]
-        except Exception as e:
-            raise ValueError(f"Error parsing CSV file: {e}")
-            
+        return _iter_csv_rows(file_stream)
     else:
-        raise ValueError("Unsupported file format. Please use .json or .csv")
+        raise ValueError("Unsupported file format. Please use .json, .jsonl or .csv")
 
 
-def process_claim_data(claims_data, details_data, mode):
+def parse_data_from_stream(file_stream, filename):
     """
-    Processes and loads claim data into the database from parsed data.
+    Parses data from a file stream (CSV or JSON) into a list of dictionaries.
 
-    :param claims_data: A list of dictionaries for claims.
-    :param details_data: A list of dictionaries for claim details.
-    :param mode: 'overwrite' or 'append'.
-    :return: A tuple of (claims_created, claims_updated, details_created, details_updated)
+    Prefer `iter_data_from_stream` for large files; this materializes every row.
+
+    :param file_stream: An open file-like object.
+    :param filename: The name of the file, used to determine the format.
+    :return: A list of dictionaries representing the data.
+    :raises ValueError: If the file format is unsupported or data is malformed.
+    """
+    return list(iter_data_from_stream(file_stream, filename))
+
+
+def chunked(iterable, size):
+    """
+    Yields successive lists of at most `size` items from any iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def clean_claim_row(claim_data):
+    """
+    Converts a raw claim row into the field values stored on `Claim`.
+
+    :param claim_data: A dictionary for a single claim.
+    :return: A dictionary keyed by `claim_id` and the `Claim` fields, or None
+             if the id, amounts or discharge date cannot be converted (or an
+             amount is NaN or infinite) or the status is unknown.
+    :raises KeyError: If a required key is missing.
     """
-    if mode == 'overwrite':
-        Claim.objects.all().delete()
-
-    claims_created = 0
-    claims_updated = 0
-    details_created = 0
-    details_updated = 0
-
-    # --- Process Claims ---
-    for claim_data in claims_data:
-        try:
-            # Ensure amounts are correctly converted to Decimal
-            billed_amount = Decimal(claim_data.get('billed_amount', 0))
-            paid_amount = Decimal(claim_data.get('paid_amount', 0))
-        except (InvalidOperation, TypeError):
-            # Skip this record if amount conversion fails
+    try:
+        # Ensure amounts are correctly converted to Decimal
+        billed_amount = Decimal(claim_data.get('billed_amount', 0))
+        paid_amount = Decimal(claim_data.get('paid_amount', 0))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    if not (billed_amount.is_finite() and paid_amount.is_finite()):
+        return None
+
+    # Accept any casing of a known status, but store the canonical value.
+    status = _status_lookup.get(str(claim_data['status']).strip().lower())
+    if status is None:
+        return None
+
+    try:
+        claim_id = int(claim_data['id'])
+        discharge_date = _discharge_date_field.to_python(claim_data['discharge_date'])
+    except (TypeError, ValueError, ValidationError):
+        return None
+    if discharge_date is None:
+        return None
+
+    return {
+        'claim_id': claim_id,
+        'patient_name': claim_data['patient_name'],
+        'billed_amount': billed_amount,
+        'paid_amount': paid_amount,
+        'status': status,
+        'insurer_name': claim_data['insurer_name'],
+        'discharge_date': discharge_date,
+    }
+
+
+def clean_detail_row(detail_data):
+    """
+    Converts a raw claim detail row into the field values stored on `ClaimDetail`.
+
+    :param detail_data: A dictionary for a single claim detail.
+    :return: A dictionary keyed by the parent `claim_id` and the `ClaimDetail`
+             fields, or None if a required key is missing or the claim id is
+             not a whole number.
+    """
+    try:
+        return {
+            'claim_id': int(detail_data['claim_id']),
+            'denial_reason': detail_data['denial_reason'],
+            'cpt_codes': detail_data['cpt_codes'],
+        }
+    except KeyError as e:
+        # Skip if a required key is missing in the detail data
+        print(f"Skipping detail record due to missing key: {e}")
+        return None
+    except (TypeError, ValueError):
+        return None
+
+
+def _dedupe(rows):
+    """
+    Collapses rows sharing a `claim_id` so the last one wins.
+
+    :return: A tuple of (unique rows, number of rows that repeated an earlier one).
+    """
+    unique = {}
+    for row in rows:
+        unique[row['claim_id']] = row
+    return list(unique.values()), len(rows) - len(unique)
+
+
+def _canonical(value):
+    if value is None:
+        return '\x00'
+    if isinstance(value, Decimal):
+        return f'{value:.2f}'
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def content_hash(row, fields):
+    """
+    Returns a digest of the `fields` of a cleaned row. Values are put in a
+    canonical form first, so `100` and `100.00` hash alike.
+    """
+    payload = '\x1f'.join(_canonical(row[field]) for field in fields)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _write_changes(model, objs, changed_fields):
+    """Writes changed rows with one `bulk_update` per distinct set of changed fields."""
+    groups = defaultdict(list)
+    for obj, fields in zip(objs, changed_fields):
+        groups[tuple(fields)].append(obj)
+    for fields, group in groups.items():
+        model.objects.bulk_update(group, [*fields, 'content_hash'])
+
+
+def _supports_upsert():
+    return connection.features.supports_update_conflicts_with_target
+
+
+def bulk_upsert_claims(rows, delta=False):
+    """
+    Creates or updates a chunk of cleaned claim rows in one transaction.
+
+    Existing claims are looked up with a single `claim_id__in` query, then
+    everything is written with one upsert (or a `bulk_create` plus a
+    `bulk_update` on backends without ON CONFLICT support). The dashboard
+    summary and the search index are brought up to date in the same transaction,
+    and the cached detail cards of updated claims are dropped.
+
+    Every written claim stores the `content_hash` of its row and its
+    `underpayment`. With `delta`,
+    rows whose hash matches the stored one are skipped, and changed claims
+    are updated in only the fields that differ.
+
+    :param rows: Dictionaries as returned by `clean_claim_row`.
+    :param delta: Skip unchanged rows and write only changed fields.
+    :return: A tuple of (created, updated, unchanged).
+    """
+    rows, repeated = _dedupe(rows)
+    if not rows:
+        return (0, 0, 0)
+    for row in rows:
+        row['content_hash'] = content_hash(row, CLAIM_FIELDS)
+        row['underpayment'] = row['billed_amount'] - row['paid_amount']
+
+    with transaction.atomic():
+        if delta:
+            return _delta_upsert_claims(rows, repeated)
+
+        previous = {
+            claim_id: (pk, status, billed_amount, paid_amount, discharge_date)
+            for claim_id, pk, status, billed_amount, paid_amount, discharge_date in Claim.objects.filter(
+                claim_id__in=[row['claim_id'] for row in rows]
+            ).values_list('claim_id', 'pk', 'status', 'billed_amount', 'paid_amount', 'discharge_date')
+        }
+        existing = {claim_id: values[0] for claim_id, values in previous.items()}
+        objs = [Claim(pk=existing.get(row['claim_id']), **row) for row in rows]
+
+        delta_summary = SummaryDelta()
+        for _, status, billed_amount, paid_amount, discharge_date in previous.values():
+            delta_summary.remove_claim(status, billed_amount, paid_amount, discharge_date)
+        for row in rows:
+            delta_summary.add_claim(row['status'], row['billed_amount'], row['paid_amount'], row['discharge_date'])
+        delta_summary.touch_claims(existing.values())
+
+        if _supports_upsert():
+            for obj in objs:
+                obj.pk = None
+            Claim.objects.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=['claim_id'],
+                update_fields=[*CLAIM_FIELDS, 'underpayment', 'content_hash'],
+            )
+        else:
+            Claim.objects.bulk_create([obj for obj in objs if obj.pk is None])
+            Claim.objects.bulk_update(
+                [obj for obj in objs if obj.pk is not None], [*CLAIM_FIELDS, 'underpayment', 'content_hash']
+            )
+        delta_summary.apply()
+        reindex_claims(Claim.objects.filter(claim_id__in=[row['claim_id'] for row in rows]))
+        invalidate_claim_cards(existing.values())
+
+    # A claim repeated within the chunk counts as created once, then updated.
+    updated = len(existing)
+    return (len(rows) - updated, updated + repeated, 0)
+
+
+def _delta_upsert_claims(rows, repeated):
+    previous = {
+        values[0]: values[1:]
+        for values in Claim.objects.filter(claim_id__in=[row['claim_id'] for row in rows]).values_list(
+            'claim_id', 'pk', 'content_hash', *CLAIM_FIELDS
+        )
+    }
+    new, changed, changed_fields = [], [], []
+    delta_summary = SummaryDelta()
+    for row in rows:
+        current = previous.get(row['claim_id'])
+        if current is None:
+            new.append(Claim(**row))
+            delta_summary.add_claim(row['status'], row['billed_amount'], row['paid_amount'], row['discharge_date'])
+            continue
+        pk, stored_hash, *values = current
+        if stored_hash == row['content_hash']:
             continue
+        old = dict(zip(CLAIM_FIELDS, values))
+        changed.append(Claim(pk=pk, **row))
+        fields = [field for field in CLAIM_FIELDS if old[field] != row[field]]
+        if old['billed_amount'] != row['billed_amount'] or old['paid_amount'] != row['paid_amount']:
+            fields.append('underpayment')
+        changed_fields.append(fields)
+        delta_summary.remove_claim(old['status'], old['billed_amount'], old['paid_amount'], old['discharge_date'])
+        delta_summary.add_claim(row['status'], row['billed_amount'], row['paid_amount'], row['discharge_date'])
+
+    Claim.objects.bulk_create(new)
+    _write_changes(Claim, changed, changed_fields)
+    changed_pks = [obj.pk for obj in changed]
+    delta_summary.touch_claims(changed_pks)
+    delta_summary.apply()
+    if new or changed:
+        reindex_claims(Claim.objects.filter(
+            claim_id__in=[obj.claim_id for obj in new] + [obj.claim_id for obj in changed]
+        ))
+    invalidate_claim_cards(changed_pks)
+    return (len(new), len(changed) + repeated, len(rows) - len(new) - len(changed))
+
+
+def bulk_upsert_claim_details(rows, delta=False, denial_reasons=None):
+    """
+    Creates or updates a chunk of cleaned claim detail rows in one transaction.
+
+    Rows whose parent claim does not exist are skipped. `delta` works as in
+    `bulk_upsert_claims`. Denial reason texts are mapped to `DenialReason`
+    keys through `denial_reasons`, a `DenialReasonCache` shared by the load.
+
+    :param rows: Dictionaries as returned by `clean_detail_row`.
+    :param delta: Skip unchanged rows and write only changed fields.
+    :param denial_reasons: The load's `DenialReasonCache` (a new one if omitted).
+    :return: A tuple of (created, updated, unchanged).
+    """
+    if not rows:
+        return (0, 0, 0)
 
-        obj, created = Claim.objects.update_or_create(
-            claim_id=claim_data['id'],
-            defaults={
-                'patient_name': claim_data['patient_name'],
-                'billed_amount': billed_amount,
-                'paid_amount': paid_amount,
-                'status': claim_data['status'],
-                'insurer_name': claim_data['insurer_name'],
-                'discharge_date': claim_data['discharge_date'],
-            }
+    with transaction.atomic():
+        claim_pks = dict(
+            Claim.objects.filter(claim_id__in={row['claim_id'] for row in rows}).values_list('claim_id', 'pk')
         )
-        if created:
-            claims_created += 1
-        else:
-            claims_updated += 1
-
-    # --- Process Claim Details ---
-    for detail_data in details_data:
-        try:
-            parent_claim = Claim.objects.get(claim_id=detail_data['claim_id'])
-            obj, created = ClaimDetail.objects.update_or_create(
-                claim=parent_claim,
-                defaults={
-                    'denial_reason': detail_data['denial_reason'],
-                    'cpt_codes': detail_data['cpt_codes'],
-                }
+        rows, repeated = _dedupe([row for row in rows if row['claim_id'] in claim_pks])
+        if not rows:
+            return (0, 0, 0)
+        for row in rows:
+            row['content_hash'] = content_hash(row, DETAIL_FIELDS)
+        reason_ids = (denial_reasons or DenialReasonCache()).ids_for(row['denial_reason'] for row in rows)
+
+        previous = {
+            values[0]: values[1:]
+            for values in ClaimDetail.objects.filter(claim_id__in=claim_pks.values()).values_list(
+                'claim_id', 'pk', 'content_hash', *DETAIL_FIELDS
             )
-            if created:
-                details_created += 1
+        }
+
+        delta_summary = SummaryDelta()
+        objs, new, changed, changed_fields = [], [], [], []
+        for row in rows:
+            claim_pk = claim_pks[row['claim_id']]
+            current = previous.get(claim_pk)
+            values = {'denial_reason': reason_ids.get(row['denial_reason']), 'cpt_codes': row['cpt_codes']}
+            obj = ClaimDetail(
+                pk=current[0] if current else None,
+                claim_id=claim_pk,
+                denial_reason_id=values['denial_reason'],
+                cpt_codes=values['cpt_codes'],
+                content_hash=row['content_hash'],
+            )
+            if current is not None:
+                if delta and current[1] == row['content_hash']:
+                    continue
+                old = dict(zip(DETAIL_FIELDS, current[2:]))
+                delta_summary.remove_denial_reason(old['denial_reason'])
+                changed.append(obj)
+                changed_fields.append([field for field in DETAIL_FIELDS if old[field] != values[field]])
             else:
-                details_updated += 1
-        except Claim.DoesNotExist:
+                new.append(obj)
+            delta_summary.add_denial_reason(values['denial_reason'])
+            objs.append(obj)
+
+        if delta:
+            ClaimDetail.objects.bulk_create(new)
+            _write_changes(ClaimDetail, changed, changed_fields)
+        elif _supports_upsert():
+            for obj in objs:
+                obj.pk = None
+            ClaimDetail.objects.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=['claim'],
+                update_fields=[*DETAIL_FIELDS, 'content_hash'],
+            )
+        else:
+            ClaimDetail.objects.bulk_create(new)
+            ClaimDetail.objects.bulk_update(changed, [*DETAIL_FIELDS, 'content_hash'])
+        delta_summary.apply()
+        recoded = [obj for obj, fields in zip(changed, changed_fields) if 'cpt_codes' in fields]
+        store_cpt_codes(
+            {obj.claim_id: obj.cpt_codes for obj in new + recoded}, replace=[obj.claim_id for obj in recoded]
+        )
+        touched_claim_pks = [obj.claim_id for obj in objs]
+        if touched_claim_pks:
+            reindex_claims(Claim.objects.filter(pk__in=touched_claim_pks))
+        invalidate_claim_cards(touched_claim_pks)
+
+    return (len(new), len(changed) + repeated, len(rows) - len(objs))
+
+
+def remove_claims_missing_from(claim_ids, batch_size=BATCH_SIZE):
+    """
+    Deletes the claims whose `claim_id` is not in `claim_ids`, with their
+    details, notes, history and flags, in batches of `batch_size`, keeping
+    the dashboard summary and search index in step.
+
+    :return: The number of claims removed.
+    """
+    removed = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Claim.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'claim_id')[:batch_size]
+        )
+        if not batch:
+            return removed
+        last_pk = batch[-1][0]
+        pks = [pk for pk, claim_id in batch if claim_id not in claim_ids]
+        if not pks:
             continue
-        except KeyError as e:
-            # Skip if a required key is missing in the detail data
-            print(f"Skipping detail record due to missing key: {e}")
+        with transaction.atomic():
+            delta = SummaryDelta()
+            for status, billed_amount, paid_amount, discharge_date, denial_reason in Claim.objects.filter(
+                pk__in=pks
+            ).values_list('status', 'billed_amount', 'paid_amount', 'discharge_date', 'details__denial_reason'):
+                delta.remove_claim(status, billed_amount, paid_amount, discharge_date)
+                delta.remove_denial_reason(denial_reason)
+            Claim.objects.filter(pk__in=pks).delete()
+            delta.apply()
+            remove_claims(pks)
+        removed += len(pks)
+
+
+def remove_details_missing_from(claim_ids, batch_size=BATCH_SIZE):
+    """
+    Deletes the claim details whose claim's `claim_id` is not in `claim_ids`,
+    in batches of `batch_size`. The claims themselves are kept.
+
+    :return: The number of details removed.
+    """
+    removed = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            ClaimDetail.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'claim_id', 'claim__claim_id', 'denial_reason')[:batch_size]
+        )
+        if not batch:
+            return removed
+        last_pk = batch[-1][0]
+        gone = [(pk, claim_pk, denial_reason) for pk, claim_pk, claim_id, denial_reason in batch if claim_id not in claim_ids]
+        if not gone:
             continue
+        with transaction.atomic():
+            delta = SummaryDelta()
+            for _, _, denial_reason in gone:
+                delta.remove_denial_reason(denial_reason)
+            ClaimDetail.objects.filter(pk__in=[pk for pk, _, _ in gone]).delete()
+            delta.apply()
+            claim_pks = [claim_pk for _, claim_pk, _ in gone]
+            sync_cpt_codes(claim_pks)
+            reindex_claims(Claim.objects.filter(pk__in=claim_pks))
+            invalidate_claim_cards(claim_pks)
+        removed += len(gone)
+
+
+class ClaimLoader:
+    """
+    Writes cleaned claim and detail rows to the database in batches and keeps
+    the created/updated counters for a whole load.
+
+    Rows come from `clean_claim_row`/`clean_detail_row`; `None` entries (rows
+    that failed validation) are skipped but still count towards progress.
+    Claims must be written before the details that refer to them, and
+    `finish()` called once everything is written (or `abort()` on failure).
+
+    In 'delta' mode the input is taken as a full snapshot: unchanged rows are
+    skipped (counted as unchanged), and `finish()` removes the claims and
+    details that were not in it. Removal is skipped when any row was invalid
+    or no rows of that kind were given, so a bad or partial file never
+    deletes data.
+
+    In 'overwrite' mode rows only go to staging tables while loading;
+    `finish()` swaps them in with one short transaction (see `claims.staging`).
+    """
+    def __init__(self, mode, batch_size=BATCH_SIZE, progress=None):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.progress = progress
+        self.claims_created = 0
+        self.claims_updated = 0
+        self.claims_unchanged = 0
+        self.claims_removed = 0
+        self.details_created = 0
+        self.details_updated = 0
+        self.details_unchanged = 0
+        self.details_removed = 0
+        self.invalid_rows = 0
+        self._seen_claim_ids = set()
+        self._seen_detail_claim_ids = set()
+        self._load_token = None
+        self._denial_reasons = DenialReasonCache()
+
+    @property
+    def delta(self):
+        return self.mode == 'delta'
+
+    @property
+    def staged(self):
+        return self.mode == 'overwrite'
+
+    def begin(self):
+        """
+        Prepares the load; 'overwrite' starts a new set of staging rows, after
+        purging those that killed loads left behind.
+        """
+        if self.staged:
+            purge_stale_staging()
+            self._load_token = new_load_token()
+
+    def _valid(self, chunk, seen):
+        rows = [row for row in chunk if row is not None]
+        self.invalid_rows += len(chunk) - len(rows)
+        if self.delta:
+            seen.update(row['claim_id'] for row in rows)
+        return rows
+
+    def _stage(self, stage, rows, fields):
+        rows, _ = _dedupe(rows)
+        for row in rows:
+            row['content_hash'] = content_hash(row, fields)
+        if rows:
+            stage(self._load_token, rows)
+
+    def write_claims(self, rows):
+        for chunk in chunked(rows, self.batch_size):
+            valid = self._valid(chunk, self._seen_claim_ids)
+            if self.staged:
+                self._stage(stage_claims, valid, CLAIM_FIELDS)
+            else:
+                created, updated, unchanged = bulk_upsert_claims(valid, delta=self.delta)
+                self.claims_created += created
+                self.claims_updated += updated
+                self.claims_unchanged += unchanged
+            if self.progress:
+                self.progress(len(chunk))
+
+    def write_details(self, rows):
+        for chunk in chunked(rows, self.batch_size):
+            valid = self._valid(chunk, self._seen_detail_claim_ids)
+            if self.staged:
+                self._stage(stage_details, valid, DETAIL_FIELDS)
+            else:
+                created, updated, unchanged = bulk_upsert_claim_details(
+                    valid, delta=self.delta, denial_reasons=self._denial_reasons
+                )
+                self.details_created += created
+                self.details_updated += updated
+                self.details_unchanged += unchanged
+            if self.progress:
+                self.progress(len(chunk))
+
+    def _record(self, counts):
+        claims, details = counts['claims'], counts['details']
+        self.claims_created, self.claims_updated = claims['new'], claims['changed']
+        self.claims_unchanged, self.claims_removed = claims['unchanged'], claims['removed']
+        self.details_created, self.details_updated = details['new'], details['changed']
+        self.details_unchanged, self.details_removed = details['unchanged'], details['removed']
 
-    return (claims_created, claims_updated, details_created, details_updated)
\ No newline at end of file
+    def finish(self):
+        """
+        'overwrite' merges the staged rows into the live tables; 'delta'
+        removes the claims and details missing from the input. If the load
+        changed anything, the claim pages browsers hold are marked stale.
+        """
+        if self.staged:
+            self._record(merge_staged(self._load_token))
+        elif self.delta and not self.invalid_rows:
+            if self._seen_claim_ids:
+                self.claims_removed = remove_claims_missing_from(self._seen_claim_ids, self.batch_size)
+            if self._seen_detail_claim_ids:
+                self.details_removed = remove_details_missing_from(self._seen_detail_claim_ids, self.batch_size)
+        self._mark_pages_stale()
+
+    def abort(self):
+        """
+        Drops whatever an unfinished 'overwrite' load had staged; the batches
+        other modes already wrote stay, so their pages are marked stale.
+        """
+        if self.staged:
+            discard_staged(self._load_token)
+        else:
+            self._mark_pages_stale()
+
+    def _mark_pages_stale(self):
+        changed = (self.claims_created, self.claims_updated, self.claims_removed,
+                   self.details_created, self.details_updated, self.details_removed)
+        if any(changed):
+            bump_versions(INGEST, CLAIMS)
+
+    @property
+    def stats(self):
+        return (self.claims_created, self.claims_updated, self.details_created, self.details_updated)
+
+    @property
+    def delta_stats(self):
+        """Counts of new, changed, unchanged and removed claims and details."""
+        return {
+            'claims': {'new': self.claims_created, 'changed': self.claims_updated,
+                       'unchanged': self.claims_unchanged, 'removed': self.claims_removed},
+            'details': {'new': self.details_created, 'changed': self.details_updated,
+                        'unchanged': self.details_unchanged, 'removed': self.details_removed},
+        }
+
+
+def load_claim_data(claims_data, details_data, mode, batch_size=BATCH_SIZE, progress=None):
+    """
+    Like `process_claim_data`, but returns the `ClaimLoader` so callers can
+    read every counter (including the delta mode's unchanged/removed counts).
+    """
+    loader = ClaimLoader(mode, batch_size=batch_size, progress=progress)
+    loader.begin()
+    try:
+        # --- Process Claims ---
+        loader.write_claims(map(clean_claim_row, claims_data))
+
+        # --- Process Claim Details ---
+        loader.write_details(map(clean_detail_row, details_data))
+
+        loader.finish()
+    except BaseException:
+        loader.abort()
+        raise
+    return loader
+
+
+def process_claim_data(claims_data, details_data, mode, batch_size=BATCH_SIZE, progress=None):
+    """
+    Processes and loads claim data into the database from parsed data.
+
+    Rows are validated and written in chunks of `batch_size`, each chunk in
+    its own transaction with a fixed number of queries, instead of several
+    queries per record. Only one chunk is held in memory at a time, so the
+    inputs can be lazy iterators from `iter_data_from_stream`.
+
+    :param claims_data: An iterable of dictionaries for claims.
+    :param details_data: An iterable of dictionaries for claim details.
+    :param mode: 'overwrite', 'append' or 'delta' (see `ClaimLoader`).
+    :param batch_size: The number of rows written per chunk.
+    :param progress: Optional callable, given the number of input rows in each chunk once it is written.
+    :return: A tuple of (claims_created, claims_updated, details_created, details_updated)
+    """
+    return load_claim_data(claims_data, details_data, mode, batch_size=batch_size, progress=progress).stats
@@ -0,0 +1,63 @@
+# claims/versions.py
+
+"""
+Change counters for conditional GETs of the claim pages.
+
+A page is answered with `304 Not Modified` when none of the counters it
+depends on has moved since the browser's copy was made, so the check costs
+one indexed read instead of the page's queries and template. The counters
+are `DataVersion` rows:
+
+- `claim:<pk>` for each claim's detail panel, bumped by status changes,
+  notes, flags and detail edits;
+- `ingest`, bumped by every load (which may change any claim);
+- `claims`, bumped by anything the claim list or dashboard shows: loads,
+  status changes, flags and claim edits.
+
+Rows are created on their first bump; a missing row reads as version None.
+"""
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DataVersion
+
+INGEST = 'ingest'
+CLAIMS = 'claims'
+
+
+def claim_key(claim_pk):
+    return f'claim:{claim_pk}'
+
+
+def bump_versions(*keys):
+    """Increments the given counters in one statement, creating missing ones."""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    now = timezone.now()
+    rows = DataVersion.objects.filter(key__in=keys)
+    if rows.update(version=F('version') + 1, changed_at=now) < len(keys):
+        # First bump of some keys: add their rows and bump again (a second bump of the others is harmless).
+        DataVersion.objects.bulk_create([DataVersion(key=key) for key in keys], ignore_conflicts=True)
+        rows.update(version=F('version') + 1, changed_at=now)
+
+
+def _validators(rows, keys):
+    versions = {key: (version, changed_at) for key, version, changed_at in rows}
+    changed = [versions[key][1] for key in keys if key in versions and versions[key][1]]
+    return tuple(versions.get(key, (None,))[0] for key in keys), max(changed, default=None)
+
+
+def read_versions(*keys):
+    """
+    Returns the counters of `keys` (None for missing ones), in order, and
+    the latest time any of them changed (or None), in one query.
+    """
+    return _validators(DataVersion.objects.filter(key__in=keys).values_list('key', 'version', 'changed_at'), keys)
+
+
+async def aread_versions(*keys):
+    """See `read_versions()`."""
+    rows = [row async for row in DataVersion.objects.filter(key__in=keys).values_list('key', 'version', 'changed_at')]
+    return _validators(rows, keys)
@@ -1,23 +1,43 @@
 # claims/views.py
 
+import hashlib
 import json
+from pathlib import Path
+from django.conf import settings
 from django.core.paginator import Paginator
-from django.db.models import Q, F, Count, Avg, Exists, OuterRef, Sum
+from django.db.models import Q, Exists, OuterRef, Prefetch
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib import messages
-from django.template.loader import render_to_string
-from django.http import HttpResponse, Http404, HttpResponseForbidden
+from django.contrib.messages import get_messages
+from django.middleware.csrf import get_token
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, Http404, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
 from django.urls import reverse_lazy, reverse
 from django.views.generic.edit import CreateView
 from django.views.decorators.http import require_POST
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
 from datetime import timedelta
-import urllib
+from functools import cache, partial
+import urllib.parse
 
+from .aging import BUCKET_KEYS, WORKLIST_STATUSES, aging_buckets, worklist_claims
+from .cpt import parse_cpt_codes
+from .export import EXPORT_FORMATS, available_formats, stream_export
 from .forms import CustomUserCreationForm
-from .models import Claim, ClaimDetail, Note, ClaimHistory, Flag
-from .utils import process_claim_data, parse_data_from_stream
+from .jobs import describe_upload_error, enqueue_upload_job, requeue_stale_jobs
+from .middleware import registry
+from .models import Claim, Note, ClaimHistory, Flag, UploadJob
+from .pagination import KEYSET_ORDERING, paginate_by_cursor
+from .search import filter_claim_list
+from .status_changes import change_claim_statuses, parse_claim_ids
+from .summary import get_dashboard_summary, record_status_change
+from .utils import LOAD_MODES, iter_data_from_stream
+from .versions import CLAIMS, INGEST, aread_versions, claim_key, read_versions
 
 def home_view(request):
     """
@@ -39,165 +59,277 @@ class RegisterView(CreateView):
         messages.success(self.request, "Registration successful! You can now log in.")
         return super().form_valid(form)
 
+
+# The claim detail, flag and note partials are async views that await their
+# queries (aget, acreate, async iteration), so under ASGI a request waiting on
+# the database holds no worker thread. Under WSGI Django runs them in a
+# per-request event loop, with the same queries. The claim list stays a sync
+# view: its search, paging and count are synchronous ORM code throughout.
+
+async def _auser(request):
+    """
+    Resolves the user without blocking the event loop and stores it on the
+    request, so templates reading `request.user` do not query it again.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+async def _arender(request, template_name, context):
+    # The views pass evaluated rows, but templates still read the cache and may
+    # evaluate a lazy queryset (the detail's history when its cards re-render),
+    # which the ORM only allows off the event loop.
+    return await sync_to_async(render)(request, template_name, context)
+
+
+# Conditional GETs: the claim pages carry an ETag built from the change
+# counters they depend on (see `claims.versions`), so a browser revalidating
+# its copy gets a 304 after one small query, without the page's queries or
+# template.
+
+@cache
+def _response_salt():
+    """
+    Part of every ETag that changes with the templates, so pages rendered by an
+    older release are not confirmed as current. `CLAIMS_ETAG_SALT` overrides it.
+    """
+    if settings.CLAIMS_ETAG_SALT:
+        return settings.CLAIMS_ETAG_SALT
+    digest = hashlib.md5(usedforsecurity=False)
+    for path in sorted((Path(__file__).parent / 'templates').rglob('*.html')):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _etag(request, *versions):
+    """
+    A strong ETag for this response: the page's versions, the user, the CSRF
+    secret its forms are signed with, and the exact request.
+    """
+    # get_token() makes sure the secret exists now, so a first visit gets the ETag its next request will match.
+    get_token(request)
+    key = repr((
+        _response_salt(), request.user.pk, request.META['CSRF_COOKIE'],
+        bool(request.htmx), request.get_full_path(), versions,
+    ))
+    return f'"{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def _not_modified(request, etag, last_modified):
+    """Returns a 304 response when the browser's copy is still current, else None."""
+    # A full page also shows the messages waiting for the user, so it is always rendered then.
+    if not request.htmx and len(get_messages(request)):
+        return None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified and int(last_modified.timestamp())
+    )
+    return response and _with_validators(response, etag, last_modified)
+
+
+def _with_validators(response, etag, last_modified):
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    # Browsers keep the page but check back every time; shared caches must not keep it.
+    patch_cache_control(response, private=True, no_cache=True)
+    # The claim list answers HTMX and full page requests from one URL.
+    patch_vary_headers(response, ('HX-Request',))
+    return response
+
+
 @login_required
 @require_POST
-def flag_claim_view(request, pk):
-    claim = get_object_or_404(Claim, pk=pk)
-    flag, created = Flag.objects.get_or_create(user=request.user, claim=claim)
+async def flag_claim_view(request, pk):
+    user = await _auser(request)
+    claim = await aget_object_or_404(Claim, pk=pk)
+    flag, created = await Flag.objects.aget_or_create(user=user, claim=claim)
     if not created:
-        flag.delete()
+        await flag.adelete()
         is_flagged_by_user = False
     else:
         is_flagged_by_user = True
     claim.is_flagged_by_user = is_flagged_by_user
     context = {'claim': claim}
-    return render(request, 'claims/partials/_flag_update_response.html', context)
+    return await _arender(request, 'claims/partials/_flag_update_response.html', context)
 
-@login_required
-def claim_list_view(request):
-    user_flags = Flag.objects.filter(claim=OuterRef('pk'), user=request.user)
-    claims_list = Claim.objects.select_related('details').prefetch_related('notes', 'history').annotate(
-        is_flagged_by_user=Exists(user_flags)
-    )
+CLAIMS_PER_PAGE = 5
 
-    search_query = request.GET.get('q', '')
-    patient_query = request.GET.get('patient_name', '')
-    status_query = request.GET.get('status', '')
-    insurer_query = request.GET.get('insurer_name', '')
 
-    if search_query:
-        claims_list = claims_list.filter(
-            Q(patient_name__icontains=search_query) |
-            Q(status__icontains=search_query) |
-            Q(insurer_name__icontains=search_query)
-        )
-    if patient_query:
-        claims_list = claims_list.filter(patient_name__icontains=patient_query)
-    if status_query:
-        claims_list = claims_list.filter(status__icontains=status_query)
-    if insurer_query:
-        claims_list = claims_list.filter(insurer_name__icontains=insurer_query)
+def _approximate_claim_count(claims_list, filtered):
+    """
+    Returns a cheap total for the list header: the exact total from the
+    dashboard summary when unfiltered, otherwise a count capped at
+    `CLAIMS_LIST_COUNT_LIMIT` (shown as "N+"). Returns None when disabled.
+    """
+    limit = settings.CLAIMS_LIST_COUNT_LIMIT
+    if not limit:
+        return None
+    if not filtered:
+        return {'count': sum(get_dashboard_summary()['status_counts'].values()), 'capped': False}
+    count = claims_list.order_by()[:limit + 1].count()
+    return {'count': min(count, limit), 'capped': count > limit}
+
+
+@login_required
+def claim_list_view(request):
+    # Rows, flags and totals all move with the `claims` counter.
+    versions, last_modified = read_versions(CLAIMS)
+    etag = _etag(request, versions)
+    not_modified = _not_modified(request, etag, last_modified)
+    if not_modified:
+        return not_modified
 
-    claims_list = claims_list.order_by('-discharge_date')
+    claims_list, filtered = filter_claim_list(Claim.objects.for_list(request.user), request.GET)
 
-    paginator = Paginator(claims_list, 5)
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    if page_number:
+        # Numbered pages stay available for old links; they count and offset the whole result.
+        paginator = Paginator(claims_list.order_by(*KEYSET_ORDERING), CLAIMS_PER_PAGE)
+        page_obj = paginator.get_page(page_number)
+    else:
+        page_obj = paginate_by_cursor(claims_list, request.GET.get('cursor'), CLAIMS_PER_PAGE)
+        page_obj.approximate_count = _approximate_claim_count(claims_list, filtered=filtered)
 
     query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    if 'show_details_for' in query_params:
-        del query_params['show_details_for']
+    for param in ('page', 'cursor', 'show_details_for'):
+        if param in query_params:
+            del query_params[param]
 
     context = {
         'page_obj': page_obj,
         'query_params': query_params.urlencode(),
         'show_details_for_id': request.GET.get('show_details_for'),
+        'status_choices': Claim.STATUS_CHOICES,
     }
 
     if request.headers.get('HX-Request') == 'true':
-        return render(request, 'claims/partials/_claims_content_partial.html', context)
+        response = render(request, 'claims/partials/_claims_content_partial.html', context)
+    else:
+        response = render(request, 'claims/claim_list.html', context)
+    return _with_validators(response, etag, last_modified)
+
 
-    return render(request, 'claims/claim_list.html', context)
+async def _iterate_in_thread(iterator):
+    # Each chunk (one batch query) is produced off the event loop so other requests keep being served.
+    next_chunk = sync_to_async(next)
+    while True:
+        chunk = await next_chunk(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
 
 
 @login_required
-def claim_detail_view(request, pk):
+def export_claims_view(request):
+    """
+    Streams every claim matching the claim list's filters as CSV (default),
+    JSON Lines, Parquet or Arrow (`?format=`), reading it in batches of
+    `CLAIMS_EXPORT_BATCH_SIZE` rows so memory stays flat for any result size.
+    """
+    fmt = request.GET.get('format', 'csv').lower()
+    if fmt not in available_formats():
+        raise Http404("Export format not supported")
+
+    claims, _ = filter_claim_list(Claim.objects.all(), request.GET)
+    content = stream_export(claims, fmt, settings.CLAIMS_EXPORT_BATCH_SIZE)
+    if isinstance(request, ASGIRequest):
+        content = _iterate_in_thread(content)
+
+    content_type, extension = EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="claims-{timezone.localdate():%Y%m%d}.{extension}"'
+    return response
+
+
+@login_required
+async def claim_detail_view(request, pk):
+    user = await _auser(request)
+    versions, last_modified = await aread_versions(claim_key(pk), INGEST)
+    etag = _etag(request, versions)
+    not_modified = _not_modified(request, etag, last_modified)
+    if not_modified:
+        return not_modified
+
+    user_notes = Note.objects.filter(Q(is_public=True) | Q(user=user)).select_related('user')
     try:
-        claim = Claim.objects.select_related('details').prefetch_related('notes', 'history__user').get(pk=pk)
+        claim = await Claim.objects.select_related('details__denial_reason').prefetch_related(
+            Prefetch('notes', queryset=user_notes, to_attr='visible_notes')
+        ).annotate(
+            is_flagged_by_user=Exists(Flag.objects.filter(claim=OuterRef('pk'), user=user))
+        ).aget(pk=pk)
     except Claim.DoesNotExist:
         raise Http404("Claim does not exist")
 
-    visible_notes = claim.notes.filter(Q(is_public=True) | Q(user=request.user))
-
-    cpt_codes_list = []
-    if hasattr(claim, 'details') and claim.details and claim.details.cpt_codes:
-        cpt_codes_list = [code.strip() for code in claim.details.cpt_codes.split(',')]
-
-    underpayment_amount = claim.billed_amount - claim.paid_amount
-    
-    is_flagged_by_user = claim.flags.filter(user=request.user).exists()
-    claim.is_flagged_by_user = is_flagged_by_user
-
     context = {
         'claim': claim,
-        'visible_notes': visible_notes,
+        'visible_notes': claim.visible_notes,
         'status_choices': Claim.STATUS_CHOICES,
-        'cpt_codes_list': cpt_codes_list,
-        'underpayment_amount': underpayment_amount,
+        # Called by the template, so the codes are only split when the cached cards are re-rendered.
+        'cpt_codes_list': partial(parse_cpt_codes, getattr(claim, 'details', None) and claim.details.cpt_codes),
+        'underpayment_amount': claim.underpayment,
+        # Lazy: only queried when the cached claim cards have to be re-rendered.
+        'status_history': claim.history.select_related('user'),
+        'claim_cards_timeout': settings.CLAIMS_DETAIL_CACHE_SECONDS,
     }
-
-    details_html = render_to_string('claims/partials/_claim_details_card.html', context, request=request)
-    change_status_html = render_to_string('claims/partials/_change_status_card.html', context, request=request)
-    analyse_agent_html = render_to_string('claims/partials/_analyse_agent_card.html', context, request=request)
-    status_history_html = render_to_string('claims/partials/_status_history_card.html', context, request=request)
-    notes_html = render_to_string('claims/partials/_notes_card.html', context, request=request)
-    actions_html = render_to_string('claims/partials/_actions_card.html', context, request=request)
-    placeholder_idea_html = render_to_string('claims/partials/_placeholder_idea_card.html', context, request=request)
-
-    response_html = f"""
-    {details_html}
-    <div id="change-status-card" hx-swap-oob="innerHTML">{change_status_html}</div>
-    <div id="analyse-agent-card" hx-swap-oob="innerHTML">{analyse_agent_html}</div>
-    <div id="status-history-card" hx-swap-oob="innerHTML">{status_history_html}</div>
-    <div id="notes-card" hx-swap-oob="innerHTML">{notes_html}</div>
-    <div id="actions-card" hx-swap-oob="innerHTML">{actions_html}</div>
-    <div id="placeholder-idea-card" hx-swap-oob="innerHTML">{placeholder_idea_html}</div>
-    """
-    return HttpResponse(response_html)
+    response = await _arender(request, 'claims/partials/_claim_detail_response.html', context)
+    return _with_validators(response, etag, last_modified)
 
 @login_required
-def add_note_view(request, pk):
-    claim = get_object_or_404(Claim, pk=pk)
+async def add_note_view(request, pk):
+    user = await _auser(request)
+    claim = await aget_object_or_404(Claim, pk=pk)
     if request.method == 'POST':
         note_text = request.POST.get('note_text', '').strip()
         is_public = request.POST.get('is_public') == 'on'
         if note_text:
-            Note.objects.create(
+            await Note.objects.acreate(
                 claim=claim,
-                user=request.user,
+                user=user,
                 text=note_text,
                 is_public=is_public
             )
-        visible_notes = claim.notes.filter(
-            Q(is_public=True) | Q(user=request.user)
-        )
+        visible_notes = [
+            note async for note in claim.notes.filter(Q(is_public=True) | Q(user=user)).select_related('user')
+        ]
         context = {'claim': claim, 'visible_notes': visible_notes}
-        return render(request, 'claims/partials/_notes_list_partial.html', context)
+        return await _arender(request, 'claims/partials/_notes_list_partial.html', context)
 
 @require_POST
 @login_required
-def delete_note_view(request, pk):
-    note = get_object_or_404(Note, pk=pk)
-    if request.user != note.user:
+async def delete_note_view(request, pk):
+    user = await _auser(request)
+    note = await aget_object_or_404(Note, pk=pk)
+    if note.user_id != user.pk:
         return HttpResponseForbidden("You are not allowed to delete this note.")
-    note.delete()
+    await note.adelete()
     return HttpResponse("")
 
 @require_POST
 @login_required
-def edit_note_view(request, pk):
-    note = get_object_or_404(Note, pk=pk)
-    if request.user != note.user:
+async def edit_note_view(request, pk):
+    user = await _auser(request)
+    note = await aget_object_or_404(Note.objects.select_related('user'), pk=pk)
+    if note.user_id != user.pk:
         return HttpResponseForbidden("You are not allowed to edit this note.")
     new_text = request.POST.get('note_text', '').strip()
     if new_text:
         note.text = new_text
-        note.save()
+        await note.asave()
     context = {'note': note}
-    return render(request, 'claims/partials/_note_item_partial.html', context)
+    return await _arender(request, 'claims/partials/_note_item_partial.html', context)
 
 @login_required
 def change_claim_status_view(request, pk):
-    claim = get_object_or_404(Claim.objects.prefetch_related('history__user'), pk=pk)
+    claim = get_object_or_404(Claim, pk=pk)
     if request.method == 'POST':
         new_status = request.POST.get('status')
         comment = request.POST.get('comment', '')
         old_status = claim.get_status_display()
         if new_status in dict(Claim.STATUS_CHOICES) and new_status != claim.status:
+            previous_status = claim.status
             claim.status = new_status
             claim.save()
+            record_status_change(claim, previous_status)
             ClaimHistory.objects.create(
                 claim=claim,
                 user=request.user,
@@ -207,14 +339,45 @@ def change_claim_status_view(request, pk):
             )
 
         claim.refresh_from_db()
-        underpayment_amount = claim.billed_amount - claim.paid_amount
+        underpayment_amount = claim.underpayment
         context = {
             'claim': claim,
             'status_choices': Claim.STATUS_CHOICES,
             'underpayment_amount': underpayment_amount,
+            'status_history': claim.history.select_related('user'),
         }
         return render(request, 'claims/partials/_status_update_response.html', context)
 
+@require_POST
+@login_required
+def bulk_change_status_view(request):
+    """
+    Moves many claims to `new_status` at once: those whose claim IDs are
+    listed in `claim_ids`, or else every claim matching the claim list's
+    filters. Refuses to act on all claims when neither is given.
+    """
+    new_status = request.POST.get('new_status')
+    if new_status not in dict(Claim.STATUS_CHOICES):
+        return HttpResponseBadRequest("Choose a valid status.")
+
+    claim_ids = request.POST.get('claim_ids', '')
+    if claim_ids.strip():
+        try:
+            claims = parse_claim_ids(claim_ids)
+        except ValueError:
+            return HttpResponseBadRequest("Claim IDs must be whole numbers.")
+    else:
+        claims, filtered = filter_claim_list(Claim.objects.all(), request.POST)
+        if not filtered:
+            return HttpResponseBadRequest("List claim IDs or filter the claims to change.")
+
+    changed = change_claim_statuses(claims, new_status, user=request.user, comment=request.POST.get('comment', ''))
+    context = {'changed': changed, 'new_status': new_status}
+    if request.htmx:
+        return render(request, 'claims/partials/_bulk_status_result.html', context)
+    messages.success(request, f'{changed} claims moved to {new_status}.')
+    return redirect('claims:claim-list')
+
 @login_required
 def generate_report_view(request, pk):
     claim = get_object_or_404(Claim, pk=pk)
@@ -222,50 +385,90 @@ def generate_report_view(request, pk):
 
 @login_required
 def dashboard_view(request):
-    total_underpayment = Claim.objects.aggregate(
-        total=Sum(F('billed_amount') - F('paid_amount'))
-    )['total']
+    versions, last_modified = read_versions(CLAIMS)
+    etag = _etag(request, versions)
+    not_modified = _not_modified(request, etag, last_modified)
+    if not_modified:
+        return not_modified
 
-    claims_awaiting_action = Claim.objects.filter(
-        Q(status=Claim.STATUS_DENIED) | Q(status=Claim.STATUS_UNDER_REVIEW)
-    ).count()
+    # Claim-wide figures come from the maintained summary (usually cached);
+    # only the per-user cards are queried on every request.
+    summary = get_dashboard_summary()
 
     my_flagged_claims_count = Flag.objects.filter(user=request.user).count()
 
-    average_underpayment = Claim.objects.aggregate(
-        avg=Avg(F('billed_amount') - F('paid_amount'))
-    )['avg']
-
-    high_value_denials = Claim.objects.filter(status=Claim.STATUS_DENIED).annotate(
-        underpayment=F('billed_amount') - F('paid_amount')
-    ).order_by('-underpayment')[:5]
-
-    aging_claims = Claim.objects.filter(status=Claim.STATUS_UNDER_REVIEW).order_by('discharge_date')[:5]
-
-    my_flagged_items = Claim.objects.filter(flags__user=request.user).distinct()[:5]
-
-    top_denial_reasons = ClaimDetail.objects.filter(denial_reason__isnull=False).exclude(denial_reason__exact='').values(
-        'denial_reason'
-    ).annotate(
-        count=Count('denial_reason')
-    ).order_by('-count')[:3]
+    # Most recently flagged first; a user flags a claim at most once, so no DISTINCT is needed.
+    my_flagged_items = Claim.objects.filter(flags__user=request.user).order_by('-flags__created_at')[:5]
 
     recent_activity = ClaimHistory.objects.select_related('claim', 'user').order_by('-timestamp')[:5]
 
     context = {
-        'total_underpayment': total_underpayment,
-        'claims_awaiting_action': claims_awaiting_action,
+        'total_underpayment': summary['total_underpayment'],
+        'claims_awaiting_action': summary['claims_awaiting_action'],
         'my_flagged_claims_count': my_flagged_claims_count,
-        'average_underpayment': average_underpayment,
-        'high_value_denials': high_value_denials,
-        'aging_claims': aging_claims,
+        'average_underpayment': summary['average_underpayment'],
+        'high_value_denials': summary['high_value_denials'],
+        'aging_claims': summary['aging_claims'],
         'my_flagged_items': my_flagged_items,
-        'top_denial_reasons': top_denial_reasons,
+        'top_denial_reasons': summary['top_denial_reasons'],
+        'top_cpt_codes': summary['top_cpt_codes'],
         'recent_activity': recent_activity,
     }
-    return render(request, 'claims/dashboard.html', context)
+    return _with_validators(render(request, 'claims/dashboard.html', context), etag, last_modified)
+
+AGING_PER_PAGE = 25
 
 
+@login_required
+def aging_worklist_view(request):
+    """
+    The collectors' worklist: claims of one open status, oldest discharge
+    first, with the count and underpayment of each aging bucket.
+    """
+    status = request.GET.get('status')
+    if status not in WORKLIST_STATUSES:
+        status = Claim.STATUS_UNDER_REVIEW
+    bucket = request.GET.get('bucket')
+    if bucket not in BUCKET_KEYS:
+        bucket = None
+
+    today = timezone.localdate()
+    # The buckets move at midnight as well as with the claims.
+    versions, last_modified = read_versions(CLAIMS)
+    etag = _etag(request, versions, today.isoformat())
+    not_modified = _not_modified(request, etag, last_modified)
+    if not_modified:
+        return not_modified
+
+    page_obj = paginate_by_cursor(
+        worklist_claims(status, bucket, today), request.GET.get('cursor'), AGING_PER_PAGE, oldest_first=True
+    )
+    for claim in page_obj:
+        claim.days_aged = (today - claim.discharge_date).days
+
+    context = {
+        'page_obj': page_obj,
+        'buckets': aging_buckets(status, today),
+        'statuses': WORKLIST_STATUSES,
+        'status': status,
+        'bucket': bucket,
+        'query_params': urllib.parse.urlencode({'status': status, 'bucket': bucket or ''}),
+    }
+    if request.htmx:
+        response = render(request, 'claims/partials/_aging_worklist_partial.html', context)
+    else:
+        response = render(request, 'claims/aging_worklist.html', context)
+    return _with_validators(response, etag, last_modified)
+
+
+def _redirect_to_upload_form(request):
+    # HTMX would swap a followed redirect into the status card, so ask for a full page load instead.
+    if request.htmx:
+        response = HttpResponse(status=204)
+        response['HX-Redirect'] = reverse('claims:upload-claims')
+        return response
+    return redirect('claims:upload-claims')
+
 @login_required
 def upload_claims_view(request):
     if request.method == 'POST':
@@ -273,52 +476,67 @@ def upload_claims_view(request):
         details_file = request.FILES.get('details_file')
         mode = request.POST.get('mode')
 
-        if not all([claims_file, details_file, mode]):
+        if not all([claims_file, details_file, mode]) or mode not in LOAD_MODES:
             messages.error(request, 'Please provide both files and select an upload mode.')
-            return redirect('claims:upload-claims')
+            return _redirect_to_upload_form(request)
 
         try:
-            claims_data = parse_data_from_stream(claims_file, claims_file.name)
-            details_data = parse_data_from_stream(details_file, details_file.name)
+            # Reject unsupported formats now rather than in the background job.
+            iter_data_from_stream(claims_file, claims_file.name)
+            iter_data_from_stream(details_file, details_file.name)
+        except ValueError as e:
+            messages.error(request, describe_upload_error(e))
+            return _redirect_to_upload_form(request)
+
+        # Save both files to disk and let the worker pool load them, so the
+        # request returns as soon as the upload itself has finished.
+        job = UploadJob.objects.create(
+            user=request.user,
+            mode=mode,
+            claims_file=claims_file,
+            details_file=details_file,
+        )
+        enqueue_upload_job(job)
 
-            claims_created, claims_updated, details_created, details_updated = process_claim_data(
-                claims_data, details_data, mode
-            )
-            
-            # Detailed success message for the toast notification
-            success_message = (
-                f'Success! {claims_created} claims created, {claims_updated} updated. '
-                f'{details_created} details created, {details_updated} updated.'
-            )
-            
-            # URL encode the message to safely pass it as a query parameter
-            encoded_message = urllib.parse.quote(success_message)
-            redirect_url = f"{reverse('claims:dashboard')}?upload_success=true&message={encoded_message}"
-            
-            # For HTMX requests, send a special header to trigger a client-side redirect.
-            if request.htmx:
-                response = HttpResponse(status=204) # 204 No Content
-                response['HX-Redirect'] = redirect_url
-                return response
-            
-            # For standard requests, add a Django message and redirect
-            messages.success(request, success_message)
-            return redirect(redirect_url)
-
-        except (ValueError, KeyError, Exception) as e:
-            error_message = f'An unexpected error occurred: {e}'
-            if isinstance(e, ValueError):
-                # Provide more specific guidance for common errors
-                error_message = f'Upload failed due to a data format issue: {e}. Please ensure your file matches the template.'
-            elif isinstance(e, KeyError):
-                error_message = f"Upload failed. A required column is missing from your data: '{e}'. Please check your file against the template."
-
-            messages.error(request, error_message)
-
-            return redirect('claims:upload-claims')
+        if request.htmx:
+            return render(request, 'claims/partials/_upload_job_status.html', {'job': job})
+        return redirect('claims:upload-job', pk=job.pk)
 
     return render(request, 'claims/upload_claims.html')
 
+@login_required
+def upload_job_view(request, pk):
+    """
+    Reports the progress of a background upload job. HTMX polls this until the
+    job finishes, then follows the redirect to the dashboard.
+    """
+    job = get_object_or_404(UploadJob, pk=pk, user=request.user)
+
+    if job.status == UploadJob.STATUS_RUNNING and requeue_stale_jobs([job.pk]):
+        # The worker running it went away; run it again on this process's pool.
+        enqueue_upload_job(job)
+        job.refresh_from_db()
+
+    if job.status == UploadJob.STATUS_DONE:
+        # URL encode the message to safely pass it as a query parameter
+        encoded_message = urllib.parse.quote(job.success_message)
+        redirect_url = f"{reverse('claims:dashboard')}?upload_success=true&message={encoded_message}"
+
+        # For HTMX requests, send a special header to trigger a client-side redirect.
+        if request.htmx:
+            response = HttpResponse(status=204) # 204 No Content
+            response['HX-Redirect'] = redirect_url
+            return response
+
+        # For standard requests, add a Django message and redirect
+        messages.success(request, job.success_message)
+        return redirect(redirect_url)
+
+    context = {'job': job}
+    if request.htmx:
+        return render(request, 'claims/partials/_upload_job_status.html', context)
+    return render(request, 'claims/upload_job.html', context)
+
 @login_required
 def download_template_view(request, file_type):
     """
@@ -347,3 +565,17 @@ def download_template_view(request, file_type):
     response = HttpResponse(content, content_type=content_type)
     response['Content-Disposition'] = f'attachment; filename="{file_name}"'
     return response
+
+
+def metrics_view(request):
+    """
+    Serves the request metrics of this worker process in the Prometheus text
+    format, to staff users or to a scraper sending `CLAIMS_METRICS_TOKEN` as a bearer token.
+    """
+    token = settings.CLAIMS_METRICS_TOKEN
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if token and not authorized:
+        authorized = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
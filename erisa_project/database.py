@@ -0,0 +1,64 @@
+# path: erisa_project/database.py
+
+"""
+The `default` database settings, read from the environment.
+
+`DATABASE_URL` picks the backend in django-environ's URL syntax (for
+example postgres://user:password@db:5432/erisa); without it the app uses the
+SQLite file next to manage.py. Connections are kept open between requests
+(`DB_CONN_MAX_AGE` seconds) and checked before reuse.
+
+SQLite takes one writer at a time, so it is tuned on every connection: WAL
+lets readers carry on while a note, flag or load is written, writers wait for
+the lock (`DB_SQLITE_TIMEOUT`) instead of failing, and transactions take the
+write lock up front so they cannot deadlock when a read turns into a write.
+PostgreSQL can instead use a psycopg connection pool (`DB_POOL`, needs
+`psycopg[pool]`).
+"""
+
+SQLITE_ENGINE = 'django.db.backends.sqlite3'
+POSTGRESQL_ENGINE = 'django.db.backends.postgresql'
+
+# Applied on every new SQLite connection (Django's `init_command`).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Safe with WAL: a power loss can drop the last commits but never corrupts the file.
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+}
+
+
+def database_settings(env, sqlite_path):
+    """
+    Returns the settings dict for `DATABASES['default']`.
+
+    :param env: The settings' `environ.Env`.
+    :param sqlite_path: The SQLite file used when `DATABASE_URL` is not set.
+    """
+    if env('DATABASE_URL', default=''):
+        config = env.db('DATABASE_URL')
+    else:
+        config = {'ENGINE': SQLITE_ENGINE, 'NAME': sqlite_path}
+    options = config.setdefault('OPTIONS', {})
+    config['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+    config['CONN_HEALTH_CHECKS'] = True
+
+    if config['ENGINE'] == SQLITE_ENGINE and env.bool('DB_SQLITE_TUNED', default=True):
+        pragmas = dict(
+            SQLITE_PRAGMAS,
+            # Negative sizes are KiB.
+            cache_size=-env.int('DB_SQLITE_CACHE_KB', default=64 * 1024),
+            mmap_size=env.int('DB_SQLITE_MMAP_BYTES', default=256 * 1024 * 1024),
+        )
+        options.setdefault('init_command', ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas.items()))
+        options.setdefault('timeout', env.int('DB_SQLITE_TIMEOUT', default=20))
+        options.setdefault('transaction_mode', 'IMMEDIATE')
+    elif config['ENGINE'] == POSTGRESQL_ENGINE and env.bool('DB_POOL', default=False):
+        options['pool'] = {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+            'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+        }
+        # The pool keeps the connections; Django must hand each one back after the request.
+        config['CONN_MAX_AGE'] = 0
+    return config
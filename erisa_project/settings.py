@@ -4,6 +4,8 @@ import os
 import environ
 from pathlib import Path
 
+from .database import database_settings
+
 # --- Environment Variable Setup ---
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -49,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'claims.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,11 +83,9 @@ WSGI_APPLICATION = 'erisa_project.wsgi.application'
 
 
 # --- Database ---
+# DATABASE_URL selects the backend (defaults to db.sqlite3); see erisa_project/database.py for the tuning knobs
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_settings(env, BASE_DIR / 'db.sqlite3'),
 }
 
 
@@ -107,6 +108,14 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploaded claim files are kept here until their background job has loaded them
+MEDIA_ROOT = env('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
+
+# --- Cache ---
+# Defaults to a per-process memory cache. With several web workers, point
+# CACHE_URL at a shared cache (e.g. redis:// or memcache://) so invalidations reach every worker.
+CACHES = {'default': env.cache('CACHE_URL', default='locmemcache://')}
 
 # --- Default primary key field type ---
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -115,4 +124,70 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # --- Auth settings ---
 LOGIN_URL = 'claims:login'
 LOGIN_REDIRECT_URL = 'claims:claim-list'
-LOGOUT_REDIRECT_URL = 'claims:login'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'claims:login'
+AUTHENTICATION_BACKENDS = ['claims.auth.CachedModelBackend']
+# Seconds a worker reuses a logged-in user's row; saving the user drops it in that worker at once (0 disables)
+CLAIMS_USER_CACHE_SECONDS = env.int('CLAIMS_USER_CACHE_SECONDS', default=30)
+
+# --- Sessions ---
+# db, cached_db (read from the cache, written through to the table), cache, or signed_cookies
+# (no server-side storage, so logging out cannot revoke a copied cookie). cached_db is the default
+# only with a shared CACHE_URL: with per-process caches a logout would not reach the other workers.
+SESSION_BACKEND = env('SESSION_BACKEND', default='cached_db' if env('CACHE_URL', default='') else 'db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+
+
+# --- Background upload jobs ---
+# Size of the in-process worker pool that loads uploaded files
+CLAIMS_UPLOAD_WORKERS = env.int('CLAIMS_UPLOAD_WORKERS', default=2)
+# Run upload jobs inline in the request instead of on the worker pool
+CLAIMS_UPLOAD_EAGER = env.bool('CLAIMS_UPLOAD_EAGER', default=False)
+# A running job that has not reported progress for this long lost its worker and is requeued
+CLAIMS_UPLOAD_STALE_SECONDS = env.int('CLAIMS_UPLOAD_STALE_SECONDS', default=600)
+# Staging rows of an overwrite load that has not written for this long are purged by the next one
+CLAIMS_STAGING_MAX_AGE_SECONDS = env.int('CLAIMS_STAGING_MAX_AGE_SECONDS', default=24 * 60 * 60)
+
+# --- Claim list ---
+# The unpaginated claim list shows a total capped at this many rows ("1000+"); 0 hides it
+CLAIMS_LIST_COUNT_LIMIT = env.int('CLAIMS_LIST_COUNT_LIMIT', default=1000)
+
+# --- Dashboard ---
+# Upper bound on how long a cached dashboard summary is served; writes invalidate it sooner
+CLAIMS_DASHBOARD_CACHE_SECONDS = env.int('CLAIMS_DASHBOARD_CACHE_SECONDS', default=60)
+
+# --- Claim export ---
+# Rows read per query while streaming an export; memory use scales with this, not the result size
+CLAIMS_EXPORT_BATCH_SIZE = env.int('CLAIMS_EXPORT_BATCH_SIZE', default=2000)
+
+# --- Claim detail ---
+# How long the shared claim detail cards stay cached; edits invalidate them sooner
+CLAIMS_DETAIL_CACHE_SECONDS = env.int('CLAIMS_DETAIL_CACHE_SECONDS', default=300)
+
+# --- Conditional GET ---
+# Changes every ETag of the claim pages; set it to the release id so a deploy that only
+# changes view code still re-renders pages browsers hold (templates are covered without it)
+CLAIMS_ETAG_SALT = env('CLAIMS_ETAG_SALT', default='')
+
+# --- Request metrics ---
+# Per-request timing middleware (Server-Timing header and the /metrics/ endpoint)
+CLAIMS_METRICS_ENABLED = env.bool('CLAIMS_METRICS_ENABLED', default=True)
+# Add the Server-Timing header to responses for staff users
+CLAIMS_SERVER_TIMING = env.bool('CLAIMS_SERVER_TIMING', default=True)
+# Bearer token a Prometheus scraper can use for /metrics/ (staff users can always read it)
+CLAIMS_METRICS_TOKEN = env('CLAIMS_METRICS_TOKEN', default='')
+
+# --- Query diagnostics ---
+# Fingerprint each request's queries to log slow queries and probable N+1s (needs the metrics middleware).
+# Off by default: it runs regexes over every query and captures a stack per new fingerprint
+CLAIMS_QUERY_DIAGNOSTICS = env.bool('CLAIMS_QUERY_DIAGNOSTICS', default=False)
+# Fraction of requests diagnosed when it is on; e.g. 0.01 to keep an eye on production cheaply
+CLAIMS_QUERY_DIAGNOSTICS_SAMPLE_RATE = env.float('CLAIMS_QUERY_DIAGNOSTICS_SAMPLE_RATE', default=1.0)
+# A query fingerprint run more than this many times in one request is reported as a probable N+1
+CLAIMS_N_PLUS_ONE_THRESHOLD = env.int('CLAIMS_N_PLUS_ONE_THRESHOLD', default=10)
+# Queries taking at least this long are written to the slow-query log
+CLAIMS_SLOW_QUERY_MS = env.float('CLAIMS_SLOW_QUERY_MS', default=100)
+# Rotating log for slow queries and N+1 reports (JSON lines), one file per process with the pid added
+# to the name; empty leaves it to LOGGING
+CLAIMS_SLOW_QUERY_LOG = env('CLAIMS_SLOW_QUERY_LOG', default=str(BASE_DIR / 'logs' / 'slow_queries.log'))
+CLAIMS_SLOW_QUERY_LOG_BYTES = env.int('CLAIMS_SLOW_QUERY_LOG_BYTES', default=10 * 1024 * 1024)
+CLAIMS_SLOW_QUERY_LOG_BACKUPS = env.int('CLAIMS_SLOW_QUERY_LOG_BACKUPS', default=5)
@@ -0,0 +1,25 @@
+# gunicorn.conf.py
+
+"""
+Gunicorn settings for the Docker image (`gunicorn --config gunicorn.conf.py`).
+
+The app is served over ASGI by uvicorn workers, so the async HTMX partial
+views (claim detail, flags, notes) wait on the database and on slow clients
+without tying up a worker, and sync views run in the worker's thread pool. `SERVER_MODE=wsgi` switches back to
+sync workers running `erisa_project.wsgi`, e.g. to compare the two with
+`python manage.py load_test_claims`.
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8080')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+if os.environ.get('SERVER_MODE', 'asgi') == 'wsgi':
+    wsgi_app = 'erisa_project.wsgi:application'
+else:
+    wsgi_app = 'erisa_project.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    # Under ASGI every request gets its own connection, which Django would
+    # otherwise keep open; use DB_POOL on PostgreSQL to reuse connections.
+    os.environ.setdefault('DB_CONN_MAX_AGE', '0')